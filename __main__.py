@@ -34,9 +34,6 @@ Just a bit of fimulating
 # Installs Python 3 division and print behaviour
 from __future__ import division, print_function
 
-import airspace
-import game
+import cli
 
-a = airspace.Airspace()
-g = game.Client()
-g.mainloop(a)
\ No newline at end of file
+cli.main()
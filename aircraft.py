@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+"""Aircraft types
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Aircraft types are registered by name, and every plane refers to one.
+The default type is always available; more are loaded from
+aircraft.txt in the resources, whose lines look like:
+
+typeid=max_speed [terminal_velocity [overspeed [max_safe_throttle]]]
+
+Lines that start with a # and blank lines are ignored.
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import os
+
+from performance import PerformanceTable
+
+PATH = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_PATH = os.path.join(PATH, "resources", "aircraft.txt")
+DEFAULT_TYPE = 'default'
+
+
+class AircraftType(object):
+    """The flight model shared by every plane of one type."""
+    MAX_NAME_LENGTH = 16 # Bytes; names are stored in plane states
+    def __init__(self, name, max_speed=500, terminal_velocity=None,
+                 overspeed=0.75, max_safe_throttle=75):
+        """Initialize the instance.
+
+        See PerformanceTable for the other arguments."""
+        if len(name.encode('ascii')) > self.MAX_NAME_LENGTH:
+            raise ValueError("Aircraft type name {} is too long.".format(
+                name))
+        self.name = name
+        self.performance = PerformanceTable(
+            max_speed, terminal_velocity, overspeed, max_safe_throttle)
+
+    def __repr__(self):
+        """Display the type's name and limits."""
+        return "<AircraftType {} max speed {} terminal velocity {}>" \
+            .format(self.name, self.max_speed, self.terminal_velocity)
+
+    @property
+    def max_speed(self):
+        """Get the type's maximum speed in m/s."""
+        return self.performance.max_speed
+    @property
+    def terminal_velocity(self):
+        """Get the type's terminal falling speed in m/s."""
+        return self.performance.terminal_velocity
+    @property
+    def stall_speed(self):
+        """Get the speed below which the type can't climb in m/s."""
+        return self.max_speed / 5
+    @property
+    def overspeed(self):
+        """Get the speed above which the type is damaged in m/s."""
+        return self.max_speed * self.performance.overspeed
+    @property
+    def max_safe_throttle(self):
+        """Get the throttle above which the type is damaged."""
+        return self.performance.max_safe_throttle
+
+AIRCRAFT_TYPES = {}
+
+
+def register(aircraft_type):
+    """Add an aircraft type to the registry.  Returns it."""
+    AIRCRAFT_TYPES[aircraft_type.name] = aircraft_type
+    return aircraft_type
+
+
+def get(aircraft_type):
+    """Get a registered aircraft type.
+
+    aircraft_type can be a name or an AircraftType."""
+    if isinstance(aircraft_type, AircraftType):
+        return aircraft_type
+    try:
+        return AIRCRAFT_TYPES[aircraft_type]
+    except KeyError:
+        raise ValueError("Unknown aircraft type {}.".format(aircraft_type))
+
+
+def parse_aircraft_types(lines):
+    """Create the aircraft types described by lines of aircraft.txt."""
+    output = []
+    for line in lines:
+        if line.strip() == '':
+            continue
+        elif line.strip()[0] == '#':
+            continue
+        name, values = line.split('=')
+        values = [float(value) for value in values.split()]
+        output.append(AircraftType(name.strip(), *values))
+    return output
+
+
+def load_aircraft_types(path=DEFAULT_PATH):
+    """Register the aircraft types in a file.  Returns them."""
+    with open(path, 'rt') as aircraft_file:
+        aircraft_types = parse_aircraft_types(aircraft_file)
+    for aircraft_type in aircraft_types:
+        register(aircraft_type)
+    return aircraft_types
+
+register(AircraftType(DEFAULT_TYPE))
@@ -23,10 +23,17 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from __future__ import division, print_function
 
 import random
+import struct
 
 import pygame
 
+import aircraft
+import autopilot
+import alerts
+from conflicts import ConflictDetector
+from navrender import NavRenderer
 from objects import AdvancedSpriteGroup, Airplane, Objective
+from physics import group_planes, step_planes
 
 class Airspace(pygame.rect.Rect):
     """The class for an airspace."""
@@ -34,8 +41,15 @@ class Airspace(pygame.rect.Rect):
     MIN_OBJ_ALT = 7500
     MAX_ALTITUDE = 20000
     ALTITUDE_TOLERANCE = 1400
-    ALTITUDE_WITHIN = 2000
+    ALTITUDE_WITHIN = alerts.ALTITUDE_WITHIN
     POINTS_REQUIRED = 10
+    # Snapshot header: magic, version, rect, the NEXT_ID counters
+    # and the number of planes, objectives and unscored plane IDs
+    # (SNAPSHOT_ID each) that follow it.
+    SNAPSHOT_HEADER = struct.Struct('<4sB4i2i3I')
+    SNAPSHOT_ID = struct.Struct('<i')
+    SNAPSHOT_MAGIC = b'SFAS'
+    SNAPSHOT_VERSION = 4
     def __init__(self, x=(0, 0, 0, 0), y=None, w=None, h=None):
         """Initialize the instance."""
         if y is None:
@@ -46,6 +60,12 @@ class Airspace(pygame.rect.Rect):
             x, y, Airspace.AIRSPACE_DIM, Airspace.AIRSPACE_DIM)
         self.planes = AdvancedSpriteGroup()
         self.objectives = AdvancedSpriteGroup()
+        self.unscored = set() # IDs of planes that can't take objectives
+        # Set to None to turn plane-to-plane conflicts off
+        self.conflicts = ConflictDetector()
+        self.alerts = alerts.WarningEngine(
+            altitude_within=self.ALTITUDE_WITHIN)
+        self.renderer = NavRenderer()
 
     def __repr__(self):
         """Display important informathion about the airspace."""
@@ -54,44 +74,124 @@ class Airspace(pygame.rect.Rect):
             ''.join(["\n%s" % repr(plane) for plane in self.planes]),
             ''.join(["\n%s" % repr(obj) for obj in self.objectives]))
 
-    def draw(self, client):
-        """Draw the airspace and everything inside it."""
+    def draw(self, client, alpha=1):
+        """Draw the airspace and everything inside it.
+
+        alpha is the fraction of the last tick to draw the planes at
+        (see Airplane.interpolate).  The planes and objectives are
+        drawn in one batch by a navrender.NavRenderer."""
         client.screen.blit(
             client.images['navcircle'], client.airspace_rect)
-        for plane in self.planes: # Draw planes
-            plane.draw(client, self)
-        for obj in self.objectives: # Draw objectives
-            obj.draw(client, self)
+        self.renderer.draw(client, self, alpha)
+
+    def update(self, tick_duration=None):
+        """Update the airspace.
 
-    def update(self):
-        """Update the airspace."""
-        self.planes.update()
+        tick_duration is passed on to the planes; if it is None they
+        use the time since their last update.  Otherwise the planes are
+        stepped in batches of the same aircraft type, and then every
+        autopilot is run at once.  Conflicts between planes are found
+        after they move, and every plane's warnings last."""
+        if tick_duration is None:
+            self.planes.update()
+        else:
+            for batch in group_planes(self.planes):
+                step_planes(batch, tick_duration)
+        if self.conflicts is not None:
+            self.conflicts.update(self.planes)
 
         for plane in self.planes: # Check for plane-objective collision
+            if plane.id_ in self.unscored:
+                continue
             collisions = pygame.sprite.spritecollide(
                 plane, self.objectives, True, self.collided)
             for collision in collisions:
                 plane.points += 1
                 self.generate_objective()
+        if tick_duration is not None:
+            autopilot.step(self.planes, tick_duration, self.objectives)
+        self.alerts.evaluate(self.planes, self.objectives, self.conflicts)
+
+    def snapshot(self):
+        """Pack the airspace and everything inside it into bytes.
+
+        The snapshot contains no pygame objects, so it is cheap to
+        keep many of them around.  Use restore to load one."""
+        output = [self.SNAPSHOT_HEADER.pack(
+            self.SNAPSHOT_MAGIC, self.SNAPSHOT_VERSION,
+            self.x, self.y, self.width, self.height,
+            Airplane.NEXT_ID, Objective.NEXT_ID,
+            len(self.planes), len(self.objectives), len(self.unscored))]
+        output.extend(plane.get_state() for plane in self.planes)
+        output.extend(obj.get_state() for obj in self.objectives)
+        output.extend(self.SNAPSHOT_ID.pack(plane_id)
+                      for plane_id in sorted(self.unscored))
+        return b''.join(output)
 
-    def add_plane(self, plane=None, player_id=None):
+    def restore(self, snapshot):
+        """Restore the airspace from a snapshot.
+
+        Planes and objectives that are already in the airspace are
+        reused if their ID is in the snapshot, so references to them
+        stay valid.  The NEXT_ID counters and which planes can't
+        capture objectives are restored too."""
+        (magic, version, x, y, width, height, next_plane_id,
+         next_obj_id, plane_count, obj_count, unscored_count) = \
+            self.SNAPSHOT_HEADER.unpack_from(snapshot)
+        if magic != self.SNAPSHOT_MAGIC:
+            raise ValueError("Not an airspace snapshot.")
+        if version != self.SNAPSHOT_VERSION:
+            raise ValueError(
+                "Unsupported snapshot version {}.".format(version))
+        offset = self.SNAPSHOT_HEADER.size
+        self.x, self.y, self.width, self.height = x, y, width, height
+        for group, cls, count in (
+                (self.planes, Airplane, plane_count),
+                (self.objectives, Objective, obj_count)):
+            existing = dict((sprite.id_, sprite) for sprite in group)
+            group.empty()
+            for _ in range(count):
+                state = cls.STATE_FORMAT.unpack_from(snapshot, offset)
+                offset += cls.STATE_FORMAT.size
+                if state[0] in existing:
+                    sprite = existing[state[0]]
+                    sprite.set_state(state)
+                else:
+                    sprite = cls.from_state(state)
+                group.add(sprite)
+        plane_ids = set(plane.id_ for plane in self.planes)
+        self.unscored = set()
+        for _ in range(unscored_count):
+            plane_id, = self.SNAPSHOT_ID.unpack_from(snapshot, offset)
+            offset += self.SNAPSHOT_ID.size
+            if plane_id in plane_ids: # Stale IDs are dropped
+                self.unscored.add(plane_id)
+        Airplane.NEXT_ID = next_plane_id
+        Objective.NEXT_ID = next_obj_id
+
+    def add_plane(self, plane=None, player_id=None,
+                  aircraft_type=aircraft.DEFAULT_TYPE, scores=True):
         """Add a plane to the airspace.
 
-        Create a new airplane no plane is supplied.
-        Created airplane is at the center of the airspace.
-        Returns the newly-added plane."""
+        Create a new airplane of type aircraft_type if no plane is
+        supplied.  Created airplane is at the center of the airspace.
+        If scores is False, the plane can't capture objectives (for AI
+        traffic).  Returns the newly-added plane."""
         if plane is None:
             plane = Airplane(
                 self.width/2, self.height/2,
                 self.width*0.06, self.height*0.06, 0,
-                player_id=player_id)
+                player_id=player_id, aircraft_type=aircraft_type)
         if isinstance(plane, Airplane):
             self.planes.add(plane)
+            if not scores:
+                self.unscored.add(plane.id_)
             return plane
         raise TypeError("plane must be an Airplane or None.")
 
     def remove_plane(self, player_id):
         """Deletes the plane with id player_id."""
+        self.unscored.discard(player_id)
         for plane in self.planes:
             if plane.id_ == player_id:
                 self.planes.remove(plane)
@@ -117,6 +217,27 @@ class Airspace(pygame.rect.Rect):
                 objective_correct = True
         self.objectives.add(objective)
 
+    def get_exit_code(self, plane):
+        """Get why a plane's flight is over, or 0 if it isn't.
+
+        See Client.EXIT_TITLES for the codes."""
+        if plane.health <= 0:
+            return 5 # Overstressed the aircraft
+        elif (plane.points >= self.POINTS_REQUIRED
+              and plane.altitude <= 0):
+            return 1 # You Won!
+        # position-related exit
+        if plane.altitude > self.MAX_ALTITUDE:
+            return 6
+        elif plane.altitude <= 0 and plane.total_vertical_velocity < -20:
+            return 3
+        elif not self.in_bounds(plane, False):
+            return 4
+        elif (self.conflicts is not None
+              and plane.id_ in self.conflicts.collided):
+            return 7 # Mid-air collision
+        return 0
+
     @staticmethod
     def collided(airplane, objective, altitude_tolerance=None):
         """Test if a airplane collides with an objective."""
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+
+"""The warning rules
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Each warning is a rule: a name and a predicate that is true while the
+warning is on.  A predicate takes columns, a dict of the values in
+COLUMNS, and only compares them and combines the results with & and
+|, so the same predicate works on NumPy arrays (a value per plane) and
+on one plane's numbers.  A WarningEngine gathers every plane's columns
+once per evaluation and runs each predicate once over the whole batch
+with NumPy, giving each plane a bitmask with a bit per rule, in order.
+Small batches, or all of them without NumPy, are evaluated a plane at
+a time with the same predicates.  analytics runs them on logs.
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import math
+
+try:
+    import numpy
+except ImportError: # Planes are evaluated one at a time
+    numpy = None
+
+# The rules' thresholds, also used by analytics
+TERRAIN_ALTITUDE = 500 # m
+TERRAIN_SPEED = 0.3 # Fraction of the maximum speed
+PULLUP_ALTITUDE = 1000 # m
+PULLUP_VERTICAL_SPEED = -20 # m/s
+BANK_ANGLE = 30 # Degrees
+ALTITUDE_WITHIN = 2000 # m from the nearest objective's altitude
+
+# The values the rules can use, for each plane:
+#  -> vertical_speed includes gravity (see vertical_speed)
+#  -> max_speed, overspeed and stall_speed are the aircraft type's
+#  -> autopilot and traffic are 1 if the autopilot is on and if the
+#     plane is in a conflict, else 0
+#  -> objective_altitude is the nearest objective's altitude (NaN if
+#     there are none), and altitude_within is the same for every plane
+COLUMNS = ('altitude', 'speed', 'vertical_speed', 'roll_degrees',
+           'max_speed', 'overspeed', 'stall_speed', 'autopilot',
+           'traffic', 'objective_altitude', 'altitude_within')
+NAN = float('nan')
+
+
+def vertical_speed(plane):
+    """Get a plane's vertical speed in m/s."""
+    return plane._speed * math.sin(plane._pitch) - plane._gravity
+
+
+def roll_degrees(plane):
+    """Get a plane's roll in degrees."""
+    return plane._aircraft_type.performance.roll_degrees(plane._roll_level)
+
+
+def _curve_map(curve, xs):
+    """Get a performance.Curve's values at every x in a NumPy array."""
+    values = numpy.asarray(curve.values)
+    position = (xs - curve.start) * curve._scale
+    index = numpy.clip(position.astype(int), 0, curve._last)
+    low = values[index]
+    return low + (values[index + 1] - low) * (position - index)
+
+
+def _terrain(columns):
+    """Low and fast."""
+    return ((columns['altitude'] <= TERRAIN_ALTITUDE)
+            & (columns['speed'] > columns['max_speed'] * TERRAIN_SPEED))
+
+
+def _pullup(columns):
+    """Low and descending fast."""
+    return ((columns['altitude'] <= PULLUP_ALTITUDE)
+            & (columns['vertical_speed'] <= PULLUP_VERTICAL_SPEED))
+
+
+def _overspeed(columns):
+    """Faster than the aircraft's limit."""
+    return columns['speed'] > columns['overspeed']
+
+
+def _stall(columns):
+    """Too slow to fly, off the ground."""
+    return ((columns['speed'] < columns['stall_speed'])
+            & (columns['altitude'] != 0))
+
+
+def _bank_angle(columns):
+    """Rolled too far."""
+    return abs(columns['roll_degrees']) >= BANK_ANGLE
+
+
+def _altitude(columns):
+    """Near the nearest objective's altitude.  NaN (no objective)
+    compares false."""
+    return (abs(columns['altitude'] - columns['objective_altitude'])
+            <= columns['altitude_within'])
+
+
+def _autopilot(columns):
+    """The autopilot is disconnected."""
+    return columns['autopilot'] == 0
+
+
+def _traffic(columns):
+    """In a conflict with another plane."""
+    return columns['traffic'] != 0
+
+RULES = (
+    ('terrain', _terrain),
+    ('pullup', _pullup),
+    ('overspeed', _overspeed),
+    ('stall', _stall),
+    ('bank_angle', _bank_angle),
+    ('altitude', _altitude),
+    ('autopilot', _autopilot),
+    ('traffic', _traffic),
+)
+
+
+def nearest_objective_altitude(objectives, x, z):
+    """Get the altitude of the objective closest to (x, z), or None."""
+    output = None
+    best = None
+    for obj in objectives:
+        distance = (obj.x-x) ** 2 + (obj.z-z) ** 2
+        if best is None or distance < best:
+            best = distance
+            output = obj.altitude
+    return output
+
+
+class WarningEngine(object):
+    """Evaluates a set of warning rules for many planes at once."""
+    BATCH_MIN = 16 # Fewer planes than this are evaluated one at a time
+    def __init__(self, rules=RULES, altitude_within=ALTITUDE_WITHIN):
+        """Initialize the instance.
+
+        rules is a sequence of (name, predicate); see RULES."""
+        if len(rules) > 16:
+            raise ValueError("At most 16 rules fit in a bitmask.")
+        self.rules = tuple(rules)
+        self.altitude_within = altitude_within
+        self.bits = dict((name, 1 << i)
+                         for i, (name, _) in enumerate(self.rules))
+        self._predicates = [(self.bits[name], predicate)
+                            for name, predicate in self.rules]
+
+    def _rows(self, planes, objectives, conflicts):
+        """Get the values of COLUMNS for each plane, as tuples."""
+        objectives = [(obj.x, obj.z, obj.altitude) for obj in objectives]
+        limits = {} # aircraft type -> its speed limits
+        altitude_within = self.altitude_within
+        output = []
+        for plane in planes:
+            aircraft_type = plane._aircraft_type
+            try:
+                max_speed, overspeed, stall_speed = limits[aircraft_type]
+            except KeyError:
+                max_speed, overspeed, stall_speed = \
+                    limits[aircraft_type] = (
+                        aircraft_type.max_speed, aircraft_type.overspeed,
+                        aircraft_type.stall_speed)
+            x, z = plane._pos
+            objective_altitude = NAN
+            best = None
+            for obj_x, obj_z, obj_altitude in objectives:
+                distance = (obj_x-x) ** 2 + (obj_z-z) ** 2
+                if best is None or distance < best:
+                    best = distance
+                    objective_altitude = obj_altitude
+            output.append((
+                plane._altitude, plane._speed, vertical_speed(plane),
+                roll_degrees(plane), max_speed, overspeed, stall_speed,
+                int(plane._autopilot_info['enabled']),
+                int(conflicts is not None
+                    and bool(conflicts.conflicts_for(plane._id))),
+                objective_altitude, altitude_within))
+        return output
+
+    def _columns(self, planes, objectives, conflicts):
+        """Get COLUMNS as NumPy arrays with a value per plane.
+
+        Only the planes' attributes are read a plane at a time; the
+        values derived from them are computed over the whole batch."""
+        types = {} # aircraft type -> its index
+        raw = []
+        for plane in planes:
+            x, z = plane._pos
+            raw.append((
+                plane._altitude, plane._speed, plane._pitch,
+                plane._gravity, plane._roll_level, x, z,
+                types.setdefault(plane._aircraft_type, len(types)),
+                plane._autopilot_info['enabled'],
+                conflicts is not None
+                and bool(conflicts.conflicts_for(plane._id))))
+        (altitude, speed, pitch, gravity, roll_level, x, z, type_index,
+         autopilot, traffic) = numpy.array(raw, dtype=float).T
+        type_index = type_index.astype(int)
+        types = sorted(types, key=types.get)
+        limits = numpy.array([(aircraft_type.max_speed,
+                               aircraft_type.overspeed,
+                               aircraft_type.stall_speed)
+                              for aircraft_type in types])[type_index]
+        roll = numpy.empty(len(planes))
+        for index, aircraft_type in enumerate(types):
+            which = type_index == index
+            roll[which] = _curve_map(
+                aircraft_type.performance.roll_degrees, roll_level[which])
+        if objectives:
+            objectives = numpy.array([(obj.x, obj.z, obj.altitude)
+                                      for obj in objectives])
+            distance = ((objectives[:, 0] - x[:, None]) ** 2
+                        + (objectives[:, 1] - z[:, None]) ** 2)
+            objective_altitude = objectives[distance.argmin(axis=1), 2]
+        else:
+            objective_altitude = numpy.full(len(planes), NAN)
+        return {
+            'altitude': altitude,
+            'speed': speed,
+            'vertical_speed': speed * numpy.sin(pitch) - gravity,
+            'roll_degrees': roll,
+            'max_speed': limits[:, 0],
+            'overspeed': limits[:, 1],
+            'stall_speed': limits[:, 2],
+            'autopilot': autopilot,
+            'traffic': traffic,
+            'objective_altitude': objective_altitude,
+            'altitude_within': self.altitude_within,
+        }
+
+    def evaluate(self, planes, objectives=(), conflicts=None):
+        """Set every plane's warnings bitmask.
+
+        conflicts is an optional conflicts.ConflictDetector that has
+        been updated for these planes."""
+        planes = list(planes)
+        objectives = list(objectives)
+        if numpy is None or len(planes) < self.BATCH_MIN:
+            for plane, row in zip(planes, self._rows(planes, objectives,
+                                                     conflicts)):
+                columns = dict(zip(COLUMNS, row))
+                mask = 0
+                for bit, predicate in self._predicates:
+                    if predicate(columns):
+                        mask |= bit
+                plane._warnings = mask
+            return
+        columns = self._columns(planes, objectives, conflicts)
+        masks = numpy.zeros(len(planes), dtype=int)
+        with numpy.errstate(invalid='ignore'): # NaN: no objective
+            for bit, predicate in self._predicates:
+                masks[predicate(columns)] |= bit
+        for plane, mask in zip(planes, masks.tolist()):
+            plane._warnings = mask
+
+    def mask(self, *names):
+        """Get the bitmask with the bits of the warnings named."""
+        output = 0
+        for name in names:
+            output |= self.bits[name]
+        return output
+
+    def names(self, mask):
+        """Get the names of the warnings in a bitmask."""
+        return [name for name, _ in self.rules if mask & self.bits[name]]
@@ -0,0 +1,383 @@
+#!/usr/bin/env python
+
+"""Flight log analysis
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Reads the debug logs written with --log-level DEBUG (see Client.log)
+and computes, for every plane in every session:
+ -> how long each warning was on
+ -> how long it took to capture each objective
+ -> how fast it was damaged, and its score per minute
+Logs are read in blocks of rows by logparser, and each block is
+turned into NumPy columns (one row per plane per sample) that are
+analyzed at once, so any number of logs can be analyzed without
+loading them all.  Logs are analyzed in parallel.
+
+The warnings are the rules in alerts.RULES, run on the logs' NumPy
+columns (see warning_rules).  Rules that
+use something the logs don't record (like whether the autopilot is
+on) are left out.  Logs don't record aircraft types, so one type is
+assumed for every plane.
+
+Needs NumPy.  Usage: python analytics.py LOG_OR_FOLDER...
+(python analytics.py --check compares the rules with the live ones)
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import os
+import sys
+
+try:
+    import numpy
+except ImportError: # Checked when the logs are analyzed
+    numpy = None
+
+import aircraft
+import alerts
+import logparser
+
+# Columns of the chunks analyzed
+COLUMNS = ('time', 'plane', 'altitude', 'speed', 'vertical_speed',
+           'roll', 'points', 'damage', 'objective_altitude')
+
+
+## reading
+def read_chunks(path):
+    """Read a log in chunks.  Yields (session, columns).
+
+    columns is a dict of NumPy arrays, one for each of COLUMNS, with
+    a row per plane per log row.  vertical_speed includes gravity
+    (see total_vertical_speed).  objective_altitude is the altitude
+    of the objective closest to the plane, or NaN."""
+    for block in logparser.read_blocks(path):
+        planes = block.planes.shape[1]
+        columns = dict((name, block.plane_column(column).ravel())
+                       for name, column in (
+                           ('plane', 'id'), ('altitude', 'altitude'),
+                           ('speed', 'speed'), ('roll', 'roll'),
+                           ('points', 'points'), ('damage', 'damage')))
+        columns['vertical_speed'] = total_vertical_speed(
+            block.plane_column('vertical_speed'),
+            block.plane_column('gravity')).ravel()
+        columns['time'] = numpy.repeat(block.time, planes)
+        columns['objective_altitude'] = closest_altitudes(
+            block.plane_column('x'), block.plane_column('z'),
+            block.objective_column('x'), block.objective_column('z'),
+            block.objective_column('altitude')).ravel()
+        yield block.session, columns
+
+
+def total_vertical_speed(vertical_speed, gravity):
+    """Get the vertical speed the warnings use, from the logged VSPD
+    (without gravity) and GRAV columns; see alerts.vertical_speed.
+
+    Older logs don't have GRAV, so their gravity (NaN) is taken as 0."""
+    return vertical_speed - numpy.nan_to_num(gravity)
+
+
+def closest_altitudes(x, z, objective_x, objective_z, altitudes):
+    """Get the altitude of the objective closest to each plane.
+
+    x and z are (rows, planes) arrays, and the objectives' are
+    (rows, objectives) arrays.  Returns a (rows, planes) array, NaN
+    where there are no objectives."""
+    rows, planes = x.shape
+    if not objective_x.shape[1]:
+        return numpy.full((rows, planes), numpy.nan)
+    distances = ((x[:, :, None] - objective_x[:, None, :]) ** 2
+                 + (z[:, :, None] - objective_z[:, None, :]) ** 2)
+    closest = distances.argmin(axis=2)
+    return altitudes[numpy.arange(rows)[:, None], closest]
+
+
+## warnings
+def warning_rules(aircraft_type=aircraft.DEFAULT_TYPE,
+                  altitude_within=alerts.ALTITUDE_WITHIN):
+    """Get the warnings the logs can show, as NumPy functions.
+
+    Returns [(name, function), ...]; each function takes a chunk's
+    columns and returns a boolean array.  They are alerts.RULES, run
+    on the chunk with the aircraft type's limits; the autopilot and
+    traffic warnings are left out, because the logs don't record
+    them."""
+    if numpy is None:
+        raise ImportError("analytics needs NumPy.")
+    aircraft_type = aircraft.get(aircraft_type)
+    limits = {
+        'max_speed': aircraft_type.max_speed,
+        'overspeed': aircraft_type.overspeed,
+        'stall_speed': aircraft_type.stall_speed,
+        'altitude_within': altitude_within,
+    }
+
+    def rule(predicate):
+        """Run an alerts rule on a chunk's columns."""
+        def function(columns):
+            """Get where the rule is on."""
+            alert_columns = dict(columns, **limits)
+            alert_columns['roll_degrees'] = numpy.degrees(columns['roll'])
+            with numpy.errstate(invalid='ignore'): # NaN: no objective
+                return predicate(alert_columns)
+        function.__doc__ = predicate.__doc__
+        return function
+
+    return [(name, rule(predicate)) for name, predicate in alerts.RULES
+            if name not in ('autopilot', 'traffic')]
+
+
+## analysis
+class FlightStats(object):
+    """What one plane did in one session of a log."""
+    def __init__(self, log, session, plane, warning_names):
+        """Initialize the instance with nothing recorded."""
+        self.log = log
+        self.session = session
+        self.plane = plane
+        self.warning_names = warning_names
+        self.samples = 0
+        self.start = None
+        self.end = None
+        self.warning_time = numpy.zeros(len(warning_names))
+        self.capture_latencies = []
+        self.first_damage = 0
+        self.damage = 0
+        self.score = 0
+        self._last_capture = None
+        self._last = None # (time, warnings, points) of the last sample
+
+    def __repr__(self):
+        """Display the plane's results."""
+        return ("<FlightStats {} #{} plane {}: {:.0f}s, score {:.0f}, "
+                "{} captures, damage {:.1f}>".format(
+                    os.path.basename(self.log), self.session, self.plane,
+                    self.duration, self.score,
+                    len(self.capture_latencies), self.damage))
+
+    @property
+    def duration(self):
+        """Get how long the plane was logged for, in seconds."""
+        if self.start is None:
+            return 0
+        return self.end - self.start
+    @property
+    def warnings(self):
+        """Get a dict of warning name: seconds it was on."""
+        return dict(zip(self.warning_names, self.warning_time))
+    @property
+    def damage_rate(self):
+        """Get the damage taken per minute."""
+        if not self.duration:
+            return 0
+        return (self.damage-self.first_damage) / self.duration * 60
+    @property
+    def score_per_minute(self):
+        """Get the points scored per minute."""
+        if not self.duration:
+            return 0
+        return self.score / self.duration * 60
+
+    def add(self, time_, warnings, points, damage):
+        """Add this plane's samples from a chunk, in time order.
+
+        warnings is a (rules, samples) boolean array.  A warning
+        counts as on until the next sample."""
+        if not len(time_):
+            return
+        if self._last is None:
+            self.start = time_[0]
+            self.first_damage = damage[0]
+            self._last_capture = time_[0]
+        else:
+            last_time, last_warnings, last_points = self._last
+            time_ = numpy.concatenate(([last_time], time_))
+            warnings = numpy.concatenate(
+                (last_warnings[:, None], warnings), axis=1)
+            points = numpy.concatenate(([last_points], points))
+        self.samples += len(damage)
+        intervals = numpy.diff(time_)
+        self.warning_time += (warnings[:, :-1] * intervals).sum(axis=1)
+        captured = numpy.diff(points) > 0
+        capture_times = time_[1:][captured]
+        if len(capture_times):
+            self.capture_latencies.extend(numpy.diff(
+                numpy.concatenate(([self._last_capture], capture_times))))
+            self._last_capture = capture_times[-1]
+        self.end = time_[-1]
+        self.damage = damage[-1]
+        self.score = points[-1]
+        self._last = (time_[-1], warnings[:, -1], points[-1])
+
+
+def analyze_log(path, rules=None):
+    """Analyze a log.  Returns a list of FlightStats.
+
+    rules are from warning_rules (by default, for the default
+    aircraft type)."""
+    if rules is None:
+        rules = warning_rules()
+    names = [name for name, _ in rules]
+    flights = {}
+    output = []
+    for session, columns in read_chunks(path):
+        warnings = numpy.array([rule(columns) for _, rule in rules]) \
+            .reshape(len(rules), -1)
+        planes = columns['plane']
+        # Group each plane's rows, keeping them in time order
+        order = numpy.argsort(planes, kind='mergesort')
+        plane_ids, starts = numpy.unique(planes[order], return_index=True)
+        ends = list(starts[1:]) + [len(order)]
+        for plane, start, end in zip(plane_ids, starts, ends):
+            rows = order[start:end]
+            key = (session, int(plane))
+            if key not in flights:
+                flights[key] = FlightStats(path, session, int(plane), names)
+                output.append(flights[key])
+            flights[key].add(columns['time'][rows], warnings[:, rows],
+                             columns['points'][rows],
+                             columns['damage'][rows])
+    return output
+
+
+def analyze(paths, processes=None):
+    """Analyze logs, or folders of them, in parallel.
+
+    Yields FlightStats, log by log."""
+    for flights in logparser.parse_logs(analyze_log, paths, processes):
+        for flight in flights:
+            yield flight
+
+
+class Summary(object):
+    """Totals over many FlightStats, added one at a time."""
+    def __init__(self, warning_names):
+        """Initialize the instance."""
+        self.warning_names = warning_names
+        self.flights = 0
+        self.duration = 0
+        self.score = 0
+        self.damage = 0
+        self.warning_time = numpy.zeros(len(warning_names))
+        self.capture_latencies = []
+
+    def add(self, flight):
+        """Add a flight's results."""
+        self.flights += 1
+        self.duration += flight.duration
+        self.score += flight.score
+        self.damage += flight.damage - flight.first_damage
+        self.warning_time += flight.warning_time
+        self.capture_latencies.extend(flight.capture_latencies)
+
+    def report(self):
+        """Get the totals as text."""
+        minutes = self.duration / 60
+        latencies = numpy.array(self.capture_latencies)
+        lines = [
+            "{} flights, {:.1f} minutes".format(self.flights, minutes),
+            "score per minute: {:.2f}".format(
+                self.score / minutes if minutes else 0),
+            "damage per minute: {:.2f}".format(
+                self.damage / minutes if minutes else 0),
+        ]
+        if len(latencies):
+            lines.append("capture latency: {} captures, median {:.1f}s, "
+                         "mean {:.1f}s".format(
+                             len(latencies), numpy.median(latencies),
+                             latencies.mean()))
+        else:
+            lines.append("capture latency: no captures")
+        lines.append("time in warning:")
+        for name, seconds in zip(self.warning_names, self.warning_time):
+            lines.append("  {:<12}{:>8.1f}s ({:.1f}%)".format(
+                name, seconds,
+                seconds / self.duration * 100 if self.duration else 0))
+        return '\n'.join(lines)
+
+
+def check_warning_rules(count=5000, seed=0):
+    """Check that warning_rules give the same warnings as the live
+    alerts.WarningEngine, for the same random planes.
+
+    The columns are made from what Client.log writes.  Raises
+    AssertionError if any warning differs."""
+    import random
+    from objects import Airplane, Objective
+    generator = random.Random(seed)
+    objectives = [Objective(generator.uniform(0, 100000),
+                            generator.uniform(0, 100000), 10, 10,
+                            generator.uniform(7500, 20000))
+                  for _ in range(3)]
+    planes = []
+    for i in range(count):
+        plane = Airplane(generator.uniform(0, 100000),
+                         generator.uniform(0, 100000), 10, 10,
+                         generator.choice((
+                             0, generator.uniform(0, 1500),
+                             generator.uniform(0, 20000))), player_id=i)
+        plane.speed = generator.uniform(0, 600)
+        plane.roll_level = generator.uniform(-4, 4)
+        plane.vertical_roll_level = generator.uniform(-4, 4)
+        plane.pitch_degrees = plane.vertical_roll_level * 10
+        plane.gravity = generator.choice((0, generator.uniform(0, 100)))
+        planes.append(plane)
+    engine = alerts.WarningEngine()
+    engine.evaluate(planes, objectives)
+    def column(values):
+        """Make a (1, planes) column."""
+        return numpy.array([values], dtype=float)
+    columns = {
+        'altitude': column([plane.altitude for plane in planes]),
+        'speed': column([plane.speed for plane in planes]),
+        'vertical_speed': total_vertical_speed(
+            column([plane.vertical_velocity for plane in planes]),
+            column([plane.gravity for plane in planes])),
+        'roll': column([plane.roll for plane in planes]),
+        'objective_altitude': closest_altitudes(
+            column([plane.x for plane in planes]),
+            column([plane.z for plane in planes]),
+            column([obj.x for obj in objectives]),
+            column([obj.z for obj in objectives]),
+            column([obj.altitude for obj in objectives])),
+    }
+    columns = dict((name, values.ravel())
+                   for name, values in columns.items())
+    for name, rule in warning_rules():
+        live = numpy.array([bool(plane._warnings & engine.mask(name))
+                            for plane in planes])
+        found = rule(columns)
+        if (found != live).any():
+            raise AssertionError("{}: {} of {} planes differ".format(
+                name, (found != live).sum(), count))
+        print("{:<12}{:>6} planes warned, same as live".format(
+            name, live.sum()))
+
+
+def main(paths):
+    """Print a summary of the logs in paths."""
+    summary = Summary([name for name, _ in warning_rules()])
+    for flight in analyze(paths):
+        summary.add(flight)
+    print(summary.report())
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['--check']:
+        check_warning_rules()
+    else:
+        main(sys.argv[1:] or ['logs'])
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+
+"""Sound and music playback
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import logging
+import time
+
+import pygame
+
+from music import MusicPlayer
+
+
+class AudioManager(object):
+    """Plays sounds on a reserved pool of mixer channels, and music.
+
+    A sound that is already playing isn't started again.  When every
+    channel is busy, a sound stops the least important one playing if
+    that is less important than itself, and is queued otherwise.
+
+    Music is streamed by a music.MusicPlayer, which holds the tracks.
+
+    If the manager is disabled, the mixer is never initialized and
+    every method does nothing."""
+    CHANNELS = 4
+    MAX_QUEUE_AGE = 2 # Queued sounds older than this are dropped (s)
+    # Lower numbers are more important
+    PRIORITIES = {
+        'pullup': 0,
+        'terrain': 1,
+        'stall': 2,
+        'overspeed': 3,
+        'bankangle': 4,
+        'apdisconnect': 5,
+        'altitude': 6,
+    }
+    DEFAULT_PRIORITY = 10
+    def __init__(self, enabled=True, channels=CHANNELS):
+        """Initialize the instance.  Call init to start the mixer."""
+        self.enabled = enabled
+        self.channel_count = channels
+        self.sounds = {}
+        self.channels = []
+        self.playing = [] # The name last played on each channel
+        self.queue = [] # [(priority, time queued, name), ...]
+        self.music = MusicPlayer()
+        self._music_volume = 1
+
+    def init(self, frequency=44100, size=-16, stereo=2, buffer_=2048):
+        """Initialize the mixer and reserve the channels."""
+        if not self.enabled:
+            return
+        try:
+            pygame.mixer.pre_init(frequency, size, stereo, buffer_)
+            pygame.mixer.init()
+        except pygame.error as e:
+            logging.warning("Audio disabled: %s", e)
+            self.enabled = False
+            return
+        pygame.mixer.set_reserved(self.channel_count)
+        self.channels = [pygame.mixer.Channel(i)
+                         for i in range(self.channel_count)]
+        self.playing = [None] * self.channel_count
+        pygame.mixer.music.set_volume(self._music_volume)
+
+    def load(self, name, sound_file):
+        """Load a sound under name."""
+        if self.enabled:
+            self.sounds[name] = pygame.mixer.Sound(sound_file)
+
+    def priority(self, name):
+        """Get how important a sound is; lower is more important."""
+        return self.PRIORITIES.get(name, self.DEFAULT_PRIORITY)
+
+    def is_playing(self, name):
+        """Return whether a sound is playing."""
+        for channel, playing in zip(self.channels, self.playing):
+            if playing == name and channel.get_busy():
+                return True
+        return False
+
+    def play(self, name):
+        """Play a sound, or queue it.  Returns whether it started."""
+        if not self.enabled or name not in self.sounds:
+            return False
+        if self.is_playing(name):
+            return False
+        priority = self.priority(name)
+        index = self._free_channel()
+        if index is None: # Try to stop something less important
+            busy = [(self.priority(playing), i)
+                    for i, playing in enumerate(self.playing)]
+            least_important, index = max(busy)
+            if least_important <= priority:
+                if name not in [queued for _, _, queued in self.queue]:
+                    self.queue.append((priority, time.time(), name))
+                return False
+            self.channels[index].stop()
+        self.channels[index].play(self.sounds[name])
+        self.playing[index] = name
+        return True
+
+    def update(self):
+        """Play queued sounds on channels that have become free.
+
+        Call every frame.  Also starts and closes music tracks."""
+        if self.enabled:
+            self.music.update()
+        if not self.queue:
+            return
+        now = time.time()
+        self.queue = [entry for entry in self.queue
+                      if now - entry[1] <= self.MAX_QUEUE_AGE]
+        self.queue.sort()
+        while self.queue:
+            index = self._free_channel()
+            if index is None:
+                break
+            name = self.queue.pop(0)[2]
+            if not self.is_playing(name):
+                self.channels[index].play(self.sounds[name])
+                self.playing[index] = name
+
+    def stop_sounds(self):
+        """Stop every sound and empty the queue."""
+        self.queue = []
+        for channel in self.channels:
+            channel.stop()
+
+    def stop(self):
+        """Stop every sound and the music."""
+        self.stop_sounds()
+        if self.enabled:
+            self.music.stop()
+
+    def _free_channel(self):
+        """Get the index of an idle channel, or None."""
+        for index, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                return index
+        return None
+
+    ## music
+    @property
+    def music_volume(self):
+        """Get the music's volume, from 0 to 1."""
+        return self._music_volume
+    @music_volume.setter
+    def music_volume(self, new_value):
+        """Set the music's volume, from 0 to 1."""
+        if not isinstance(new_value, (int, float)):
+            raise TypeError("Volume must be a number.")
+        self._music_volume = max(min(new_value, 1), 0)
+        if self.enabled:
+            pygame.mixer.music.set_volume(self._music_volume)
+
+    def play_music(self, name, loops=-1, fade=MusicPlayer.CROSSFADE):
+        """Switch the music to the track named name.
+
+        The old track fades out, then the new one fades in, over fade
+        milliseconds each."""
+        if self.enabled:
+            self.music.play(name, loops, fade)
+
+    def fadeout_music(self, milliseconds):
+        """Fade the music out."""
+        if self.enabled:
+            self.music.fadeout(milliseconds)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+"""The autopilot
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+An engaged autopilot either centres the controls and then disengages
+(the original autopilot, used when it has no targets), or holds any
+of these targets until it is disengaged:
+ -> altitude: with the vertical roll
+ -> heading: with the roll
+ -> speed: with the throttle
+ -> objective: flies to an objective, by holding the heading to it
+    and its altitude
+Controls without a target are centred.  step evaluates every plane's
+autopilot once per tick.
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import math
+
+TARGETS = ('altitude', 'heading', 'speed', 'objective')
+
+# Control laws
+ALTITUDE_GAIN = 0.1 # Climb rate in m/s per metre of altitude error
+MAX_CLIMB_RATE = 50 # m/s
+HEADING_GAIN = 8 # Roll level per radian of heading error
+MAX_ROLL_LEVEL = 2
+SPEED_GAIN = 0.5 # Acceleration in m/s^2 per m/s of speed error
+# How fast the autopilot moves the controls, per second
+ROLL_RATE = 2
+VERTICAL_ROLL_RATE = 2
+THROTTLE_RATE = 25
+
+
+def approach(value, target, max_change):
+    """Move value towards target by at most max_change."""
+    if target > value + max_change:
+        return value + max_change
+    elif target < value - max_change:
+        return value - max_change
+    return target
+
+
+def step(planes, tick_duration, objectives=None):
+    """Run the autopilots of planes for tick_duration seconds.
+
+    objectives are used to look up objective targets; if it is None,
+    planes flying to an objective keep the heading and altitude last
+    computed for it.  An objective that is not in objectives any more
+    is dropped, and the plane holds its current course."""
+    if objectives is not None:
+        objectives = dict((obj.id_, obj) for obj in objectives)
+    decay = 0.5 ** tick_duration
+    max_roll_change = ROLL_RATE * tick_duration
+    max_vert_roll_change = VERTICAL_ROLL_RATE * tick_duration
+    max_throttle_change = THROTTLE_RATE * tick_duration
+    full_turn = math.pi * 2
+    atan2 = math.atan2
+    asin = math.asin
+    degrees = math.degrees
+    for plane in planes:
+        info = plane._autopilot_info
+        if not info['enabled']:
+            continue
+        targets = info['targets']
+        if targets['objective'] is not None and objectives is not None:
+            objective = objectives.get(targets['objective'])
+            if objective is None: # Captured, or gone
+                targets['objective'] = None
+            else:
+                targets['heading'] = atan2(
+                    objective.x - plane._pos[0],
+                    plane._pos[1] - objective.z) % full_turn
+                targets['altitude'] = objective.altitude
+        altitude = targets['altitude']
+        heading = targets['heading']
+        speed = targets['speed']
+        if altitude is None and heading is None and speed is None:
+            center(plane, decay)
+            continue
+
+        # roll
+        if heading is None:
+            roll_level = 0
+        else:
+            error = ((heading - plane._heading + math.pi) % full_turn
+                     - math.pi)
+            roll_level = max(min(error * HEADING_GAIN, MAX_ROLL_LEVEL),
+                             -MAX_ROLL_LEVEL)
+        plane._roll_level = approach(
+            plane._roll_level, roll_level, max_roll_change)
+
+        # vertical roll
+        if altitude is None:
+            vertical_roll_level = 0
+        else:
+            climb_rate = max(min(
+                (altitude-plane._altitude) * ALTITUDE_GAIN,
+                MAX_CLIMB_RATE), -MAX_CLIMB_RATE)
+            # Pitch so the climb makes up for gravity too
+            sine = (climb_rate + plane._gravity) / max(plane._speed, 1)
+            vertical_roll_level = max(min(
+                degrees(asin(max(min(sine, 1), -1))) / 10, 4), -4)
+        plane._vertical_roll_level = approach(
+            plane._vertical_roll_level, vertical_roll_level,
+            max_vert_roll_change)
+
+        # throttle
+        if speed is None:
+            throttle = 50
+        else:
+            performance = plane._aircraft_type.performance
+            thrust = (performance.at_speed(plane._speed)[1]
+                      + (speed-plane._speed) * SPEED_GAIN)
+            throttle = min((max(thrust, 0) * 250) ** 0.5,
+                           performance.max_safe_throttle)
+        plane._throttle = approach(
+            plane._throttle, throttle, max_throttle_change)
+
+
+def center(plane, decay):
+    """Centre a plane's controls, and disengage once they are.
+
+    decay is how much of the controls' offsets is left after the
+    tick."""
+    info = plane._autopilot_info
+    conditions = info['conditions']
+    if abs(plane._roll_level) < 0.1:
+        plane._roll_level = 0
+        conditions['roll-centered'] = True
+    if abs(plane._vertical_roll_level) < 0.1:
+        plane._vertical_roll_level = 0
+        conditions['vertical-roll-centered'] = True
+    if abs(50 - plane._throttle) < 1:
+        plane._throttle = 50
+        conditions['throttle-centered'] = True
+    if all(conditions.values()):
+        info['enabled'] = False
+        return
+    plane._roll_level *= decay
+    plane._vertical_roll_level *= decay
+    plane._throttle = 50 + (plane._throttle-50) * decay
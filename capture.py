@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+
+"""Frame capture into shared memory
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+A FrameRing is a ring of frame buffers in a block of shared memory,
+allocated once.  The game copies each frame's pixels straight from
+the surface's buffer into the next slot, in the surface's own pixel
+format: one copy of contiguous memory, instead of converting every
+pixel like pygame.image.tostring.  Other processes attach to the ring
+by name and read the frames in place, as NumPy views; rgb gives an
+(height, width, 3) view of a frame without copying it.
+
+Memory layout: a header of int64s (see HEADER_FIELDS, then the number
+of the frame in each slot), then the slots.  A slot's frame number is
+-1 while it is being written, so a reader can check that a frame
+wasn't overwritten while it was reading it (see FrameRing.valid).
+
+Needs NumPy and Python 3.8+.  Usage: python capture.py NAME (prints
+the frame rate of the ring called NAME)
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import sys
+import time
+
+import numpy
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError: # Before Python 3.8
+    resource_tracker = shared_memory = None
+
+SLOTS = 4
+HEADER_FIELDS = ('width', 'height', 'pitch', 'bytesize', 'red',
+                 'green', 'blue', 'slots', 'frames')
+ALIGNMENT = 64 # Slots start on cache lines
+
+
+def surface_pixels(surface):
+    """Get a (height, pitch) uint8 NumPy view of a surface's pixels.
+
+    The surface is locked until the view is deleted; it can't be
+    blitted to until then."""
+    return numpy.frombuffer(surface.get_buffer(), numpy.uint8).reshape(
+        surface.get_height(), surface.get_pitch())
+
+
+def _channel_offsets(surface):
+    """Get the byte offsets of red, green and blue in a pixel."""
+    offsets = []
+    for shift in surface.get_shifts()[:3]:
+        if shift % 8:
+            raise ValueError("Surfaces must have whole byte channels.")
+        offset = shift // 8
+        if sys.byteorder == 'big':
+            offset = surface.get_bytesize() - 1 - offset
+        offsets.append(offset)
+    return offsets
+
+
+class FrameRing(object):
+    """A ring of frames in shared memory.
+
+    The game creates it with create and writes frames to it; readers
+    attach to it by name."""
+    def __init__(self, memory, owner=False):
+        """Initialize the instance.  Use create or attach."""
+        self.memory = memory
+        self.owner = owner
+        fields = len(HEADER_FIELDS)
+        self._header = numpy.ndarray(fields, numpy.int64, memory.buf)
+        self.format = dict(zip(HEADER_FIELDS, self._header.tolist()))
+        slots = self.format['slots']
+        self._slot_frames = numpy.ndarray(
+            slots, numpy.int64, memory.buf, fields * 8)
+        frame_bytes = self.format['height'] * self.format['pitch']
+        self._slots = numpy.ndarray(
+            (slots, self.format['height'], self.format['pitch']),
+            numpy.uint8, memory.buf, _header_size(slots),
+            (_aligned(frame_bytes), self.format['pitch'], 1))
+
+    def __repr__(self):
+        """Display the ring's name, size and frames."""
+        return "<FrameRing {} {}x{}, {} slots, {} frames>".format(
+            self.name, self.format['width'], self.format['height'],
+            self.slots, self.frames)
+
+    @classmethod
+    def create(cls, surface, slots=SLOTS, name=None):
+        """Create a ring for frames like surface.
+
+        name is the shared memory's name; by default, one is made
+        up.  Close and unlink the ring when it is finished."""
+        if shared_memory is None:
+            raise ValueError("Frame rings need Python 3.8 or newer.")
+        if slots < 2:
+            raise ValueError("A frame ring needs at least 2 slots.")
+        height, pitch = surface.get_height(), surface.get_pitch()
+        memory = shared_memory.SharedMemory(
+            name, create=True,
+            size=_header_size(slots) + _aligned(height*pitch) * slots)
+        header = numpy.ndarray(len(HEADER_FIELDS) + slots, numpy.int64,
+                               memory.buf)
+        header[:len(HEADER_FIELDS)] = (
+            [surface.get_width(), height, pitch, surface.get_bytesize()]
+            + _channel_offsets(surface) + [slots, 0])
+        header[len(HEADER_FIELDS):] = -1
+        del header # Views must be gone before the memory is closed
+        return cls(memory, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """Attach to the ring called name."""
+        if shared_memory is None:
+            raise ValueError("Frame rings need Python 3.8 or newer.")
+        try:
+            memory = shared_memory.SharedMemory(name, track=False)
+        except TypeError: # Before Python 3.13
+            memory = shared_memory.SharedMemory(name)
+            # Otherwise the ring is unlinked when this process exits
+            resource_tracker.unregister(memory._name, 'shared_memory')
+        return cls(memory)
+
+    @property
+    def name(self):
+        """Get the shared memory's name."""
+        return self.memory.name
+    @property
+    def slots(self):
+        """Get the number of slots."""
+        return len(self._slot_frames)
+    @property
+    def frames(self):
+        """Get the number of frames written."""
+        return int(self._header[-1])
+
+    def write(self, surface):
+        """Copy a surface's pixels into the next slot.
+
+        Returns the frame's number."""
+        if (surface.get_size() != (self.format['width'],
+                                   self.format['height'])
+                or surface.get_pitch() != self.format['pitch']):
+            raise ValueError("Frames must be like the ring's surface.")
+        frame = self.frames
+        slot = frame % self.slots
+        self._slot_frames[slot] = -1 # Being written
+        pixels = surface_pixels(surface)
+        try:
+            self._slots[slot] = pixels
+        finally:
+            del pixels # Unlocks the surface
+        self._slot_frames[slot] = frame
+        self._header[-1] = frame + 1
+        return frame
+
+    def valid(self, frame):
+        """Return whether frame is in the ring, and not being
+        overwritten."""
+        return self._slot_frames[frame % self.slots] == frame
+
+    def pixels(self, frame):
+        """Get a (height, pitch) view of a frame's raw pixels.
+
+        Returns None if the frame is not in the ring.  The view is
+        only valid until the frame is overwritten; check with valid
+        after using it."""
+        if not self.valid(frame):
+            return None
+        return self._slots[frame % self.slots]
+
+    def rgb(self, frame):
+        """Get a (height, width, 3) view of a frame's colors.
+
+        Returns None if the frame is not in the ring; see pixels."""
+        pixels = self.pixels(frame)
+        if pixels is None:
+            return None
+        width, bytesize = self.format['width'], self.format['bytesize']
+        pixels = pixels[:, :width*bytesize].reshape(
+            self.format['height'], width, bytesize)
+        red, green, blue = (self.format['red'], self.format['green'],
+                            self.format['blue'])
+        step = green - red
+        if abs(step) == 1 and blue - green == step:
+            stop = blue + step
+            return pixels[:, :, red:stop if stop >= 0 else None:step]
+        return pixels[:, :, [red, green, blue]] # Copies
+
+    def wait(self, frame, timeout=None, interval=0.001):
+        """Wait until frame has been written.  Returns whether it has."""
+        end = None if timeout is None else time.time() + timeout
+        while self.frames <= frame:
+            if end is not None and time.time() >= end:
+                return False
+            time.sleep(interval)
+        return True
+
+    def close(self):
+        """Stop using the shared memory.  Views of it must be gone."""
+        self._header = self._slot_frames = self._slots = None
+        self.memory.close()
+
+    def unlink(self):
+        """Free the shared memory, once every process has closed it."""
+        self.memory.unlink()
+
+
+def _aligned(size):
+    """Round size up to a multiple of ALIGNMENT."""
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+def _header_size(slots):
+    """Get the size of the header of a ring with slots slots."""
+    return _aligned((len(HEADER_FIELDS) + slots) * 8)
+
+
+def main(name):
+    """Print how many frames a ring receives, and how many are missed,
+    every second."""
+    ring = FrameRing.attach(name)
+    try:
+        frame = ring.frames
+        while True:
+            start = time.time()
+            read = missed = 0
+            while time.time() - start < 1:
+                if not ring.wait(frame, 1):
+                    continue
+                if ring.frames - frame > ring.slots - 1: # Fell behind
+                    missed += ring.frames - frame - 1
+                    frame = ring.frames - 1
+                rgb = ring.rgb(frame)
+                if rgb is not None:
+                    rgb.mean() # Stands in for real work
+                    del rgb
+                if ring.valid(frame):
+                    read += 1
+                else:
+                    missed += 1
+                frame += 1
+            print("{} frames/s, {} missed".format(read, missed))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+
+if __name__ == '__main__':
+    main(sys.argv[1])
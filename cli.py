@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+"""Command line handling
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+This module only imports the standard library, so the arguments are
+handled (and --version answered) before pygame and the game modules
+are imported.
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import argparse
+import sys
+import time
+
+from __init__ import __version__
+
+DEFAULT_AIRCRAFT = 'default' # aircraft.DEFAULT_TYPE, without importing it
+
+
+def aircraft_type(name):
+    """Check that name is a type in aircraft.txt, for argparse."""
+    if name == DEFAULT_AIRCRAFT:
+        return name
+    import aircraft # Only the standard library
+    try:
+        aircraft.load_aircraft_types()
+    except (IOError, OSError, ValueError): # The game will warn
+        pass
+    if name not in aircraft.AIRCRAFT_TYPES:
+        raise argparse.ArgumentTypeError(
+            "unknown aircraft type {!r} (choose from {})".format(
+                name, ', '.join(sorted(aircraft.AIRCRAFT_TYPES))))
+    return name
+
+
+def positive_int(value):
+    """Parse a whole number that is at least 1, for argparse."""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            "{!r} is not a whole number of at least 1".format(value))
+    return number
+
+
+def make_parser():
+    """Make the parser for the game's command line arguments."""
+    parser = argparse.ArgumentParser(prog='slight-fimulator')
+    parser.add_argument(
+        '-v', '--version', action='store_true',
+        help='display the version and exit')
+    parser.add_argument(
+        '--log-to-file', action='store_true',
+        help='log to a file instead of stdout')
+    parser.add_argument(
+        '--log-level', default='WARNING',
+        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+        help='the least important log item type to display')
+    parser.add_argument(
+        '--aircraft', type=aircraft_type, default=DEFAULT_AIRCRAFT,
+        help='the type of aircraft to fly (see aircraft.txt)')
+    parser.add_argument(
+        '--traffic', type=int, default=0, metavar='N',
+        help='the number of AI planes to fly with')
+    parser.add_argument(
+        '--no-audio', action='store_true',
+        help="don't initialize the mixer or play any sound")
+    parser.add_argument(
+        '--headless', action='store_true',
+        help='draw offscreen, without a window or sound, and run as '
+        'fast as possible')
+    parser.add_argument(
+        '--record', metavar='PATH',
+        help='save the frames as a video (if PATH ends with a video '
+        'extension; needs ffmpeg) or as images in the folder PATH')
+    parser.add_argument(
+        '--record-every', type=positive_int, default=1, metavar='N',
+        help='only record every Nth frame')
+    parser.add_argument(
+        '--record-format', default='tga',
+        choices=['tga', 'png', 'bmp', 'jpg'],
+        help='the image format for recording to a folder')
+    parser.add_argument(
+        '--record-input', metavar='PATH',
+        help='save the controls to PATH, to replay later')
+    parser.add_argument(
+        '--replay-input', metavar='PATH',
+        help='fly the plane with the controls saved in PATH instead of '
+        'the keyboard')
+    parser.add_argument(
+        '--share-frames', metavar='NAME',
+        help='copy the frames into shared memory called NAME, for '
+        'other processes to read (see capture.py; needs NumPy)')
+    parser.add_argument(
+        '--frames', type=int, default=0, metavar='N',
+        help='exit after N frames')
+    parser.add_argument(
+        '--startup-time', action='store_true',
+        help='time the imports and setup, then exit')
+    return parser
+
+
+def parse_args(argv=None):
+    """Parse command line arguments (sys.argv's by default)."""
+    return make_parser().parse_args(argv)
+
+
+class StartupTimer(object):
+    """Records how long each phase of the startup takes."""
+    def __init__(self):
+        """Initialize the instance and start the first phase."""
+        self.phases = [] # [(name, seconds), ...]
+        self.start = self._last = time.time()
+
+    def mark(self, name):
+        """End the phase called name and start the next one."""
+        now = time.time()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def report(self):
+        """Get a table of the phases' times."""
+        lines = ["{:<20}{:>8.1f} ms".format(name, seconds * 1000)
+                 for name, seconds in self.phases]
+        lines.append("{:<20}{:>8.1f} ms".format(
+            "total", (self._last - self.start) * 1000))
+        return '\n'.join(lines)
+
+
+def main(argv=None):
+    """Run the game."""
+    timer = StartupTimer()
+    args = parse_args(argv)
+    timer.mark("arguments")
+    if args.version:
+        print("Slight Fimulator v{}".format(__version__))
+        return
+    # Only imported here to time it on its own; the game imports it
+    import pygame # noqa
+    timer.mark("import pygame")
+    import airspace
+    import game
+    timer.mark("import game")
+    client = game.Client(args=args)
+    space = airspace.Airspace()
+    timer.mark("create client")
+    if args.startup_time:
+        client.setup(space)
+        timer.mark("setup")
+        client.shutdown()
+        print(timer.report())
+        return
+    client.mainloop(space)
+
+if __name__ == '__main__':
+    sys.exit(main())
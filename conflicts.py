@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+
+"""Plane-to-plane conflict detection
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Two planes are in conflict when they are, or will be within the
+look-ahead time, closer than the horizontal separation and the
+vertical separation at the same time.  Planes are extrapolated in
+straight lines at their current velocities.
+
+Every plane's path over the look-ahead time is boxed, and the boxes
+are put in a 3D grid, so only planes whose boxes share a cell are
+tested against each other.  Inside a cell, the boxes are swept along
+x so most pairs that don't overlap are never looked at.
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import math
+import random
+import time
+
+
+class Conflict(object):
+    """A current or predicted loss of separation between two planes."""
+    def __init__(self, first, second, time_, distance, vertical_distance,
+                 collision=False):
+        """Initialize the instance.
+
+        first and second are the planes' IDs, time_ is the number of
+        seconds until separation is lost (0 if it already is), and the
+        distances are the current ones in metres."""
+        self.first = first
+        self.second = second
+        self.time = time_
+        self.distance = distance
+        self.vertical_distance = vertical_distance
+        self.collision = collision
+
+    def __repr__(self):
+        """Display the planes and when separation is lost."""
+        return "<Conflict {} {} in {:.1f}s at {:.0f}m/{:.0f}m{}>".format(
+            self.first, self.second, self.time, self.distance,
+            self.vertical_distance, " COLLISION" if self.collision else "")
+
+
+def flight_vector(plane):
+    """Get (ID, x, z, altitude, x speed, z speed, vertical speed)."""
+    hspeed = plane._speed * math.cos(plane._pitch)
+    return (plane._id, plane._pos[0], plane._pos[1], plane._altitude,
+            math.sin(plane._heading) * hspeed,
+            -math.cos(plane._heading) * hspeed,
+            plane._speed * math.sin(plane._pitch) - plane._gravity)
+
+
+def separation_lost(first, second, separation, vertical_separation,
+                    look_ahead):
+    """Get when two flight_vectors lose separation, or None.
+
+    Returns the time in seconds, 0 if they already have."""
+    dx = second[1] - first[1]
+    dz = second[2] - first[2]
+    dy = second[3] - first[3]
+    vx = second[4] - first[4]
+    vz = second[5] - first[5]
+    vy = second[6] - first[6]
+    start = 0
+    end = look_ahead
+    # When the horizontal distance is below separation
+    a = vx*vx + vz*vz
+    c = dx*dx + dz*dz - separation*separation
+    if a < 1e-9:
+        if c >= 0:
+            return None
+    else:
+        b = 2 * (dx*vx + dz*vz)
+        discriminant = b*b - 4*a*c
+        if discriminant <= 0:
+            return None
+        root = math.sqrt(discriminant)
+        start = max(start, (-b-root) / (2*a))
+        end = min(end, (-b+root) / (2*a))
+    # When the vertical distance is below vertical_separation
+    if abs(vy) < 1e-9:
+        if abs(dy) >= vertical_separation:
+            return None
+    else:
+        low = (-vertical_separation - dy) / vy
+        high = (vertical_separation - dy) / vy
+        if low > high:
+            low, high = high, low
+        start = max(start, low)
+        end = min(end, high)
+    if start > end:
+        return None
+    return start
+
+
+class ConflictDetector(object):
+    """Finds the planes in an airspace that are in conflict."""
+    SEPARATION = 1500 # m
+    VERTICAL_SEPARATION = 300 # m
+    LOOK_AHEAD = 30 # s
+    COLLISION_DISTANCE = 100 # m, horizontally
+    COLLISION_HEIGHT = 50 # m
+    def __init__(self, separation=SEPARATION,
+                 vertical_separation=VERTICAL_SEPARATION,
+                 look_ahead=LOOK_AHEAD, cell_size=None, cell_height=None):
+        """Initialize the instance.
+
+        The grid's cells are cell_size by cell_size metres and
+        cell_height metres tall; they default to four times the
+        separation minima."""
+        self.separation = separation
+        self.vertical_separation = vertical_separation
+        self.look_ahead = look_ahead
+        self.cell_size = cell_size or separation * 4
+        self.cell_height = cell_height or vertical_separation * 4
+        self.conflicts = []
+        self.collided = set() # IDs of the planes in a collision
+        self.pairs_tested = 0
+        self._by_plane = {}
+
+    def conflicts_for(self, plane_id):
+        """Get the conflicts a plane is in, soonest first."""
+        return self._by_plane.get(plane_id, [])
+
+    def update(self, planes):
+        """Find the conflicts between planes.  Call once per tick.
+
+        Planes on the ground are ignored."""
+        vectors = [flight_vector(plane) for plane in planes
+                   if plane._altitude > 0]
+        look_ahead = self.look_ahead
+        half_separation = self.separation / 2
+        half_vertical_separation = self.vertical_separation / 2
+        cell_size = self.cell_size
+        cell_height = self.cell_height
+        floor = math.floor
+        # Box every path and put the boxes in the grid
+        boxes = []
+        cells = {}
+        for index, vector in enumerate(vectors):
+            _, x, z, y, vx, vz, vy = vector
+            box = (
+                min(x, x + vx*look_ahead) - half_separation,
+                min(z, z + vz*look_ahead) - half_separation,
+                min(y, y + vy*look_ahead) - half_vertical_separation,
+                max(x, x + vx*look_ahead) + half_separation,
+                max(z, z + vz*look_ahead) + half_separation,
+                max(y, y + vy*look_ahead) + half_vertical_separation)
+            first_cell = (int(floor(box[0] / cell_size)),
+                          int(floor(box[1] / cell_size)),
+                          int(floor(box[2] / cell_height)))
+            last_cell = (int(floor(box[3] / cell_size)),
+                         int(floor(box[4] / cell_size)),
+                         int(floor(box[5] / cell_height)))
+            boxes.append((box, first_cell))
+            for column in range(first_cell[0], last_cell[0] + 1):
+                for row in range(first_cell[1], last_cell[1] + 1):
+                    for layer in range(first_cell[2], last_cell[2] + 1):
+                        key = (column, row, layer)
+                        try:
+                            cells[key].append(index)
+                        except KeyError:
+                            cells[key] = [index]
+        # Test the planes that share a cell
+        conflicts = []
+        collided = set()
+        pairs_tested = 0
+        collision_distance_squared = self.COLLISION_DISTANCE ** 2
+        left_of = [box[0][0] for box in boxes]
+        for key, indices in cells.items():
+            # Sweep along x: once a box starts after the first one
+            # ends, so do all the ones after it
+            indices.sort(key=left_of.__getitem__)
+            count = len(indices)
+            for i in range(count - 1):
+                first_index = indices[i]
+                first_box, first_cell = boxes[first_index]
+                first_right = first_box[3]
+                for j in range(i + 1, count):
+                    second_index = indices[j]
+                    if left_of[second_index] > first_right:
+                        break
+                    second_box, second_cell = boxes[second_index]
+                    if (first_box[1] > second_box[4]
+                            or second_box[1] > first_box[4]
+                            or first_box[2] > second_box[5]
+                            or second_box[2] > first_box[5]):
+                        continue
+                    # Only test a pair in the first cell they share
+                    if (max(first_cell[0], second_cell[0]) != key[0]
+                            or max(first_cell[1], second_cell[1]) != key[1]
+                            or max(first_cell[2], second_cell[2])
+                            != key[2]):
+                        continue
+                    pairs_tested += 1
+                    first = vectors[first_index]
+                    second = vectors[second_index]
+                    lost = separation_lost(
+                        first, second, self.separation,
+                        self.vertical_separation, look_ahead)
+                    if lost is None:
+                        continue
+                    distance_squared = ((second[1]-first[1]) ** 2
+                                        + (second[2]-first[2]) ** 2)
+                    vertical_distance = abs(second[3] - first[3])
+                    collision = (
+                        distance_squared < collision_distance_squared
+                        and vertical_distance < self.COLLISION_HEIGHT)
+                    if collision:
+                        collided.add(first[0])
+                        collided.add(second[0])
+                    conflicts.append(Conflict(
+                        first[0], second[0], lost,
+                        math.sqrt(distance_squared), vertical_distance,
+                        collision))
+        conflicts.sort(key=lambda conflict: conflict.time)
+        by_plane = {}
+        for conflict in conflicts:
+            for plane_id in (conflict.first, conflict.second):
+                try:
+                    by_plane[plane_id].append(conflict)
+                except KeyError:
+                    by_plane[plane_id] = [conflict]
+        self.conflicts = conflicts
+        self.collided = collided
+        self.pairs_tested = pairs_tested
+        self._by_plane = by_plane
+
+
+def benchmark(count=10000, check_count=1000, size=100000, seed=0):
+    """Time the detector on count random planes.
+
+    The results for check_count planes are checked against testing
+    every pair."""
+    from objects import Airplane
+    generator = random.Random(seed)
+    def fleet(count):
+        """Make count planes flying at random."""
+        planes = []
+        for i in range(count):
+            plane = Airplane(generator.uniform(0, size),
+                             generator.uniform(0, size), 10, 10,
+                             generator.uniform(2000, 15000), player_id=i)
+            plane.heading = generator.uniform(0, math.pi*2)
+            plane.speed = generator.uniform(100, 300)
+            plane.pitch_degrees = generator.choice((0, 0, 0, -5, 5))
+            planes.append(plane)
+        return planes
+    detector = ConflictDetector()
+    planes = fleet(check_count)
+    detector.update(planes)
+    vectors = [flight_vector(plane) for plane in planes]
+    expected = set()
+    for i in range(len(vectors)):
+        for j in range(i + 1, len(vectors)):
+            if separation_lost(vectors[i], vectors[j], detector.separation,
+                               detector.vertical_separation,
+                               detector.look_ahead) is not None:
+                expected.add((vectors[i][0], vectors[j][0]))
+    found = set((min(c.first, c.second), max(c.first, c.second))
+                for c in detector.conflicts)
+    print("{} planes: {} conflicts, {} by testing every pair".format(
+        check_count, len(found), len(expected)))
+    if found != expected:
+        print("MISMATCH")
+    planes = fleet(count)
+    start = time.time()
+    detector.update(planes)
+    print("{} planes: {:.1f} ms, {} pairs tested of {}, {} conflicts, "
+          "{} collided".format(
+              count, (time.time()-start) * 1000, detector.pairs_tested,
+              count * (count-1) // 2, len(detector.conflicts),
+              len(detector.collided)))
+
+if __name__ == '__main__':
+    benchmark()
@@ -22,20 +22,25 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 # Installs Python 3 division and print behaviour
 from __future__ import division, print_function
 
-import argparse
 import datetime
-import io
-import json
 import logging
 import math
 import os
-import sys
+import random
 import time
-import zipfile
 
 import pygame
 
+import aircraft
+import cli
+import music
+import video
 from __init__ import __version__
+from audio import AudioManager
+import inputs
+from options import Options
+from pacing import FramePacer
+from traffic import TrafficGenerator
 
 class Client(pygame.rect.Rect):
     """The client.  Handles drawing and logging."""
@@ -46,6 +51,7 @@ class Client(pygame.rect.Rect):
     DEFAULT_SIZE = (1280, 960)
     DEFAULT_ASPECT_RATIO = DEFAULT_SIZE[0] / DEFAULT_SIZE[1]
     NEXT_ID = 0 # The next unused ID for this class
+    SIM_RATE = 60 # Simulation steps per second
     EXIT_TITLES = (
         "UNEXPECTED",
         "Congratulations",
@@ -54,7 +60,7 @@ class Client(pygame.rect.Rect):
         "Failed",
         "Failed",
         "Failed",
-        "UNEXPECTED"
+        "Failed"
     )
     EXIT_REASONS = (
         "Exited with exitcode 0 (unexpected). Please report.",
@@ -65,7 +71,7 @@ class Client(pygame.rect.Rect):
         "The aircraft was overstressed. Your score was {}.",
         "The aircraft exceeded its service ceiling altitude.  \
 Your score was {}.",
-        "Exited with exitcode 7 (unexpected). Please report."
+        "You collided with another aircraft. Your score was {}."
     )
     DEFAULT_OPTIONS = {
         'music': True,
@@ -172,8 +178,12 @@ Be careful of your falling speed, or you may crash!
         }
     )
 
-    def __init__(self, window_size=DEFAULT_SIZE, player_id=None):
-        """Initializes the instance. Does not start the game."""
+    def __init__(self, window_size=DEFAULT_SIZE, player_id=None,
+                 args=None):
+        """Initializes the instance. Does not start the game.
+
+        args are the parsed command line arguments (from
+        cli.parse_args); if None, sys.argv is parsed."""
         super(Client, self).__init__(0, 0, *window_size)
         # Finds a folder if possible, otherwise tries a zip archive
         if "resources" in os.listdir(self.PATH):
@@ -181,47 +191,47 @@ Be careful of your falling speed, or you may crash!
         elif "resources.zip" in os.listdir(self.PATH):
             self.resources_path = os.path.join(self.PATH, "resources.zip")
         else: raise Exception("Resources not found!")
-        self.clock = pygame.time.Clock() # Controls ticking
         # Gets a player ID
         if player_id is None:
             self._id = Client.NEXT_ID
             Client.NEXT_ID += 1
         else: self._id = player_id
-        # Parses command line arguments
-        self.parser = argparse.ArgumentParser()
-        self.parser.add_argument(
-            '-v', '--version', action='store_true',
-            help='display the version and exit')
-        self.parser.add_argument(
-            '--log-to-file', action='store_true',
-            help='log to a file instead of stdout')
-        self.parser.add_argument(
-            '--log-level', default='WARNING',
-            choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
-            help='the least important log item type to display')
-        self.args = self.parser.parse_args()
-        # Handles command line arguments
-        if self.args.version:
-            print("Slight Fimulator v{}".format(__version__))
-            sys.exit()
+        # Command line arguments; see the cli module
+        if args is None:
+            args = cli.parse_args()
+        self.args = args
         self.log_to_file = self.args.log_to_file
         self.log_level = getattr(logging, self.args.log_level)
-        # Gets controls
-        if os.path.exists("{}/.options.json".format(self.PATH)):
-            # options file found - use these
-            with open("{}/.options.json".format(self.PATH), 'rt') as f:
-                prefs = json.load(f)
-                self.controls = prefs['controls']
-                self.music_enabled = prefs['music']
-                self.sound_enabled = prefs['sound']
-                self.unit_id = prefs['units']
-                self.max_fps = prefs['max-fps']
+        self.aircraft_type = self.args.aircraft
+        # Gets options, keeping the defaults for any missing
+        self.options = Options(
+            os.path.join(self.PATH, '.options.json'),
+            Client.DEFAULT_OPTIONS,
+            {'units': range(len(Client.UNITS)),
+             'max-fps': Client.FPS_OPTIONS})
+        self.options.load()
+        # Headless clients draw offscreen, as fast as they can
+        self.headless = self.args.headless
+        self.recorder = None
+        self.frame_ring = None # See the capture module
+        # Controls ticking
+        self.pacer = FramePacer(self.SIM_RATE, self.max_fps,
+                                realtime=not self.headless)
+        self.audio = AudioManager(
+            not (self.args.no_audio or self.headless))
+        self.inputs = inputs.InputMap(self.controls)
+        # What flies the plane, and where its controls are saved
+        if self.args.replay_input:
+            self.input_source = inputs.RecordedSource(
+                self.args.replay_input)
         else:
-            self.controls = self.DEFAULT_CONTROLS.copy()
-            self.music_enabled = Client.DEFAULT_OPTIONS['music']
-            self.sound_enabled = Client.DEFAULT_OPTIONS['sound']
-            self.unit_id = Client.DEFAULT_OPTIONS['units']
-            self.max_fps = Client.DEFAULT_OPTIONS['max-fps']
+            self.input_source = inputs.KeyboardSource(self.inputs)
+        self.input_recorder = None
+        # Replays must use the seed they were recorded with
+        self.seed = self.input_source.seed
+        if self.seed is None:
+            self.seed = random.randrange(2 ** 32)
+        self.options.subscribe(self.option_changed)
     @property
     def id_(self):
         """Get the ID."""
@@ -236,89 +246,96 @@ Be careful of your falling speed, or you may crash!
         self.GAME_STAGES[new_value](self)
         self._stage = new_value
     @property
+    def controls(self):
+        """Get the keys bound to each control."""
+        return self.options['controls']
+    @property
+    def music_enabled(self):
+        """Get whether the music is on."""
+        return self.options['music']
+    @property
+    def sound_enabled(self):
+        """Get whether sounds are on."""
+        return self.options['sound']
+    @property
+    def unit_id(self):
+        """Get the index of the unit set in UNITS."""
+        return self.options['units']
+    @property
+    def max_fps(self):
+        """Get the frame rate limit."""
+        return self.options['max-fps']
+    @property
     def exit_code(self):
         """Return the exit code."""
-        if self.plane.health <= 0:
-            return 5 # Overstressed the aircraft
-        elif (self.plane.points >= self.airspace.POINTS_REQUIRED
-              and self.plane.altitude <= 0):
-            return 1 # You Won!
-        # position-related exit
-        if self.plane.altitude > self.airspace.MAX_ALTITUDE:
-            return 6
-        elif (self.plane.altitude <= 0
-              and self.plane.total_vertical_velocity < -20):
-            return 3
-        elif not self.airspace.in_bounds(self.plane, False):
-            return 4
+        return self.airspace.get_exit_code(self.plane)
 
-    def mainloop(self, airspace):
-        """The game's loop."""
-        # Setup Pygame
-        pygame.init()
-        self.screen = pygame.display.set_mode(self.size, pygame.RESIZABLE)
+    def setup(self, airspace):
+        """Start Pygame, load the resources and add the plane."""
+        # Setup Pygame; the mixer is left to the audio manager
+        if self.headless: # No window; images still need a display
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        pygame.display.init()
+        pygame.font.init()
+        self.audio.init()
+        if self.headless:
+            pygame.display.set_mode((1, 1))
+            self.screen = pygame.Surface(self.size)
+        elif self.args.record or self.args.share_frames:
+            # Frames are captured at one size
+            self.screen = pygame.display.set_mode(self.size)
+        else:
+            self.screen = pygame.display.set_mode(self.size,
+                                                  pygame.RESIZABLE)
+        if self.args.record:
+            self.recorder = video.open_writer(
+                self.args.record, self.screen.get_size(),
+                1 / self.pacer.frame_duration, self.args.record_every,
+                self.args.record_format)
+        if self.args.record_input:
+            self.input_recorder = inputs.InputRecorder(
+                self.args.record_input, self.seed)
+        if self.args.share_frames:
+            import capture # Needs NumPy
+            self.frame_ring = capture.FrameRing.create(
+                self.screen, name=self.args.share_frames)
+            logging.info("Sharing frames as %s", self.frame_ring.name)
         pygame.display.set_caption(
             "Slight Fimulator v{}".format(__version__))
         # Setup resources
         self.load_resources()
-        pygame.mixer.pre_init(44100, -16, 2, 2048)
-        pygame.mixer.init()
         if not self.music_enabled:
-            pygame.mixer.music.set_volume(0)
+            self.audio.music_volume = 0
         self.scale_images()
         self.scale_buttons()
         # Setup airspace
+        random.seed(self.seed) # Objectives and traffic can be replayed
         self.airspace = airspace
         self.airspace_rect = pygame.rect.Rect(
             self.size[0]*7/16, self.size[1]/24,
             self.size[0]*35/64, self.size[1]*35/48)
         # Setup plane and objective
-        self.plane = self.airspace.add_plane(player_id=self.id_)
+        self.plane = self.airspace.add_plane(
+            player_id=self.id_, aircraft_type=self.aircraft_type)
         self.airspace.generate_objective()
         for obj in self.airspace.objectives: # Get closest objective
             self.closest_objective = obj
-        # Makes a list of length [# of keys registered by Pygame + 1]
-        # The +1 is so key # -1 registers nothing
-        self.keys_held = [0] * (len(pygame.key.get_pressed()) + 1)
-        self.music_playing = None
-        self.stage = 0 # The stage (Beginning, In-Game, End)
+        self.traffic = TrafficGenerator(self.airspace, self.args.traffic,
+                                        seed=self.seed)
         self.paused = 0 # 0 if unpaused; non-0 otherwise
         self.status = "Fly to the objective."
-        self.warnings = {
-            "terrain": {
-                "condition": False,
-                "show": True
-            },
-            "pullup": {
-                "condition": False,
-                "show": True
-            },
-            "overspeed": {
-                "condition": False,
-                "show": True
-            },
-            "stall": {
-                "condition": False,
-                "show": True
-            },
-            "bank_angle": {
-                "condition": False,
-                "show": True
-            },
-            "altitude": {
-                "condition": False,
-                "show": True
-            },
-            "autopilot": {
-                "condition": True,
-                "show": False
-            }
-        }
+        # Bitmasks of the plane's warnings (see alerts.WarningEngine),
+        # and of the one-shot ones that have already been heard
+        self.warnings = 0
+        self.silenced_warnings = self.airspace.alerts.mask('autopilot')
         # Time variables
         self.startup_time = time.time()
         self.previous_time = time.time()
         self.time = time.time()
         self.tick = 0
+        self.frames = 0 # Frames run
+        # Unpaused frames in game; the input sources' ticks count these
+        self.game_tick = 0
         # Custom timer events
         self.event_log = pygame.USEREVENT
         pygame.time.set_timer(self.event_log, 5000)
@@ -326,48 +343,99 @@ Be careful of your falling speed, or you may crash!
         pygame.time.set_timer(self.event_warn, 2000)
         self.event_toggletext = pygame.USEREVENT + 2
         pygame.time.set_timer(self.event_toggletext, 333)
+        # The stage (Beginning, In-Game, End); headless clients skip
+        # the start screen
+        self.stage = 1 if self.headless else 0
 
+    def mainloop(self, airspace):
+        """The game's loop."""
+        self.setup(airspace)
         # Game loop
         self.done = False
-        while not self.done:
-            self.clock.tick(self.max_fps) # Handles FPS
-            self.fps = self.clock.get_fps() # Stores FPS in a variable
-            self.events = pygame.event.get() # Gets events
-            self.screen.fill(self.colors['background'])
-            self.GAME_LOOPS[self.stage](self) # Runs the correct loop
-            for event in self.events:
-                if event.type == pygame.QUIT or self.stage == 'END':
-                    self.done = True
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == self.controls['quit']:
-                        self.done = True
-                elif event.type == pygame.VIDEORESIZE:
-                    self.update_screen_size(event.size)
-        # This runs when the program is finished running
-        pygame.quit() # Exits Pygame
-        if self.resources_path.endswith('.zip'): # Close Zip
-            self.resources.close()
-        # Save preferences
-        preferences = {
-            'music': self.music_enabled,
-            'sound': self.sound_enabled,
-            'units': self.unit_id,
-            'max-fps': self.max_fps,
-            'controls': self.controls
-        }
-        with open('{}/.options.json'.format(self.PATH), 'wt') as f:
-            json.dump(preferences, f)
+        try:
+            while not self.done:
+                self.step()
+        finally:
+            self.shutdown()
+
+    def step(self):
+        """Run one frame of the game."""
+        self.sim_steps = self.pacer.tick() # Handles FPS
+        self.fps = self.pacer.fps # Stores FPS in a variable
+        self.events = pygame.event.get() # Gets events
+        self.inputs.process(self.events) # Queues the keys' actions
+        self.audio.update() # Plays queued sounds and music
+        self.screen.fill(self.colors['background'])
+        self.GAME_LOOPS[self.stage](self) # Runs the correct loop
+        if self.stage == 'END' or 'quit' in self.inputs.actions:
+            self.done = True
+        for event in self.events:
+            if event.type == pygame.QUIT:
+                self.done = True
+            elif event.type == pygame.VIDEORESIZE:
+                self.update_screen_size(event.size)
+        self.frames += 1
+        if self.args.frames and self.frames >= self.args.frames:
+            self.done = True
+
+    def present(self):
+        """Show the frame that has been drawn, and record it."""
+        if not self.headless:
+            pygame.display.flip()
+        if self.recorder is not None:
+            self.recorder.write(self.screen)
+        if self.frame_ring is not None:
+            self.frame_ring.write(self.screen)
+
+    def shutdown(self):
+        """Close everything when the game is finished."""
+        try:
+            if self.recorder is not None: # Saves the frames left
+                self.recorder.close()
+        finally:
+            if self.frame_ring is not None:
+                self.frame_ring.close()
+                self.frame_ring.unlink()
+            if self.input_recorder is not None:
+                self.input_recorder.close()
+            self.input_source.close()
+            self.audio.stop() # Closes the music track
+            pygame.quit() # Exits Pygame
+            if self.resources_path.endswith('.zip'): # Close Zip
+                self.resources.close()
+            self.options.save() # Only writes if something changed
+
+    def option_changed(self, name, new_value):
+        """Apply an option that has just changed."""
+        if name == 'music':
+            # Set volume instead of stopping music
+            # This allows music to run as normal, just muted.
+            self.audio.music_volume = 1 if new_value else 0
+        elif name == 'sound' and not new_value:
+            self.audio.stop_sounds()
+        elif name == 'max-fps':
+            self.pacer.max_fps = new_value
+        elif name == 'controls':
+            self.inputs.set_controls(new_value)
 
     def reset(self):
         """Resets the game for another play."""
         self.airspace.remove_plane(self.id_)
         for obj in self.airspace.objectives:
             self.airspace.objectives.remove(obj)
-        self.plane = self.airspace.add_plane(player_id=self.id_)
+        self.plane = self.airspace.add_plane(
+            player_id=self.id_, aircraft_type=self.aircraft_type)
         self.airspace.generate_objective()
         for obj in self.airspace.objectives: # Get closest objective
             self.closest_objective = obj
+        self.traffic.clear()
+        self.traffic.spawn(self.args.traffic)
 
+    @staticmethod
+    def sorted_by_id(sprites):
+        """Get planes or objectives in ID order, for the log columns."""
+        return sorted(sprites, key=lambda sprite: sprite.id_)
+
     def prepare_log(self):
         """Prepare the log."""
         if not self.log_to_file: # Settings for output logging
@@ -397,32 +465,26 @@ Be careful of your falling speed, or you may crash!
         output = []
         # first row labels
         output.append("TIME\t")
-        for plane_id in range(len(self.airspace.planes)):
-            output.append("PLN-%i\t\t\t\t\t\t\t\t\t\t\t\t" % plane_id)
-        for objective_id in range(len(self.airspace.objectives)):
-            output.append("OBJ-%i\t\t\t" % objective_id)
+        for plane in self.sorted_by_id(self.airspace.planes):
+            output.append("PLN-%i\t\t\t\t\t\t\t\t\t\t\t\t\t" % plane.id_)
+        for objective in self.sorted_by_id(self.airspace.objectives):
+            output.append("OBJ-%i\t\t\t" % objective.id_)
         logging.debug(''.join(output))
         output = []
         # second row labels - tick 0 stats
         output.append("TICK:\t")
-        for plane_id in range(len(self.airspace.planes)):
-            for plane in self.airspace.planes:
-                if plane.id_ == plane_id:
-                    output.append(plane.LABELS)
-                    break
-        for objective_id in range(len(self.airspace.objectives)):
-            for objective in self.airspace.objectives:
-                if objective.id_ == objective_id:
-                    output.append(objective.LABELS)
-                    break
+        for plane in self.sorted_by_id(self.airspace.planes):
+            output.append(plane.LABELS)
+        for objective in self.sorted_by_id(self.airspace.objectives):
+            output.append(objective.LABELS)
         logging.debug(''.join(output)) # Log it!
 
     def load_resources(self):
         """Load the game's resources. Compatible with zips.
 
-        Images, Sounds, Colors and Fonts use Pygame Objects.
-        Music uses filepaths/file objects (both compatible with
-        pygame.mixer.music.load)
+        Images, Sounds, Colors and Fonts use Pygame Objects; Sounds are
+        loaded by the audio manager, so not at all without audio.
+        Music uses music.Tracks, which are streamed by the audio manager
 
         Directory Layout:
 
@@ -435,6 +497,7 @@ Be careful of your falling speed, or you may crash!
              -> insert all music files, will not load as Sound objects
          -> colors.txt OR colours.txt (lines look like: colorid=hexcode)
          -> fonts.txt (lines look like: fontid=fontname size)
+         -> aircraft.txt (see the aircraft module)
 
         If font size is a decimal, multiplies font size by the window's height
          (this includes numbers ending in .0)
@@ -443,8 +506,7 @@ Be careful of your falling speed, or you may crash!
         """
         # Create dictionnaries to put the resources in
         self.images = {}
-        self.sounds = {}
-        self.music_files = {}
+        self.sounds = self.audio.sounds
         self.colors = {}
         self.fonts = {}
         self.font_data = {}
@@ -458,13 +520,10 @@ Be careful of your falling speed, or you may crash!
         for sound_name in os.listdir(sounds_path): # Load Sounds
             sound_file = os.path.join(sounds_path, sound_name)
             sound_name = sound_name.split('.')[0]
-            sound = pygame.mixer.Sound(sound_file)
-            self.sounds[sound_name] = sound
-        music_path = os.path.join(self.resources_path, "Music")
-        for music_name in os.listdir(music_path): # Load Music
-            music_file = os.path.join(music_path, music_name)
-            music_name = music_name.split('.')[0]
-            self.music_files[music_name] = music_file
+            self.audio.load(sound_name, sound_file)
+        # Music is only opened when it plays
+        self.music_files = self.audio.music.tracks
+        self.music_files.update(music.find_tracks(self.resources_path))
         if "colors.txt" in os.listdir(self.resources_path):
             colors_file = open(os.path.join(
                 self.resources_path, "colors.txt"), 'rt')
@@ -503,6 +562,16 @@ Be careful of your falling speed, or you may crash!
             fonts_file.close()
         except Exception as e:
             logging.warning(str(e))
+        try: # Load Aircraft Types
+            if "aircraft.txt" in os.listdir(self.resources_path):
+                aircraft.load_aircraft_types(os.path.join(
+                    self.resources_path, "aircraft.txt"))
+        except Exception as e:
+            logging.warning(str(e))
+        if self.aircraft_type not in aircraft.AIRCRAFT_TYPES:
+            logging.warning("Unknown aircraft type {}, flying {}.".format(
+                self.aircraft_type, aircraft.DEFAULT_TYPE))
+            self.aircraft_type = aircraft.DEFAULT_TYPE
 
     def draw_text(self, text, x, y=None, mode="center",
                   color_id=(0, 0, 0), font_id='default', antialias=1,
@@ -601,8 +670,13 @@ Be careful of your falling speed, or you may crash!
             y *= (self.height / self.DEFAULT_SIZE[1])
             x = int(x)
             y = int(y)
-            self.scaled_images[image_name] = pygame.transform.scale(
-                self.images[image_name], (x, y))
+            image = pygame.transform.scale(self.images[image_name], (x, y))
+            # In the screen's format, so blitting needs no conversion
+            if image.get_flags() & pygame.SRCALPHA:
+                image = image.convert_alpha()
+            else:
+                image = image.convert()
+            self.scaled_images[image_name] = image
 
     def scale_fonts(self):
         """Set up the fonts with the correct size.
@@ -697,7 +771,7 @@ Be careful of your falling speed, or you may crash!
         # The -1 deals with an issue with sizing innacuracy.
 
         # draw NAV/airspace
-        self.airspace.draw(self)
+        self.airspace.draw(self, self.pacer.alpha)
 
         # NAV text
         self.draw_text(
@@ -826,6 +900,9 @@ Be careful of your falling speed, or you may crash!
             self.screen.blit(
                 self.scaled_images['msg_overspeed'],
                 self.get_coords(73/256, 49/96))
+        if self.show_warning("traffic"): # No image for this one
+            self.draw_text("TRAFFIC", self.get_coords(19/64, 57/96),
+                           color_id='red', font_id='large')
         # autopilot message
         if self.plane.autopilot_enabled:
             self.screen.blit(
@@ -860,98 +937,53 @@ Be careful of your falling speed, or you may crash!
                 'name']))
         return text
 
-    def control_plane(self):
-        """Control the plane."""
-        if not self.plane.autopilot_enabled:
-            keys = pygame.key.get_pressed()
-            # Combine  keys and self.keys_held & remove  duplicates
-            for keyid, key in enumerate(keys):
-                if key:
-                    self.keys_held[keyid] += 1
-                else:
-                    self.keys_held[keyid] = 0
-            # left/right
-            self.plane.roll_level -= ((self.keys_held[self.controls[
-                'horiz-']] / 3) ** .75 / self.fps)
-            self.plane.roll_level += ((self.keys_held[self.controls[
-                'horiz+']] / 3) ** .75 / self.fps)
-            # up/down
-            self.plane.vertical_roll_level -= ((self.keys_held[
-                self.controls['vert-']] / 3) ** .75 / self.fps)
-            self.plane.vertical_roll_level += ((self.keys_held[
-                self.controls['vert+']] / 3) ** .75 / self.fps)
-            # throttle
-            self.plane.throttle -= ((self.keys_held[self.controls[
-                'throttle-']] / 3) ** .75 / self.fps)
-            self.plane.throttle += ((self.keys_held[self.controls[
-                'throttle+']] / 3) ** .75 / self.fps)
-            # keypress events
-            for event in self.events:
-                if event.type == pygame.KEYDOWN:
-                    if event.key == self.controls['throttle-0']:
-                        self.plane.throttle = 0
-                    elif event.key == self.controls['throttle-25']:
-                        self.plane.throttle = 25
-                    elif event.key == self.controls['throttle-50']:
-                        self.plane.throttle = 50
-                    elif event.key == self.controls['throttle-75']:
-                        self.plane.throttle = 75
-                    elif event.key == self.controls['throttle-100']:
-                        self.plane.throttle = 100
-                    elif event.key == self.controls['autopilot']:
-                        self.plane.enable_autopilot()
+    def control_plane(self, tick_duration):
+        """Control the plane.
+
+        The input source moves the controls for tick_duration
+        seconds.  Every frame is recorded, with its simulation steps,
+        even on autopilot."""
+        if self.plane.autopilot_enabled:
+            vector = inputs.NEUTRAL
+        else:
+            vector = self.input_source.read(self.game_tick, tick_duration)
+        if self.input_recorder is not None:
+            self.input_recorder.write(self.game_tick, self.sim_steps,
+                                      vector)
+        inputs.apply_controls([self.plane], [vector])
 
     def calculate_warnings(self):
         """Determine what warnings to be turned on and off."""
-        self.warnings["stall"]["condition"] = (
-            self.plane.speed < self.plane.MAX_SPEED * 0.2
-            and self.plane.altitude != 0)
-        self.warnings["overspeed"]["condition"] = (
-            self.plane.speed > self.plane.MAX_SPEED * 0.75)
-        self.warnings["bank_angle"]["condition"] = (
-            abs(self.plane.roll_degrees) >= 30)
-        self.warnings["pullup"]["condition"] = (
-            self.plane.altitude <= 1000
-            and self.plane.total_vertical_velocity <= -20)
-        self.warnings["terrain"]["condition"] = (
-            self.plane.altitude <= 500
-            and self.plane.speed > self.plane.MAX_SPEED * 0.3)
-        self.warnings["altitude"]["condition"] = (
-            abs(self.plane.altitude
-                - self.closest_objective.altitude)
-            <= self.airspace.ALTITUDE_WITHIN)
-        if not self.warnings["altitude"]["condition"]:
-            self.warnings["altitude"]["show"] = True
-        self.warnings["autopilot"]["condition"] = (
-            not self.plane.autopilot_enabled)
-        if not self.warnings["autopilot"]["condition"]:
-            self.warnings["autopilot"]["show"] = True
+        self.warnings = self.plane.warnings
+        # One-shot warnings can be heard again once they turn off
+        self.silenced_warnings &= self.warnings
 
     def show_warning(self, warning_name):
         """Return whether a warning should be shown/played or not."""
-        return (self.warnings[warning_name]["condition"]
-                and self.warnings[warning_name]["show"])
+        return bool(self.warnings & ~self.silenced_warnings
+                    & self.airspace.alerts.bits[warning_name])
 
     def play_sounds(self):
         """Play warning sounds."""
         if not self.sound_enabled:
             return
         if self.show_warning("pullup"):
-            self.sounds['pullup'].play()
+            self.audio.play('pullup')
         elif self.show_warning("terrain"):
-            self.sounds['terrain'].play()
+            self.audio.play('terrain')
         elif self.show_warning("stall"):
-            self.sounds['stall'].play()
+            self.audio.play('stall')
         if self.show_warning("bank_angle"):
-            self.sounds['bankangle'].play()
+            self.audio.play('bankangle')
         if self.show_warning("overspeed"):
-            self.sounds['overspeed'].play()
+            self.audio.play('overspeed')
         if self.show_warning("altitude"):
-            self.sounds['altitude'].play()
-            self.warnings['altitude']['show'] = False
+            self.audio.play('altitude')
+            self.silenced_warnings |= self.airspace.alerts.bits['altitude']
         if self.show_warning("autopilot"):
-            self.sounds['apdisconnect'].play()
-            self.warnings['autopilot']['show'] = False
+            self.audio.play('apdisconnect')
+            self.silenced_warnings |= self.airspace.alerts.bits[
+                'autopilot']
 
     def log(self):
         """Write in the log if in debug mode.
@@ -961,22 +993,20 @@ Be careful of your falling speed, or you may crash!
          - How many milliseconds long that tick was
          - The coordinates, heading and score of all planes
          - The coordinates of all objectives
-        If the argument text is specified, logs that instead.
+         - The mean, jitter and maximum of recent frame times
         """
         output = []
         output.append("%i\t" % self.tick)
         # outputs stats in the correct order
-        for plane_id in range(len(self.airspace.planes)):
-            for plane in self.airspace.planes:
-                if plane.id_ == plane_id:
-                    output.append(plane.__repr__(False))
-                    break
-        for objective_id in range(len(self.airspace.objectives)):
-            for objective in self.airspace.objectives:
-                if objective.id_ == objective_id:
-                    output.append(objective.__repr__(False))
-                    break
+        for plane in self.sorted_by_id(self.airspace.planes):
+            output.append(plane.__repr__(False))
+        for objective in self.sorted_by_id(self.airspace.objectives):
+            output.append(objective.__repr__(False))
         logging.debug(''.join(output))
+        jitter = self.pacer.jitter()
+        logging.debug(
+            "Frame time: mean %.1f ms, jitter %.1f ms, max %.1f ms",
+            jitter['mean']*1000, jitter['stdev']*1000, jitter['max']*1000)
 
     def get_tick_values(self):
         """Prepare the values for the log."""
@@ -990,11 +1020,7 @@ Be careful of your falling speed, or you may crash!
 
     def startup_screen(self):
         """Activate the startup screen. Stage=0"""
-        if self.music_playing != 'chilled-eks':
-            pygame.mixer.music.stop()
-            pygame.mixer.music.load(self.music_files['chilled-eks'])
-            self.music_playing = 'chilled-eks'
-            pygame.mixer.music.play(-1)
+        self.audio.play_music('chilled-eks')
     def game_loop_startup(self):
         """One iteration of the startup screen loop."""
         # Draw the startup screen
@@ -1020,7 +1046,7 @@ Be careful of your falling speed, or you may crash!
         self.draw_text("Instructions", btn_help.center, color_id='white')
         pygame.draw.rect(self.screen, self.colors['panel'], btn_settings)
         self.draw_text("Settings", btn_settings.center, color_id='white')
-        pygame.display.flip()
+        self.present()
         # Events
         for event in self.events:
             if event.type == pygame.KEYDOWN:
@@ -1054,7 +1080,7 @@ Be careful of your falling speed, or you may crash!
             self.draw_text(
                 line, self.get_coords(55/256, i/30 + 1/40),
                 mode='topleft', color_id='white')
-        pygame.display.flip()
+        self.present()
         for event in self.events:
             if event.type == pygame.MOUSEBUTTONUP:
                 # Use the un-click instead of the click
@@ -1126,42 +1152,26 @@ Be careful of your falling speed, or you may crash!
             if y > 76:
                 y = 5
                 x += 50
-        pygame.display.flip()
+        self.present()
         for event in self.events:
             if event.type == pygame.MOUSEBUTTONUP:
                 # Use the un-click instead of the click
                 if btn_back.collidepoint(event.pos):
                     self.stage = self.prev_stage
                 elif btn_reset.collidepoint(event.pos):
-                    self.controls = self.DEFAULT_CONTROLS.copy()
-                    self.music_enabled = Client.DEFAULT_OPTIONS['music']
-                    if self.music_enabled:
-                        pygame.mixer.music.set_volume(1)
-                    else:
-                        pygame.mixer.music.set_volume(0)
-                    self.sound_enabled = Client.DEFAULT_OPTIONS['sound']
-                    self.unit_id = Client.DEFAULT_OPTIONS['units']
+                    self.options.reset()
                 elif btn_music.collidepoint(event.pos):
-                    if self.music_enabled:
-                        self.music_enabled = False
-                        # Set volume instead of stopping music
-                        # This allows music to run as normal,
-                        # just muted.
-                        pygame.mixer.music.set_volume(0)
-                    else:
-                        self.music_enabled = True
-                        pygame.mixer.music.set_volume(1)
+                    self.options['music'] = not self.music_enabled
                 elif btn_sound.collidepoint(event.pos):
-                    self.sound_enabled = not self.sound_enabled
+                    self.options['sound'] = not self.sound_enabled
                 elif btn_units.collidepoint(event.pos):
-                    self.unit_id += 1
-                    if self.unit_id >= len(Client.UNITS):
-                        self.unit_id = 0
+                    self.options['units'] = (
+                        (self.unit_id+1) % len(Client.UNITS))
                 elif btn_fps.collidepoint(event.pos):
                     fps_id = Client.FPS_OPTIONS.index(self.max_fps) + 1
                     if fps_id >= len(Client.FPS_OPTIONS):
                         fps_id = 0
-                    self.max_fps = Client.FPS_OPTIONS[fps_id]
+                    self.options['max-fps'] = Client.FPS_OPTIONS[fps_id]
                 else:
                     for btn in control_buttons:
                         if btn.collidepoint(event.pos):
@@ -1170,25 +1180,29 @@ Be careful of your falling speed, or you may crash!
                             break
             elif event.type == pygame.KEYDOWN:
                 if self.control_selected:
-                    self.controls[self.control_selected] = event.key
+                    controls = dict(self.controls)
+                    controls[self.control_selected] = event.key
+                    self.options['controls'] = controls
                     self.control_selected = None
     GAME_STAGES['settings'] = settings_screen
     GAME_LOOPS['settings'] = game_loop_settings
 
     def main_screen(self):
         """Activate the main game screen. Stage=1"""
-        if self.music_playing != 'chip-respect':
-            pygame.mixer.music.stop()
-            pygame.mixer.music.load(self.music_files['chip-respect'])
-            self.music_playing = 'chip-respect'
-            pygame.mixer.music.play(-1)
+        self.audio.play_music('chip-respect')
         self.prepare_log()
         self.log()
     def game_loop_main(self):
         """One iteration of the main loop."""
         if not self.paused:
-            self.control_plane()
-            self.airspace.update()
+            # Replays run the steps that were recorded
+            self.sim_steps = self.input_source.steps(self.game_tick,
+                                                     self.sim_steps)
+            self.control_plane(self.sim_steps * self.pacer.step)
+            for _ in range(self.sim_steps): # Fixed-size steps
+                self.airspace.update(self.pacer.step)
+                self.traffic.update()
+            self.game_tick += 1
             self.calculate_warnings()
             self.draw()
         elif self.paused != 1:
@@ -1204,19 +1218,19 @@ Be careful of your falling speed, or you may crash!
             self.exit_reason = self.EXIT_REASONS[self.exit_code]
             self.exit_reason = self.exit_reason.format(self.plane.points)
             self.stage = 2
-        pygame.display.flip()
+        self.present()
+        if 'pause' in self.inputs.actions:
+            if self.paused:
+                logging.info("Player unpaused")
+                self.plane._time += time.time() - self.pause_start
+                self.pacer.reset() # Restart the frame cadence
+                self.paused = 0
+            else:
+                logging.info("Player paused")
+                self.paused = 1
+                self.pause_start = time.time()
         for event in self.events:
-            if event.type == pygame.KEYDOWN:
-                if event.key == self.controls['pause']:
-                    if self.paused:
-                        logging.info("Player unpaused")
-                        self.plane._time += time.time() - self.pause_start
-                        self.paused = 0
-                    else:
-                        logging.info("Player paused")
-                        self.paused = 1
-                        self.pause_start = time.time()
-            elif event.type == pygame.MOUSEBUTTONUP:
+            if event.type == pygame.MOUSEBUTTONUP:
                 if self.btn_settings.collidepoint(
                         event.pos) and self.paused:
                     self.stage = 'settings'
@@ -1235,8 +1249,7 @@ Be careful of your falling speed, or you may crash!
 
     def end_screen(self):
         """Activate the end screen. Stage=2"""
-        pygame.mixer.music.fadeout(10000) # Fades out over 10 seconds
-        self.music_playing = None
+        self.audio.fadeout_music(10000) # Fades out over 10 seconds
     def game_loop_end(self):
         """One iteration of the end screen loop."""
         self.draw_text(self.exit_title,
@@ -1250,7 +1263,7 @@ Be careful of your falling speed, or you may crash!
                 self.width / 6, self.height / 24)
         pygame.draw.rect(self.screen, self.colors['panel'], btn_reset)
         self.draw_text("Play Again", btn_reset.center, color_id='white')
-        pygame.display.flip()
+        self.present()
         for event in self.events:
             if event.type == pygame.MOUSEBUTTONUP:
                 if btn_reset.collidepoint(event.pos):
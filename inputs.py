@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+
+"""Player input
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+An InputMap turns keys into the controls they are bound to (see
+Client.DEFAULT_OPTIONS['controls']).  It keeps a dispatch table of
+key: controls, rebuilt only when the controls change, so each frame's
+events are looked up once instead of compared with every control:
+ -> pressing a key queues its controls as actions (like 'pause')
+ -> the controls in HELD_CONTROLS count how many frames their key has
+    been held for; only the keys bound to them are checked
+
+Planes are flown by input sources, which make a ControlVector for
+every frame (see InputSource.read):
+ -> KeyboardSource, from an InputMap
+ -> RecordedSource, from a file written by InputRecorder
+ -> ScriptedSource, from a list of timed steps
+ -> ProgrammaticSource, set from code
+apply_controls applies a frame's vectors to any number of planes, so
+tests can fly many planes at full speed without a keyboard.
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import collections
+
+import pygame
+
+# Controls that act for as long as their key is held
+HELD_CONTROLS = ('horiz-', 'horiz+', 'vert-', 'vert+', 'throttle-',
+                 'throttle+')
+# Controls that set the throttle (%)
+THROTTLE_SETTINGS = {
+    'throttle-0': 0,
+    'throttle-25': 25,
+    'throttle-50': 50,
+    'throttle-75': 75,
+    'throttle-100': 100,
+}
+
+# What to do to a plane in one frame: roll, pitch and throttle are
+# added to its roll level, vertical roll level and throttle;
+# set_throttle (if not None) sets the throttle first; autopilot turns
+# the autopilot on.
+ControlVector = collections.namedtuple(
+    'ControlVector', ('roll', 'pitch', 'throttle', 'set_throttle',
+                      'autopilot'))
+NEUTRAL = ControlVector(0, 0, 0, None, False)
+
+
+class InputMap(object):
+    """Turns key events and held keys into controls."""
+    def __init__(self, controls):
+        """Initialize the instance.
+
+        controls is a dict of control name: key (-1 for no key)."""
+        self.actions = [] # Controls whose keys were pressed this frame
+        self.held = dict.fromkeys(HELD_CONTROLS, 0) # name: frames held
+        self.set_controls(controls)
+
+    def __repr__(self):
+        """Display the bound keys."""
+        return "<InputMap {} keys bound>".format(len(self.bindings))
+
+    def set_controls(self, controls):
+        """Rebuild the dispatch table for new controls."""
+        self.bindings = {} # key: (control name, ...)
+        for name, key in sorted(controls.items()):
+            if key != -1:
+                self.bindings[key] = self.bindings.get(key, ()) + (name,)
+        self._held_keys = [(name, controls.get(name, -1))
+                           for name in HELD_CONTROLS]
+        for name in self.held:
+            self.held[name] = 0
+
+    def process(self, events):
+        """Queue the actions of a frame's events, replacing the last
+        frame's."""
+        del self.actions[:]
+        bindings = self.bindings
+        for event in events:
+            if event.type == pygame.KEYDOWN and event.key in bindings:
+                self.actions.extend(bindings[event.key])
+
+    def update_held(self, pressed):
+        """Count another frame for each held control whose key is down.
+
+        pressed is pygame.key.get_pressed()."""
+        held = self.held
+        for name, key in self._held_keys:
+            if key != -1 and pressed[key]:
+                held[name] += 1
+            else:
+                held[name] = 0
+
+
+## input sources
+class InputSource(object):
+    """Makes a plane's control vectors, one per frame.
+
+    Subclasses override read; this one always gives NEUTRAL."""
+    seed = None # The random seed the game must use, if any
+
+    def steps(self, tick, steps):
+        """Get how many simulation steps frame tick runs.
+
+        steps is how many the frame pacer wants."""
+        return steps
+
+    def read(self, tick, tick_duration):
+        """Get the ControlVector for frame number tick, which simulates
+        tick_duration seconds."""
+        return NEUTRAL
+
+    def close(self):
+        """Stop reading."""
+        pass
+
+
+class KeyboardSource(InputSource):
+    """Controls from the keyboard.
+
+    The longer a key is held, the faster its control moves."""
+    def __init__(self, input_map, get_pressed=pygame.key.get_pressed):
+        """Initialize the instance.
+
+        input_map is the client's InputMap; its actions must be
+        processed every frame."""
+        self.input_map = input_map
+        self.get_pressed = get_pressed
+
+    def read(self, tick, tick_duration):
+        """Get the ControlVector for the keys held and pressed."""
+        input_map = self.input_map
+        input_map.update_held(self.get_pressed())
+        moved = dict((name, (held / 3) ** .75 * tick_duration)
+                     for name, held in input_map.held.items())
+        set_throttle = None
+        autopilot = False
+        for action in input_map.actions:
+            if action in THROTTLE_SETTINGS:
+                set_throttle = THROTTLE_SETTINGS[action]
+            elif action == 'autopilot':
+                autopilot = True
+        return ControlVector(
+            moved['horiz+'] - moved['horiz-'],
+            moved['vert+'] - moved['vert-'],
+            moved['throttle+'] - moved['throttle-'],
+            set_throttle, autopilot)
+
+
+class RecordedSource(InputSource):
+    """Plays back the controls saved by an InputRecorder.
+
+    The recorded frames run the recorded number of simulation steps,
+    and the game uses the recorded random seed, so a replay flies the
+    same as the recording.  After the recording, the controls are
+    neutral."""
+    def __init__(self, path):
+        """Initialize the instance and read the file."""
+        self.path = path
+        self.frames = {} # tick: (steps, ControlVector)
+        with open(path, 'rt') as input_file:
+            for line_number, line in enumerate(input_file, 1):
+                try:
+                    if line.startswith('# seed '):
+                        self.seed = int(line.split()[2])
+                    elif line.strip() and not line.startswith('#'):
+                        tick, steps, vector = _parse_frame(line)
+                        self.frames[tick] = (steps, vector)
+                except ValueError:
+                    raise ValueError("{}:{}: invalid line".format(
+                        path, line_number))
+
+    def steps(self, tick, steps):
+        """Get how many simulation steps frame tick ran."""
+        return self.frames.get(tick, (steps,))[0]
+
+    def read(self, tick, tick_duration):
+        """Get the ControlVector recorded for frame tick."""
+        return self.frames.get(tick, (0, NEUTRAL))[1]
+
+
+class ScriptedSource(InputSource):
+    """Controls from a script of timed steps.
+
+    The script is a list of (seconds, ControlVector).  In a step, roll,
+    pitch and throttle are rates per second; set_throttle and
+    autopilot act once, when the step starts.  After the last step,
+    the controls are neutral."""
+    def __init__(self, script):
+        """Initialize the instance."""
+        self.script = list(script)
+        self.time = 0 # Seconds since the script started
+        self._step = -1 # The step being played
+        self._step_end = 0
+
+    @property
+    def finished(self):
+        """Get whether the whole script has been played."""
+        return self._step >= len(self.script)
+
+    def read(self, tick, tick_duration):
+        """Get the ControlVector for the current step."""
+        started = False
+        while self.time >= self._step_end and not self.finished:
+            self._step += 1
+            if self._step < len(self.script):
+                self._step_end += self.script[self._step][0]
+                started = True
+        self.time += tick_duration
+        if self.finished:
+            return NEUTRAL
+        vector = self.script[self._step][1]
+        return ControlVector(
+            vector.roll * tick_duration, vector.pitch * tick_duration,
+            vector.throttle * tick_duration,
+            vector.set_throttle if started else None,
+            vector.autopilot and started)
+
+
+class ProgrammaticSource(InputSource):
+    """Controls set from code.
+
+    roll, pitch and throttle are rates per second that last until they
+    are changed; set_throttle and autopilot act once, on the next
+    frame."""
+    def __init__(self):
+        """Initialize the instance with neutral controls."""
+        self.roll = self.pitch = self.throttle = 0
+        self.set_throttle = None
+        self.autopilot = False
+
+    def set(self, roll=None, pitch=None, throttle=None,
+            set_throttle=None, autopilot=None):
+        """Change the controls given."""
+        if roll is not None:
+            self.roll = roll
+        if pitch is not None:
+            self.pitch = pitch
+        if throttle is not None:
+            self.throttle = throttle
+        if set_throttle is not None:
+            self.set_throttle = set_throttle
+        if autopilot is not None:
+            self.autopilot = autopilot
+
+    def read(self, tick, tick_duration):
+        """Get the ControlVector for the controls set."""
+        vector = ControlVector(
+            self.roll * tick_duration, self.pitch * tick_duration,
+            self.throttle * tick_duration, self.set_throttle,
+            self.autopilot)
+        self.set_throttle = None
+        self.autopilot = False
+        return vector
+
+
+class InputRecorder(object):
+    """Saves control vectors for a RecordedSource to play back.
+
+    Each line is a frame's tick, number of simulation steps and
+    ControlVector, tab separated.  Every frame is saved, so the replay
+    runs the same steps.  seed is the game's random seed."""
+    def __init__(self, path, seed=None):
+        """Initialize the instance and open the file."""
+        self.path = path
+        self.file = open(path, 'wt')
+        if seed is not None:
+            self.file.write("# seed {}\n".format(seed))
+        self.file.write("# tick\tsteps\t{}\n".format(
+            '\t'.join(ControlVector._fields)))
+
+    def write(self, tick, steps, vector):
+        """Save frame tick's simulation steps and ControlVector."""
+        self.file.write(_format_frame(tick, steps, vector))
+
+    def close(self):
+        """Close the file."""
+        self.file.close()
+
+
+def _format_frame(tick, steps, vector):
+    """Format a frame's steps and ControlVector as a line."""
+    return "{}\t{}\t{!r}\t{!r}\t{!r}\t{}\t{}\n".format(
+        tick, steps, vector.roll, vector.pitch, vector.throttle,
+        '-' if vector.set_throttle is None
+        else repr(float(vector.set_throttle)),
+        int(vector.autopilot))
+
+
+def _parse_frame(line):
+    """Parse a line from _format_frame.
+
+    Returns (tick, steps, vector)."""
+    fields = line.split('\t')
+    if len(fields) != 7:
+        raise ValueError("Wrong number of fields.")
+    set_throttle = fields[5]
+    return int(fields[0]), int(fields[1]), ControlVector(
+        float(fields[2]), float(fields[3]), float(fields[4]),
+        None if set_throttle == '-' else float(set_throttle),
+        bool(int(fields[6])))
+
+
+def apply_controls(planes, vectors):
+    """Apply a frame's control vectors, one per plane.
+
+    Planes with the autopilot on are left alone.  The planes' fields
+    are written directly, clamped as the property setters would."""
+    for plane, vector in zip(planes, vectors):
+        if plane.autopilot_enabled:
+            continue
+        if vector.set_throttle is not None:
+            plane._throttle = vector.set_throttle
+        plane._throttle = min(max(plane._throttle + vector.throttle, 0),
+                              100)
+        plane._roll_level = min(max(plane._roll_level + vector.roll, -4),
+                                4)
+        plane._vertical_roll_level = min(max(
+            plane._vertical_roll_level + vector.pitch, -4), 4)
+        if vector.autopilot:
+            plane.enable_autopilot()
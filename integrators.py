@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+"""Numerical integrators for the flight model
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Every integrator is called as integrator(derivatives, state, dt, split)
+and returns the state after dt seconds.  state is a list of numbers and
+derivatives(state) returns their rates of change.  The first split
+values are positions and the rest are the velocities that move them;
+only the semi-implicit integrator uses split.
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import math
+import time
+
+
+def euler(derivatives, state, dt, split=0):
+    """Explicit Euler: one first-order step."""
+    return [value + rate*dt for value, rate
+            in zip(state, derivatives(state))]
+
+
+def semi_implicit_euler(derivatives, state, dt, split=0):
+    """Semi-implicit Euler: velocities first, then positions.
+
+    The positions move with the new velocities, which is much more
+    stable than explicit Euler for the same cost."""
+    rates = derivatives(state)
+    velocities = [value + rate*dt for value, rate
+                  in zip(state[split:], rates[split:])]
+    rates = derivatives(state[:split] + velocities)
+    return [value + rate*dt for value, rate
+            in zip(state[:split], rates[:split])] + velocities
+
+
+def rk4(derivatives, state, dt, split=0):
+    """The classic fourth-order Runge-Kutta method."""
+    k1 = derivatives(state)
+    k2 = derivatives([v + r*dt/2 for v, r in zip(state, k1)])
+    k3 = derivatives([v + r*dt/2 for v, r in zip(state, k2)])
+    k4 = derivatives([v + r*dt for v, r in zip(state, k3)])
+    return [v + (a + 2*b + 2*c + d) * dt/6
+            for v, a, b, c, d in zip(state, k1, k2, k3, k4)]
+
+
+def adaptive(derivatives, state, dt, split=0, tolerance=1e-3,
+             min_step=1e-4):
+    """RK4 with step doubling, taking as many substeps as needed.
+
+    Each substep is compared with two half-size substeps and redone
+    smaller if they differ by more than tolerance (relative to the
+    values, with an absolute floor of 1)."""
+    remaining = dt
+    step = dt
+    while remaining > 0:
+        step = min(step, remaining)
+        full = rk4(derivatives, state, step)
+        half = rk4(derivatives, state, step/2)
+        half = rk4(derivatives, half, step/2)
+        error = max(abs(a - b) / max(abs(b), 1)
+                    for a, b in zip(full, half))
+        if error > tolerance and step > min_step:
+            step /= 2
+            continue
+        state = half
+        remaining -= step
+        # Doubling the step makes RK4's error about 32 times bigger
+        if error < tolerance / 32:
+            step *= 2
+    return state
+
+INTEGRATORS = {
+    'euler': euler,
+    'semi-implicit': semi_implicit_euler,
+    'rk4': rk4,
+    'adaptive': adaptive,
+}
+# Saved states store an integrator as its index in this; only append
+INTEGRATOR_NAMES = ('euler', 'semi-implicit', 'rk4', 'adaptive')
+
+
+def benchmark(duration=60, steps=(1/240, 1/60, 1/30, 1/12, 1/6, 1/3)):
+    """Compare the integrators' error and speed on a turning plane.
+
+    The reference is RK4 with a 1 ms step.  Error is the distance
+    between the final positions in metres."""
+    from objects import Airplane
+    def fly(integrator, dt):
+        """Fly a plane for duration seconds."""
+        plane = Airplane(0, 0, 10, 10, 8000)
+        plane.integrator = integrator
+        plane.speed = 150
+        plane.throttle = 10
+        plane.roll_level = 2
+        plane.vertical_roll_level = 0.5
+        start = time.time()
+        for _ in range(int(round(duration / dt))):
+            plane.update(dt)
+        return plane, time.time() - start
+    reference, _ = fly('rk4', 1/1000)
+    print("%-14s %8s %7s %12s %9s" % (
+        "INTEGRATOR", "DT (S)", "TICKS", "ERROR (M)", "CPU (S)"))
+    for name in ('euler', 'semi-implicit', 'rk4', 'adaptive'):
+        for dt in steps:
+            plane, cpu_time = fly(name, dt)
+            error = math.sqrt((plane.x - reference.x) ** 2
+                              + (plane.z - reference.z) ** 2
+                              + (plane.altitude - reference.altitude) ** 2)
+            print("%-14s %8.4f %7i %12.4g %9.4f" % (
+                name, dt, round(duration / dt), error, cpu_time))
+
+if __name__ == '__main__':
+    benchmark()
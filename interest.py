@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+"""Area-of-interest filtering for airspace subscribers
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Each subscriber gets every tick the planes within a radius of its
+centre (its own plane, or a fixed point) or inside its view
+rectangle.  Other planes are sent every far_interval ticks, staggered
+by ID so each tick only carries a slice of them, and planes beyond
+far_radius are not sent at all.
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+from spatial import SpatialHash
+from statesync import NO_BASELINE, encode_delta
+
+
+class Subscriber(object):
+    """Someone receiving part of an airspace's state."""
+    def __init__(self, plane_id=None, pos=None, radius=None, rect=None):
+        """Initialize the instance.
+
+        The subscriber is centred on the plane with ID plane_id, or on
+        pos if there is no such plane.  rect is an optional
+        (left, top, right, bottom) area that is always sent in full."""
+        self.plane_id = plane_id
+        self.pos = pos
+        self.radius = radius
+        self.rect = rect
+        self.acked = None # The last sequence it acknowledged
+        self.views = {} # sequence -> snapshot sent to it
+
+
+class InterestManager(object):
+    """Chooses which planes each subscriber receives."""
+    def __init__(self, radius=10000, far_radius=None, far_interval=10,
+                 cell_size=None, history=16):
+        """Initialize the instance.
+
+        If far_radius is None, far planes are sent wherever they are."""
+        self.radius = radius
+        self.far_radius = far_radius
+        self.far_interval = far_interval
+        self.history = history
+        self.index = SpatialHash(cell_size or radius)
+        self.subscribers = {}
+        self.positions = {} # plane ID -> (x, z)
+        self._far_slices = [[] for _ in range(far_interval)]
+
+    def subscribe(self, key, plane_id=None, pos=None, radius=None,
+                  rect=None):
+        """Add a subscriber.  See Subscriber for the arguments."""
+        self.subscribers[key] = Subscriber(plane_id, pos, radius, rect)
+        return self.subscribers[key]
+
+    def unsubscribe(self, key):
+        """Remove a subscriber."""
+        self.subscribers.pop(key, None)
+
+    def ack(self, key, sequence):
+        """Record that a subscriber received a packet."""
+        subscriber = self.subscribers[key]
+        subscriber.acked = sequence
+        # Older views can never be used as a baseline again
+        for old in [s for s in subscriber.views if s < sequence]:
+            del subscriber.views[old]
+
+    def update(self, planes):
+        """Index the planes.  Call once per tick before encoding."""
+        self.index.clear()
+        self.positions = {}
+        self._far_slices = [[] for _ in range(self.far_interval)]
+        for plane in planes:
+            x, z = plane.x, plane.z
+            self.index.insert(plane.id_, x, z)
+            self.positions[plane.id_] = (x, z)
+            self._far_slices[plane.id_ % self.far_interval].append(
+                plane.id_)
+
+    def center(self, subscriber):
+        """Get the (x, z) a subscriber is centred on."""
+        return self.positions.get(subscriber.plane_id, subscriber.pos)
+
+    def select(self, key, tick):
+        """Get (near, far) sets of plane IDs to send to a subscriber."""
+        subscriber = self.subscribers[key]
+        center = self.center(subscriber)
+        near = set()
+        if center is not None:
+            near.update(self.index.query_radius(
+                center[0], center[1], subscriber.radius or self.radius))
+        if subscriber.rect is not None:
+            near.update(self.index.query_rect(*subscriber.rect))
+        far = set(self._far_slices[tick % self.far_interval])
+        far.difference_update(near)
+        return near, far
+
+    def encode(self, key, sequence, snapshot):
+        """Encode a statesync packet for a subscriber.
+
+        snapshot is the full airspace snapshot for this sequence."""
+        subscriber = self.subscribers[key]
+        planes, objectives = snapshot
+        baseline_sequence = subscriber.acked
+        if baseline_sequence not in subscriber.views:
+            baseline_sequence = NO_BASELINE
+        baseline = subscriber.views.get(baseline_sequence, ({}, {}))
+        near, far = self.select(key, sequence)
+        view = dict(baseline[0])
+        for plane_id in [i for i in view if i not in planes]:
+            del view[plane_id] # Left the airspace
+        center = self.center(subscriber)
+        if self.far_radius is not None and center is not None:
+            far_radius_squared = self.far_radius ** 2
+            for plane_id in list(far):
+                x, z = self.positions[plane_id]
+                if ((x-center[0]) ** 2 + (z-center[1]) ** 2
+                        > far_radius_squared):
+                    far.discard(plane_id)
+                    view.pop(plane_id, None) # Out of range
+        send = near | far
+        for plane_id in send:
+            if plane_id in planes:
+                view[plane_id] = planes[plane_id]
+        subscriber.views[sequence] = (view, objectives)
+        subscriber.views.pop(sequence - self.history, None)
+        return encode_delta(sequence, (view, objectives),
+                            baseline_sequence, baseline, send)
@@ -0,0 +1,422 @@
+#!/usr/bin/env python
+
+"""Flight log parsing
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Parses the DEBUG logs written by Client.prepare_log and Client.log.
+A log starts with two header rows (the plane and objective groups,
+then their labels) and has a tab-separated row per sample.  Every
+time the game is started, a new session with its own header begins.
+
+parse_log yields a Row record per sample and only needs the standard
+library.  read_blocks yields Blocks of many rows as NumPy arrays, for
+analyzing lots of logs quickly.  parse_logs runs a function on every
+log in a folder in parallel.
+
+Both layouts are read:
+ -> since 2018, lines start with "HH:MM:SS    LEVEL\t" and planes
+    have IDs; times come from the clock
+ -> in 2017, rows were just the values, with the last tick's length
+    (DUR) after the tick; times are worked out from the ticks
+The numbers of planes can change between rows (AI planes come and
+go), so they are worked out from each row's length.  Rows that can't
+be parsed are skipped, or raise ValueError if strict, except for a
+last row cut short by the game stopping, which is always skipped.
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import collections
+import glob
+import io
+import multiprocessing
+import os
+import re
+
+try:
+    import numpy
+except ImportError: # Only read_blocks needs it
+    numpy = None
+
+# The values of each plane and objective
+PLANE_FIELDS = ('id', 'x', 'z', 'altitude', 'speed', 'acceleration',
+                'vertical_speed', 'heading', 'roll', 'pitch', 'points',
+                'damage', 'gravity')
+OBJECTIVE_FIELDS = ('id', 'x', 'z', 'altitude')
+# The labels of the fields in the logs.  2017 logs had no IDs, and
+# their angles were in other units, so they are left out.
+PLANE_LABELS = {
+    'ID': 'id', 'X': 'x', 'Y': 'z', 'ALT': 'altitude', 'SPD': 'speed',
+    'ACCEL': 'acceleration', 'VSPD': 'vertical_speed', 'HDG': 'heading',
+    'ROLL': 'roll', 'PITCH': 'pitch', 'PTS': 'points', 'DMG': 'damage',
+    'GRAV': 'gravity', # Not in older logs, so NaN for them
+}
+OLD_PLANE_LABELS = {
+    'X': 'x', 'Y': 'z', 'ALT': 'altitude', 'SPD': 'speed',
+    'ACCEL': 'acceleration', 'VSPD': 'vertical_speed', 'PTS': 'points',
+    'DMG': 'damage',
+}
+OBJECTIVE_LABELS = {'ID': 'id', 'X': 'x', 'Y': 'z', 'ALT': 'altitude'}
+LINE_PATTERN = re.compile(r'(\d\d):(\d\d):(\d\d)\s+(\w+)\t')
+BLOCK_ROWS = 4096
+
+PlaneSample = collections.namedtuple('PlaneSample', PLANE_FIELDS)
+ObjectiveSample = collections.namedtuple('ObjectiveSample',
+                                         OBJECTIVE_FIELDS)
+Row = collections.namedtuple(
+    'Row', ('session', 'time', 'tick', 'planes', 'objectives'))
+
+
+class Layout(object):
+    """Where the values are in a session's rows, read from its header."""
+    def __init__(self, groups, labels):
+        """Initialize the instance from the two header rows' fields."""
+        starts = [i for i, group in enumerate(groups)
+                  if group.startswith(('PLN-', 'OBJ-'))]
+        self.leading = len(labels[:starts[0]] if starts else labels)
+        plane_labels = []
+        objective_labels = []
+        self.objective_count = 0
+        for start, end in zip(starts, starts[1:] + [len(labels)]):
+            group_labels = [label.rstrip(':')
+                            for label in labels[start:end] if label]
+            if groups[start].startswith('PLN-'):
+                plane_labels = group_labels
+            else:
+                objective_labels = group_labels
+                self.objective_count += 1
+        self.plane_size = len(plane_labels)
+        self.objective_size = len(objective_labels)
+        self.has_ids = 'ID' in plane_labels
+        plane_names = PLANE_LABELS if self.has_ids else OLD_PLANE_LABELS
+        # [(index in the log, index in PLANE_FIELDS), ...]
+        self.plane_map = [
+            (i, PLANE_FIELDS.index(plane_names[label]))
+            for i, label in enumerate(plane_labels) if label in plane_names]
+        self.objective_map = [
+            (i, OBJECTIVE_FIELDS.index(OBJECTIVE_LABELS[label]))
+            for i, label in enumerate(objective_labels)
+            if label in OBJECTIVE_LABELS]
+
+    def plane_count(self, field_count):
+        """Get the number of planes in a row, or None if it's invalid."""
+        plane_fields = (field_count - self.leading
+                        - self.objective_count*self.objective_size)
+        if (not self.plane_size or plane_fields < 0
+                or plane_fields % self.plane_size):
+            return None
+        return plane_fields // self.plane_size
+
+
+class _Clock(object):
+    """Works out the times of a session's rows, in seconds."""
+    def __init__(self):
+        """Initialize the instance."""
+        self.previous = None # (time, tick)
+        self.day = 0
+
+    def time(self, seconds, tick, duration):
+        """Get a row's time.
+
+        seconds is the time of day it was logged at, or None if the
+        log has no times; then duration is the last tick's length in
+        seconds."""
+        if seconds is None:
+            if self.previous is None:
+                time_ = 0
+            else:
+                time_ = self.previous[0] + (tick-self.previous[1]) * duration
+        else:
+            time_ = seconds + self.day
+            if self.previous is not None and time_ < self.previous[0] - 43200:
+                self.day += 86400 # Past midnight
+                time_ += 86400
+        self.previous = (time_, tick)
+        return time_
+
+
+def _lines(log_file):
+    """Split a log's lines.  Yields (kind, seconds, message).
+
+    kind is 'groups' or 'labels' for the header rows, and 'row' for
+    the others; seconds is the time of day or None."""
+    match = LINE_PATTERN.match
+    for line in log_file:
+        line = line.rstrip('\r\n')
+        found = match(line)
+        if found is None:
+            seconds = None
+            message = line
+        elif found.group(4) != 'DEBUG':
+            continue
+        else:
+            seconds = (int(found.group(1))*3600 + int(found.group(2))*60
+                       + int(found.group(3)))
+            message = line[found.end():]
+        if message.startswith('TIME'):
+            yield 'groups', seconds, message
+        elif message.startswith('TICK:'):
+            yield 'labels', seconds, message
+        elif message[:1].isdigit(): # Not another message
+            yield 'row', seconds, message.rstrip('\t')
+
+
+def _sessions(log_file):
+    """Group a log's rows by session.
+
+    Yields (session, Layout, [(seconds, message), ...]) for every
+    run of rows, ending a run at each header."""
+    session = -1
+    layout = None
+    groups = []
+    rows = []
+    for kind, seconds, message in _lines(log_file):
+        if kind == 'groups':
+            groups = message.split('\t')
+        elif kind == 'labels':
+            if rows:
+                yield session, layout, rows
+                rows = []
+            session += 1
+            layout = Layout(groups, message.split('\t'))
+        elif layout is not None:
+            rows.append((seconds, message))
+            if len(rows) >= BLOCK_ROWS:
+                yield session, layout, rows
+                rows = []
+    if rows:
+        yield session, layout, rows
+
+
+class _Skipper(object):
+    """Skips rows that can't be parsed, or raises if strict.
+
+    A bad row is only reported once another row follows it, so a last
+    row cut short is always skipped."""
+    def __init__(self, path, strict):
+        """Initialize the instance."""
+        self.path = path
+        self.strict = strict
+        self.pending = None # The last bad row
+        self.skipped = 0
+
+    def bad(self, message):
+        """Record a row that can't be parsed."""
+        self.good()
+        self.pending = message
+        self.skipped += 1
+
+    def good(self):
+        """Record that a row follows the last bad one."""
+        if self.pending is not None and self.strict:
+            raise ValueError("Can't parse row {!r} of {}".format(
+                self.pending, self.path))
+        self.pending = None
+
+
+def parse_log(path, strict=False):
+    """Parse a log.  Yields a Row per sample."""
+    skipper = _Skipper(path, strict)
+    nan = float('nan')
+    with open(path, 'rt') as log_file:
+        clock = None
+        current = None
+        for session, layout, rows in _sessions(log_file):
+            if session != current:
+                clock = _Clock()
+                current = session
+            plane_empty = [nan] * len(PLANE_FIELDS)
+            objective_empty = [nan] * len(OBJECTIVE_FIELDS)
+            for seconds, message in rows:
+                fields = message.split('\t')
+                count = layout.plane_count(len(fields))
+                try:
+                    values = [float(field) for field in fields]
+                except ValueError:
+                    count = None
+                if count is None:
+                    skipper.bad(message)
+                    continue
+                skipper.good()
+                start = layout.leading
+                planes = []
+                for index in range(count):
+                    plane = list(plane_empty)
+                    for source, target in layout.plane_map:
+                        plane[target] = values[start + source]
+                    if not layout.has_ids:
+                        plane[0] = index
+                    planes.append(PlaneSample(*plane))
+                    start += layout.plane_size
+                objectives = []
+                for index in range(layout.objective_count):
+                    objective = list(objective_empty)
+                    for source, target in layout.objective_map:
+                        objective[target] = values[start + source]
+                    if not layout.has_ids:
+                        objective[0] = index
+                    objectives.append(ObjectiveSample(*objective))
+                    start += layout.objective_size
+                duration = values[1] / 1000 if layout.leading > 1 else 0
+                yield Row(session, clock.time(seconds, values[0], duration),
+                          values[0], planes, objectives)
+
+
+class Block(object):
+    """Consecutive rows of a session with the same number of planes.
+
+    planes is a (rows, planes, len(PLANE_FIELDS)) array and objectives
+    a (rows, objectives, len(OBJECTIVE_FIELDS)) one; values that
+    aren't in the log are NaN."""
+    def __init__(self, session, time_, tick, planes, objectives):
+        """Initialize the instance."""
+        self.session = session
+        self.time = time_
+        self.tick = tick
+        self.planes = planes
+        self.objectives = objectives
+
+    def __len__(self):
+        """Get the number of rows."""
+        return len(self.time)
+
+    def __repr__(self):
+        """Display the size of the block."""
+        return "<Block session {}: {} rows, {} planes, {} objectives>" \
+            .format(self.session, len(self), self.planes.shape[1],
+                    self.objectives.shape[1])
+
+    def plane_column(self, name):
+        """Get a (rows, planes) array of one of PLANE_FIELDS."""
+        return self.planes[:, :, PLANE_FIELDS.index(name)]
+
+    def objective_column(self, name):
+        """Get a (rows, objectives) array of one of OBJECTIVE_FIELDS."""
+        return self.objectives[:, :, OBJECTIVE_FIELDS.index(name)]
+
+
+def read_blocks(path, strict=False):
+    """Parse a log into Blocks.  Needs NumPy."""
+    if numpy is None:
+        raise ImportError("read_blocks needs NumPy.")
+    skipper = _Skipper(path, strict)
+    with open(path, 'rt') as log_file:
+        clock = None
+        current = None
+        for session, layout, rows in _sessions(log_file):
+            if session != current:
+                clock = _Clock()
+                current = session
+            # Split the rows into runs with the same number of fields
+            counts = [message.count('\t') for _, message in rows]
+            start = 0
+            for end in range(1, len(rows) + 1):
+                if end == len(rows) or counts[end] != counts[start]:
+                    for block in _make_block(session, layout, clock,
+                                             rows[start:end], skipper):
+                        yield block
+                    start = end
+
+
+def _make_block(session, layout, clock, rows, skipper):
+    """Turn rows with the same number of fields into Blocks."""
+    count = layout.plane_count(rows[0][1].count('\t') + 1)
+    if count is None:
+        for _, message in rows:
+            skipper.bad(message)
+        return
+    try:
+        values = numpy.loadtxt(
+            io.StringIO(u'\n'.join(message for _, message in rows)),
+            delimiter='\t', ndmin=2)
+    except ValueError: # Parse them one at a time to find the bad ones
+        good = []
+        for row in rows:
+            try:
+                good.append((row, [float(field)
+                                   for field in row[1].split('\t')]))
+            except ValueError:
+                skipper.bad(row[1])
+            else:
+                skipper.good()
+        if good:
+            rows = [row for row, _ in good]
+            values = numpy.array([row_values for _, row_values in good])
+        else:
+            return
+    else:
+        skipper.good()
+    tick = values[:, 0]
+    if layout.leading > 1:
+        durations = values[:, 1] / 1000
+    else:
+        durations = numpy.zeros(len(rows))
+    time_ = numpy.array([
+        clock.time(seconds, row_tick, duration)
+        for (seconds, _), row_tick, duration in zip(rows, tick, durations)])
+    start = layout.leading
+    end = start + count*layout.plane_size
+    raw = values[:, start:end].reshape(len(rows), count, layout.plane_size)
+    planes = numpy.full((len(rows), count, len(PLANE_FIELDS)), numpy.nan)
+    for source, target in layout.plane_map:
+        planes[:, :, target] = raw[:, :, source]
+    raw = values[:, end:].reshape(len(rows), layout.objective_count,
+                                  layout.objective_size)
+    objectives = numpy.full(
+        (len(rows), layout.objective_count, len(OBJECTIVE_FIELDS)),
+        numpy.nan)
+    for source, target in layout.objective_map:
+        objectives[:, :, target] = raw[:, :, source]
+    if not layout.has_ids:
+        planes[:, :, 0] = numpy.arange(count)
+        objectives[:, :, 0] = numpy.arange(layout.objective_count)
+    yield Block(session, time_, tick, planes, objectives)
+
+
+def find_logs(paths):
+    """Get the log files in paths, which are logs or folders."""
+    for path in paths:
+        if os.path.isdir(path):
+            for log in sorted(glob.glob(os.path.join(path, '*.log'))):
+                yield log
+        else:
+            yield path
+
+
+def parse_logs(function, paths, processes=None):
+    """Run function(log path) on the logs in paths in parallel.
+
+    Yields the results in the logs' order.  function has to be
+    defined at the top level of a module, so it can be sent to the
+    other processes.  processes defaults to the number of CPUs; if it
+    is 1, everything runs in this process."""
+    logs = list(find_logs(paths))
+    if processes == 1 or len(logs) < 2:
+        for log in logs:
+            yield function(log)
+        return
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap(function, logs):
+            yield result
+    except BaseException:
+        pool.terminate()
+        raise
+    pool.close()
+    pool.join()
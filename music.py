@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+"""Music streaming
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Music tracks are files in a folder or members of a zip archive.  A
+track is only opened when it starts playing and is closed when it
+stops, and pygame streams it from the open file, so at most one track
+is ever open.  pygame has a single music stream, so switching tracks
+fades the old one out and then the new one in.
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import io
+import os
+import zipfile
+
+import pygame
+
+
+class Track(object):
+    """A piece of music in a file, or in a zip archive's member."""
+    def __init__(self, path, member=None):
+        """Initialize the instance.  Does not open the file.
+
+        If member is given, path is the zip archive it is in."""
+        self.path = path
+        self.member = member
+        self._archive = None
+
+    def __repr__(self):
+        """Display where the track is."""
+        if self.member is None:
+            return "<Track {}>".format(self.path)
+        return "<Track {}:{}>".format(self.path, self.member)
+
+    def open(self):
+        """Open the track as a seekable binary file object."""
+        if self.member is None:
+            return open(self.path, 'rb')
+        self._archive = zipfile.ZipFile(self.path)
+        stream = self._archive.open(self.member)
+        seekable = getattr(stream, 'seekable', None)
+        if seekable is None or not seekable():
+            # Old zipfiles can't seek inside members, so only this
+            # track is read into memory
+            data = stream.read()
+            stream.close()
+            self._archive.close()
+            self._archive = None
+            stream = io.BytesIO(data)
+        return stream
+
+    def close(self, stream):
+        """Close a file object returned by open."""
+        stream.close()
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+
+
+def find_tracks(resources_path):
+    """Find the tracks in a resources folder or zip archive.
+
+    Returns a dict of name: Track for the files in Music."""
+    tracks = {}
+    if resources_path.endswith('.zip'):
+        with zipfile.ZipFile(resources_path) as archive:
+            for member in archive.namelist():
+                if (member.startswith('Music/')
+                        and not member.endswith('/')):
+                    name = member.lower()[6:].split('.')[0]
+                    tracks[name] = Track(resources_path, member)
+    else:
+        music_path = os.path.join(resources_path, "Music")
+        for filename in os.listdir(music_path):
+            name = filename.split('.')[0]
+            tracks[name] = Track(os.path.join(music_path, filename))
+    return tracks
+
+
+class MusicPlayer(object):
+    """Plays Tracks, one at a time, on pygame's music stream.
+
+    The mixer has to be initialized before anything is played."""
+    CROSSFADE = 1000 # How long switching tracks fades for (ms)
+    def __init__(self, tracks=None):
+        """Initialize the instance."""
+        self.tracks = tracks if tracks is not None else {}
+        self.current = None # The name of the track playing
+        self.pending = None # (name, loops, fade) to play next
+        self._track = None
+        self._stream = None
+
+    def play(self, name, loops=-1, fade=CROSSFADE):
+        """Switch to a track.  Does nothing if it is already playing,
+        or fading in next.
+
+        The track playing fades out, then the new one fades in, over
+        fade milliseconds each."""
+        if name == self.current: # Also the pending track's name
+            return
+        if name not in self.tracks:
+            raise ValueError("No track named {}.".format(name))
+        if fade and self._stream is not None:
+            if self.pending is None:
+                pygame.mixer.music.fadeout(fade)
+            self.pending = (name, loops, fade)
+            self.current = name
+        else:
+            self._start(name, loops, 0)
+
+    def fadeout(self, milliseconds):
+        """Fade the music out, then close its track."""
+        self.pending = None
+        self.current = None
+        if self._stream is not None:
+            pygame.mixer.music.fadeout(milliseconds)
+
+    def stop(self):
+        """Stop the music and close its track."""
+        self.pending = None
+        self.current = None
+        self._close()
+
+    def update(self):
+        """Start pending tracks and close finished ones.
+
+        Call every frame."""
+        if self._stream is None or pygame.mixer.music.get_busy():
+            return
+        if self.pending is not None:
+            name, loops, fade = self.pending
+            self.pending = None
+            self._start(name, loops, fade)
+        else:
+            self.current = None
+            self._close()
+
+    def _start(self, name, loops, fade):
+        """Close the track playing and start one."""
+        self._close()
+        track = self.tracks[name]
+        stream = track.open()
+        try:
+            pygame.mixer.music.load(stream)
+        except pygame.error:
+            track.close(stream)
+            raise
+        self._track = track
+        self._stream = stream
+        self.current = name
+        if fade:
+            pygame.mixer.music.play(loops, 0, fade)
+        else:
+            pygame.mixer.music.play(loops)
+
+    def _close(self):
+        """Stop the music and close its track, if one is open."""
+        if self._stream is None:
+            return
+        pygame.mixer.music.stop()
+        if hasattr(pygame.mixer.music, 'unload'): # pygame 2
+            pygame.mixer.music.unload()
+        self._track.close(self._stream)
+        self._track = None
+        self._stream = None
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+
+"""The nav display renderer
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Draws every plane and objective on the nav display at once: the
+world-to-screen transform is worked out once per frame, markers that
+are off the screen are skipped, rotated plane markers are cached in
+the display's pixel format (so blitting them needs no conversion),
+and everything is drawn with a single Surface.blits call.  Dense
+traffic is clustered; see NavRenderer.
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import math
+
+import pygame
+
+
+def _convert(image):
+    """Convert an image to the display's format, if there is one."""
+    if pygame.display.get_surface() is None:
+        return image
+    return image.convert_alpha()
+
+
+class NavRenderer(object):
+    """Draws the planes and objectives of an airspace.
+
+    With many planes, it switches to a level of detail mode: planes
+    in the same cell of a screen grid are drawn as one cluster glyph
+    showing how many there are, so the cost depends on the screen's
+    size rather than the number of planes.  When the plane marker is
+    too small to make out, planes are single pixels.  The client's
+    own plane is always drawn in full."""
+    ROTATION_STEPS = 360 # Plane markers are rotated to the nearest 1/360
+    LOD_PLANES = 100 # More planes than this turns level of detail on
+    MIN_MARKER_SIZE = 8 # Smaller markers are drawn as pixels (px)
+    def __init__(self, rotation_steps=ROTATION_STEPS, lod=None):
+        """Initialize the instance.
+
+        lod turns the level of detail mode on (True) or off (False);
+        if it is None, it is on when there are more than LOD_PLANES
+        planes."""
+        self.rotation_steps = rotation_steps
+        self.lod = lod
+        self.drawn = 0 # Markers and glyphs drawn last frame
+        self.clusters = 0 # Cluster glyphs drawn last frame
+        self._marker = None # The navmarker image the cache is for
+        self._rotations = {} # step -> (image, half width, half height)
+        self._objective_marker = None # (image, converted image)
+        self._glyphs = {} # (count, size) -> (image, half size)
+
+    def rotated_marker(self, marker, step):
+        """Get (image, half width, half height) of marker rotated to
+        step, clockwise."""
+        if marker is not self._marker: # Rescaled; start again
+            self._marker = marker
+            self._rotations = {}
+            self._glyphs = {}
+        try:
+            return self._rotations[step]
+        except KeyError:
+            image = _convert(pygame.transform.rotate(
+                marker, -step * 360 / self.rotation_steps))
+            width, height = image.get_size()
+            rotated = self._rotations[step] = (image, width/2, height/2)
+            return rotated
+
+    def cluster_glyph(self, client, count, size):
+        """Get (image, half size) of the glyph for count planes.
+
+        size is the glyph's width and height."""
+        key = (count, size)
+        try:
+            return self._glyphs[key]
+        except KeyError:
+            image = pygame.Surface((size, size), pygame.SRCALPHA)
+            color = client.colors['white']
+            radius = size // 2
+            pygame.draw.circle(image, color, (radius, radius), radius,
+                               max(size // 16, 1))
+            text = client.fonts['default'].render(str(count), 1, color)
+            image.blit(text, text.get_rect(center=(radius, radius)))
+            glyph = self._glyphs[key] = (_convert(image), size / 2)
+            return glyph
+
+    def draw(self, client, airspace, alpha=1):
+        """Draw an airspace's planes and objectives on client's nav
+        display.
+
+        alpha is the fraction of the last tick to draw the planes at
+        (see Airplane.interpolate)."""
+        screen = client.screen
+        rect = client.airspace_rect
+        # world -> screen: screen = world * scale + offset
+        x_scale = rect.width / airspace.width
+        z_scale = rect.height / airspace.height
+        x_offset = rect.left
+        z_offset = rect.top
+        # Markers are drawn if they are at least partly on the screen
+        clip = screen.get_clip()
+        left, top = clip.left, clip.top
+        right, bottom = clip.right, clip.bottom
+        steps = self.rotation_steps
+        step_angle = math.pi * 2 / steps
+        pi = math.pi
+        full_turn = pi * 2
+        rotated_marker = self.rotated_marker
+        marker = client.scaled_images['navmarker']
+        marker_size = max(marker.get_size())
+        half_size = marker_size / 2
+        lod = self.lod
+        if lod is None:
+            lod = len(airspace.planes) > self.LOD_PLANES
+        player_id = client.id_
+        sequence = []
+        append = sequence.append
+        cells = {} # (column, row) -> [total x, total z, count, plane]
+        pixels = []
+        for plane in airspace.planes:
+            prev_x, prev_z = plane._prev_pos
+            x, z = plane._pos
+            screen_x = (prev_x + (x-prev_x) * alpha) * x_scale + x_offset
+            screen_z = (prev_z + (z-prev_z) * alpha) * z_scale + z_offset
+            if (screen_x + half_size < left or screen_x - half_size > right
+                    or screen_z + half_size < top
+                    or screen_z - half_size > bottom):
+                continue
+            if lod and plane._id != player_id:
+                if marker_size < self.MIN_MARKER_SIZE:
+                    pixels.append((int(screen_x), int(screen_z)))
+                    continue
+                key = (int(screen_x // marker_size),
+                       int(screen_z // marker_size))
+                try:
+                    cell = cells[key]
+                except KeyError:
+                    cells[key] = [screen_x, screen_z, 1, plane]
+                else:
+                    cell[0] += screen_x
+                    cell[1] += screen_z
+                    cell[2] += 1
+                continue
+            # Turn the shortest way round
+            heading = plane._prev_heading + ((
+                plane._heading - plane._prev_heading + pi)
+                % full_turn - pi) * alpha
+            image, half_width, half_height = rotated_marker(
+                marker, int(round(heading / step_angle)) % steps)
+            append((image, (int(screen_x - half_width),
+                            int(screen_z - half_height))))
+        clusters = 0
+        for screen_x, screen_z, count, plane in cells.values():
+            if count == 1: # Alone in its cell; draw it in full
+                heading = plane._prev_heading + ((
+                    plane._heading - plane._prev_heading + pi)
+                    % full_turn - pi) * alpha
+                image, half_width, half_height = rotated_marker(
+                    marker, int(round(heading / step_angle)) % steps)
+            else: # Drawn at the planes' average position
+                screen_x /= count
+                screen_z /= count
+                image, half_width = self.cluster_glyph(
+                    client, count, marker_size)
+                half_height = half_width
+                clusters += 1
+            append((image, (int(screen_x - half_width),
+                            int(screen_z - half_height))))
+        image = client.scaled_images['objectivemarker']
+        if (self._objective_marker is None
+                or self._objective_marker[0] is not image):
+            self._objective_marker = (image, _convert(image))
+        image = self._objective_marker[1]
+        half_width = image.get_width() / 2
+        half_height = image.get_height() / 2
+        for obj in airspace.objectives:
+            screen_x = obj._pos[0] * x_scale + x_offset
+            screen_z = obj._pos[1] * z_scale + z_offset
+            if (screen_x + half_width < left or screen_x - half_width > right
+                    or screen_z + half_height < top
+                    or screen_z - half_height > bottom):
+                continue
+            append((image, (int(screen_x - half_width),
+                            int(screen_z - half_height))))
+        if hasattr(screen, 'blits'): # pygame 1.9.4+
+            screen.blits(sequence, False)
+        else:
+            for image, position in sequence:
+                screen.blit(image, position)
+        if pixels:
+            color = screen.map_rgb(client.colors['white'])
+            pixel_array = pygame.PixelArray(screen)
+            try:
+                for x, z in pixels:
+                    if left <= x < right and top <= z < bottom:
+                        pixel_array[x, z] = color
+            finally:
+                del pixel_array # Unlocks the screen
+        self.drawn = len(sequence) + len(pixels)
+        self.clusters = clusters
@@ -24,10 +24,16 @@ from __future__ import division, print_function
 
 import math
 import os
+import struct
 import time
 
 import pygame
 
+import aircraft
+import autopilot
+from integrators import INTEGRATOR_NAMES, INTEGRATORS
+from physics import flight_derivatives, step_planes
+
 PATH = os.path.dirname(os.path.realpath(__file__))
 
 
@@ -38,14 +44,29 @@ class Airplane(pygame.sprite.Sprite):
     """
     NEXT_ID = 0
 
-    MAX_SPEED = 500
-    TERMINAL_VELOCITY = MAX_SPEED / 5 # Why not?
+    # Gravity used to change once per frame, so its rate is scaled to
+    # feel the same as it did at the default 30 FPS.
+    GRAVITY_RATE = 30
+    FLIGHT_STATE_SPLIT = 4 # See get_flight_state
+    INTEGRATOR = 'semi-implicit' # The default integrator
 
     LABELS = "ID:\tX:\tY:\tALT:\tSPD:\tACCEL:\tVSPD:\t\
-HDG:\tROLL:\tPITCH:\tPTS:\tDMG:\t"
+HDG:\tROLL:\tPITCH:\tPTS:\tDMG:\tGRAV:\t"
+    # Packed state: ID, 15 doubles (position, size, flight variables,
+    # health and seconds since the last update), points, flags,
+    # exit code, aircraft type, integrator (an index in
+    # INTEGRATOR_NAMES) and the autopilot's altitude, heading and
+    # speed targets (NaN if unset) and objective target ID (-1 if
+    # unset).  See get_state and set_state.
+    STATE_FORMAT = struct.Struct('<i15diBB16sB3di')
+    AUTOPILOT_CONDITIONS = (
+        'roll-centered', 'vertical-roll-centered', 'throttle-centered')
     def __init__(self, x=(0, 0, 0, 0, 0), z=None, width=None,
-                 height=None, altitude=None, player_id=None):
-        """Initialize the instance."""
+                 height=None, altitude=None, player_id=None,
+                 aircraft_type=aircraft.DEFAULT_TYPE):
+        """Initialize the instance.
+
+        aircraft_type is an AircraftType or a registered type's name."""
         super(Airplane, self).__init__()
         if z is None:
             x, z, width, height, altitude = x
@@ -59,12 +80,17 @@ HDG:\tROLL:\tPITCH:\tPTS:\tDMG:\t"
         if player_id is None: # Get an ID for the airplane
             self._id = Airplane.NEXT_ID
             Airplane.NEXT_ID += 1
-        else: self._id = player_id
+        else:
+            self._id = player_id
+            # Don't give the ID to another plane later
+            Airplane.NEXT_ID = max(Airplane.NEXT_ID, player_id + 1)
         # Initialize private variables
         self._pos = [x, z]
+        self._prev_pos = [x, z] # Before the last update
         self._size = [width, height]
         self._altitude = altitude
         self._heading = 0
+        self._prev_heading = 0
         self._pitch = 0
         self._speed = 0
         self._acceleration = 0
@@ -78,7 +104,8 @@ HDG:\tROLL:\tPITCH:\tPTS:\tDMG:\t"
                 'roll-centered': True,
                 'vertical-roll-centered': True,
                 'throttle-centered': True
-            }
+            },
+            'targets': dict((target, None) for target in autopilot.TARGETS)
         }
 
         self._within_objective_range = False
@@ -86,14 +113,17 @@ HDG:\tROLL:\tPITCH:\tPTS:\tDMG:\t"
         self._exit_code = 0
         self._health = 100
         self._time = time.time()
+        self._integrator = self.INTEGRATOR
+        self._aircraft_type = aircraft.get(aircraft_type)
+        self._warnings = 0 # Set by alerts.WarningEngine
 
     def __repr__(self, show_labels=True):
         """Display some important stats about the plane."""
         msg = ("%i\t%i\t%i\t%i\t%.1f\t%.1f\t%.1f\t%.1f\t%.1f\t%.1f\t\
-%i\t%.1f\t" % (self.id_, self.x, self.z,
+%i\t%.1f\t%.1f\t" % (self.id_, self.x, self.z,
                self.altitude, self.speed, self.acceleration,
                self.vertical_velocity, self.heading, self.roll,
-               self.pitch, self.points, 100 - self.health))
+               self.pitch, self.points, 100 - self.health, self.gravity))
         if show_labels:
             return "%s\n%s" % (Airplane.LABELS, msg)
         else:
@@ -248,12 +278,11 @@ HDG:\tROLL:\tPITCH:\tPTS:\tDMG:\t"
     @property
     def roll(self):
         """Get the plane's horizontal roll in radians."""
-        return math.radians(self.roll_degrees)
+        return self._aircraft_type.performance.roll(self._roll_level)
     @property
     def roll_degrees(self):
         """Get the plane's horizontal roll in degrees."""
-        return ((35/198) * self._roll_level**3 + (470/99)
-                * self._roll_level)
+        return self._aircraft_type.performance.roll_degrees(self._roll_level)
     @property
     def roll_level(self):
         """Get the plane's horizontal roll level."""
@@ -285,24 +314,11 @@ HDG:\tROLL:\tPITCH:\tPTS:\tDMG:\t"
     @property
     def autopilot_enabled(self):
         """Get the plane's autopilot's status."""
-        if not self._autopilot_info['enabled']:
-            return False
-        else: # See if the autopilot can be disabled
-            if abs(self.roll_level) < 0.1:
-                self.roll_level = 0
-                self._autopilot_info['conditions'][
-                    'roll-centered'] = True
-            if abs(self.vertical_roll_level) < 0.1:
-                self.vertical_roll_level = 0
-                self._autopilot_info['conditions'][
-                    'vertical-roll-centered'] = True
-            if abs(50 - self.throttle) < 1:
-                self.throttle = 50
-                self._autopilot_info['conditions'][
-                    'throttle-centered'] = True
-            if all(self._autopilot_info['conditions'].values()):
-                self._autopilot_info['enabled'] = False
-            return self._autopilot_info['enabled']
+        return self._autopilot_info['enabled']
+    @property
+    def autopilot_targets(self):
+        """Get a dict of the autopilot's targets (None if unset)."""
+        return dict(self._autopilot_info['targets'])
     @property
     def health(self):
         """Get the plane's health."""
@@ -329,6 +345,34 @@ HDG:\tROLL:\tPITCH:\tPTS:\tDMG:\t"
         self._points = new_value
     score = points # score is an alias for points.
     @property
+    def integrator(self):
+        """Get the name of the plane's integrator."""
+        return self._integrator
+    @integrator.setter
+    def integrator(self, new_value):
+        """Set the plane's integrator (a key of INTEGRATORS)."""
+        if new_value not in INTEGRATORS:
+            raise ValueError("Unknown integrator {}.".format(new_value))
+        self._integrator = new_value
+    @property
+    def warnings(self):
+        """Get the bitmask of the plane's warnings.
+
+        See alerts.WarningEngine for the bits."""
+        return self._warnings
+    @property
+    def aircraft_type(self):
+        """Get the plane's AircraftType."""
+        return self._aircraft_type
+    @aircraft_type.setter
+    def aircraft_type(self, new_value):
+        """Set the plane's aircraft type (an AircraftType or a name)."""
+        self._aircraft_type = aircraft.get(new_value)
+    @property
+    def performance(self):
+        """Get the PerformanceTable of the plane's aircraft type."""
+        return self._aircraft_type.performance
+    @property
     def image(self):
         """Get the plane's image."""
         return self._image
@@ -337,83 +381,172 @@ HDG:\tROLL:\tPITCH:\tPTS:\tDMG:\t"
         """Get the plane's rect."""
         return pygame.rect.Rect(self._pos, self._size)
 
-    def enable_autopilot(self):
-        """Enable the autopilot."""
+    def get_state(self):
+        """Pack the plane's state into a bytes object."""
+        targets = [self._autopilot_info['targets'][target]
+                   for target in autopilot.TARGETS]
+        for i in range(3):
+            if targets[i] is None:
+                targets[i] = float('nan')
+        if targets[3] is None:
+            targets[3] = -1
+        flags = int(self._autopilot_info['enabled'])
+        for bit, condition in enumerate(self.AUTOPILOT_CONDITIONS):
+            if self._autopilot_info['conditions'][condition]:
+                flags |= 2 << bit
+        if self._within_objective_range:
+            flags |= 16
+        return self.STATE_FORMAT.pack(
+            self._id, self._pos[0], self._pos[1],
+            self._size[0], self._size[1], self._altitude, self._heading,
+            self._pitch, self._speed, self._acceleration, self._gravity,
+            self._throttle, self._roll_level, self._vertical_roll_level,
+            self._health, time.time() - self._time, int(self._points),
+            flags, self._exit_code,
+            self._aircraft_type.name.encode('ascii'),
+            INTEGRATOR_NAMES.index(self._integrator), *targets)
+
+    def set_state(self, state, offset=0):
+        """Restore the plane's state from get_state's output.
+
+        state can also be an already-unpacked tuple of values."""
+        if not isinstance(state, tuple):
+            state = self.STATE_FORMAT.unpack_from(state, offset)
+        (self._id, x, z, width, height, self._altitude, self._heading,
+         self._pitch, self._speed, self._acceleration, self._gravity,
+         self._throttle, self._roll_level, self._vertical_roll_level,
+         self._health, age, self._points, flags,
+         self._exit_code, aircraft_type, integrator) = state[:-4]
+        self._aircraft_type = aircraft.get(
+            aircraft_type.rstrip(b'\0').decode('ascii'))
+        try:
+            self._integrator = INTEGRATOR_NAMES[integrator]
+        except IndexError:
+            raise ValueError("Unknown integrator {}.".format(integrator))
+        self._pos = [x, z]
+        self._prev_pos = [x, z]
+        self._size = [width, height]
+        self._prev_heading = self._heading
+        self._time = time.time() - age
+        self._autopilot_info['enabled'] = bool(flags & 1)
+        for bit, condition in enumerate(self.AUTOPILOT_CONDITIONS):
+            self._autopilot_info['conditions'][condition] = bool(
+                flags & (2 << bit))
+        self._within_objective_range = bool(flags & 16)
+        targets = list(state[-4:])
+        for i in range(3):
+            if math.isnan(targets[i]):
+                targets[i] = None
+        if targets[3] < 0:
+            targets[3] = None
+        self._autopilot_info['targets'] = dict(zip(
+            autopilot.TARGETS, targets))
+
+    @classmethod
+    def from_state(cls, state, offset=0):
+        """Create a new plane from get_state's output."""
+        if not isinstance(state, tuple):
+            state = cls.STATE_FORMAT.unpack_from(state, offset)
+        plane = cls(0, 0, 0, 0, 0, player_id=state[0])
+        plane.set_state(state)
+        return plane
+
+    def enable_autopilot(self, altitude=None, heading=None, speed=None,
+                         objective=None):
+        """Enable the autopilot.
+
+        Without targets, it centres the controls and then disengages.
+        Otherwise it holds the altitude (m), heading (radians) and
+        speed (m/s) given, or flies to objective (an Objective or its
+        ID).  See the autopilot module."""
+        for name, value in (('Altitude', altitude), ('Heading', heading),
+                            ('Speed', speed)):
+            if value is not None and not isinstance(value, (int, float)):
+                raise TypeError("{} must be a number.".format(name))
+        if heading is not None:
+            heading %= math.pi * 2
+        if isinstance(objective, Objective):
+            if altitude is None:
+                altitude = objective.altitude
+            if heading is None:
+                heading = math.atan2(
+                    objective.x - self._pos[0],
+                    self._pos[1] - objective.z) % (math.pi*2)
+            objective = objective.id_
+        elif objective is not None and not isinstance(objective, int):
+            raise TypeError("Objective must be an Objective or an ID.")
         self._autopilot_info['enabled'] = True
         for condition in self._autopilot_info['conditions']:
             self._autopilot_info['conditions'][condition] = False
+        self._autopilot_info['targets'] = {
+            'altitude': altitude,
+            'heading': heading,
+            'speed': speed,
+            'objective': objective,
+        }
 
-    def draw(self, client, airspace):
-        """Draw the airplane."""
+    def disable_autopilot(self):
+        """Disable the autopilot."""
+        self._autopilot_info['enabled'] = False
+
+    def interpolate(self, alpha):
+        """Get (x, z, heading) between the last two updates.
+
+        alpha is 0 for the previous update and 1 for the latest."""
+        x = self._prev_pos[0] + (self._pos[0]-self._prev_pos[0]) * alpha
+        z = self._prev_pos[1] + (self._pos[1]-self._prev_pos[1]) * alpha
+        # Turn the shortest way round
+        turn = ((self._heading - self._prev_heading + math.pi)
+                % (math.pi*2) - math.pi)
+        return x, z, self._prev_heading + turn*alpha
+
+    def draw(self, client, airspace, alpha=1):
+        """Draw the airplane.
+
+        alpha is passed to interpolate."""
+        x, z, heading = self.interpolate(alpha)
         image = pygame.transform.rotate(
-            client.scaled_images['navmarker'], -self.heading_degrees)
+            client.scaled_images['navmarker'], -math.degrees(heading))
         draw_rect = image.get_rect()
         draw_rect.center = (
-            self.x / airspace.width * client.airspace_rect.width
+            x / airspace.width * client.airspace_rect.width
             + client.airspace_rect.left,
-            self.z / airspace.height * client.airspace_rect.height
+            z / airspace.height * client.airspace_rect.height
             + client.airspace_rect.top
         )
         client.screen.blit(image, draw_rect)
 
-    def update(self):
-        """Update the plane."""
-        tick_duration = time.time() - self._time
-        self._time = time.time()
-
-        # initialize damage
-        damage = 0
-
-        # stall and gravity
-        if self.speed <= (self.MAX_SPEED / 5):
-            max_vert_roll = max((self.speed-(self.MAX_SPEED / 10))
-                                / (self.MAX_SPEED / 40), 0)
-        else: max_vert_roll = 4
-        self.gravity += (((self.MAX_SPEED / 10 - self.speed)
-                          / self.MAX_SPEED * self.TERMINAL_VELOCITY)
-                         - (self.gravity ** 2
-                            / (self.TERMINAL_VELOCITY ** 2 / 10)))
-        if self.gravity < 0:
-            self.gravity = 0
-        if self.altitude <= 0.1:
-            self.gravity = 0
-
-        # get heading and pitch
-        self.heading += (self.roll * tick_duration)
-        if self.vertical_roll_level > max_vert_roll:
-            self.vertical_roll_level = max_vert_roll
-        self.pitch_degrees = self.vertical_roll_level * 10
-
-        # acceleration
-        self.acceleration = (self.throttle**2 / 250
-                             - self.speed**2 * 40 / self.MAX_SPEED**2)
-        self.speed += (self.acceleration * tick_duration)
-
-        # move plane
-        hspeed = self.horizontal_speed * tick_duration
-        vspeed = self.total_vertical_velocity * tick_duration
-        self.x += math.sin(self.heading) * hspeed
-        self.z -= math.cos(self.heading) * hspeed
-        self.altitude += vspeed
-        if self.altitude < 0.1:
-            self.altitude = 0
-
-        # overspeed damage
-        if self.speed > self.MAX_SPEED * 0.75:
-            damage += ((self.speed - self.MAX_SPEED*0.75) ** 2
-                       / (self.MAX_SPEED**2*10) * tick_duration)
-        if self._throttle > 75:
-            damage += (self._throttle - 75) ** 2 / 1000 * tick_duration
-
-        # autopilot
-        if self.autopilot_enabled:
-            self.roll_level *= (0.5 ** tick_duration)
-            self.vertical_roll_level *= (0.5 ** tick_duration)
-            self._throttle = 50 + (self.throttle-50) * (
-                0.5 ** tick_duration)
-
-        # deal damage
-        self.health -= damage
+    def update(self, tick_duration=None):
+        """Update the plane.
+
+        If tick_duration is None, the time since the last update is
+        used.  To update many planes, see physics.step_planes and
+        autopilot.step."""
+        if tick_duration is None:
+            tick_duration = time.time() - self._time
+        step_planes([self], tick_duration)
+        autopilot.step([self], tick_duration)
+
+    def get_flight_state(self):
+        """Get the state that update integrates.
+
+        It is [x, z, altitude, health, heading, speed, gravity]; the
+        first FLIGHT_STATE_SPLIT values are moved by the others."""
+        return [self.x, self.z, self.altitude, self.health,
+                self.heading, self.speed, self.gravity]
+
+    def derivatives(self, state, controls=None):
+        """Get the rates of change of a flight state.
+
+        The controls are held at their current values.  controls is
+        performance.at_controls's output for them, if already known."""
+        performance = self._aircraft_type.performance
+        if controls is None:
+            controls = performance.at_controls(
+                self._roll_level, self._throttle)
+        return flight_derivatives(performance, [controls],
+                                  [self._vertical_roll_level],
+                                  self.GRAVITY_RATE)(list(state))
 
     # Function that approximates the 5, 10, 20, 30
     # roll of Slight Fimulator 1.0
@@ -426,6 +559,8 @@ class Objective(pygame.sprite.Sprite):
     NEXT_ID = 0
 
     LABELS = "ID:\tX:\tY:\tALT:\t"
+    # Packed state: ID, position, size and altitude
+    STATE_FORMAT = struct.Struct('<i5d')
     def __init__(self, x=(0, 0, 0, 0, 0), z=None, width=None,
                  height=None, altitude=None, obj_id=None):
         """Initialize the instance."""
@@ -517,6 +652,31 @@ class Objective(pygame.sprite.Sprite):
         """Get the plane's rect."""
         return pygame.rect.Rect(self._pos, self._size)
 
+    def get_state(self):
+        """Pack the objective's state into a bytes object."""
+        return self.STATE_FORMAT.pack(
+            self._id, self._pos[0], self._pos[1],
+            self._size[0], self._size[1], self._altitude)
+
+    def set_state(self, state, offset=0):
+        """Restore the objective's state from get_state's output.
+
+        state can also be an already-unpacked tuple of values."""
+        if not isinstance(state, tuple):
+            state = self.STATE_FORMAT.unpack_from(state, offset)
+        self._id, x, z, width, height, self._altitude = state
+        self._pos = [x, z]
+        self._size = [width, height]
+
+    @classmethod
+    def from_state(cls, state, offset=0):
+        """Create a new objective from get_state's output."""
+        if not isinstance(state, tuple):
+            state = cls.STATE_FORMAT.unpack_from(state, offset)
+        objective = cls(0, 0, 0, 0, 0, obj_id=state[0])
+        objective.set_state(state)
+        return objective
+
     def draw(self, client, airspace):
         """Draw the objective."""
         draw_rect = client.scaled_images['objectivemarker'].get_rect()
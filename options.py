@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+
+"""The options file
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Options are stored as a JSON object.  Values missing from the file,
+or of the wrong type, are replaced with the defaults, so old or
+damaged files can always be loaded.  The file is only written when an
+option has changed, and is written to a temporary file that then
+replaces it, so it is never left half-written.
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import copy
+import json
+import logging
+import os
+import tempfile
+
+# os.replace is atomic everywhere; os.rename only overwrites on POSIX
+_replace = getattr(os, 'replace', os.rename)
+
+
+def _valid(value, default):
+    """Return whether value can replace default."""
+    if isinstance(default, bool):
+        return isinstance(value, bool)
+    elif isinstance(default, (int, float)):
+        return (isinstance(value, (int, float))
+                and not isinstance(value, bool))
+    elif isinstance(default, dict):
+        return isinstance(value, dict)
+    return isinstance(value, type(default))
+
+
+class Options(object):
+    """Options with defaults, saved in a JSON file.
+
+    Options are read and set like a dict's items.  Dict options (like
+    the controls) are merged key by key with their defaults; to change
+    them, set a changed copy."""
+    def __init__(self, path, defaults, choices=None):
+        """Initialize the instance with the defaults.  Call load to
+        read the file.
+
+        choices is an optional dict of option name: allowed values."""
+        self.path = path
+        self.defaults = copy.deepcopy(defaults)
+        self.choices = choices or {}
+        self._values = copy.deepcopy(defaults)
+        self.dirty = False
+        self._listeners = []
+
+    def __repr__(self):
+        """Display the path and values."""
+        return "<Options {} {}{}>".format(
+            self.path, self._values, " (changed)" if self.dirty else "")
+
+    def __getitem__(self, name):
+        """Get an option."""
+        return self._values[name]
+
+    def __setitem__(self, name, new_value):
+        """Set an option, and notify the listeners if it changed."""
+        if name not in self.defaults:
+            raise KeyError(name)
+        new_value = self._merge(name, new_value, strict=True)
+        if new_value == self._values[name]:
+            return
+        self._values[name] = new_value
+        self.dirty = True
+        for listener in self._listeners:
+            listener(name, new_value)
+
+    def __iter__(self):
+        """Iterate over the options' names."""
+        return iter(self._values)
+
+    def subscribe(self, listener):
+        """Call listener(name, new value) whenever an option changes."""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        """Stop notifying listener."""
+        self._listeners.remove(listener)
+
+    def reset(self):
+        """Set every option to its default."""
+        for name in self.defaults:
+            self[name] = copy.deepcopy(self.defaults[name])
+
+    def load(self):
+        """Read the options from the file, if it exists.
+
+        Does not notify the listeners."""
+        try:
+            with open(self.path, 'rt') as options_file:
+                stored = json.load(options_file)
+        except (IOError, OSError):
+            return # No file yet
+        except ValueError as e:
+            logging.warning("Ignoring damaged options file %s: %s",
+                            self.path, e)
+            return
+        if not isinstance(stored, dict):
+            logging.warning("Ignoring damaged options file %s",
+                            self.path)
+            return
+        for name in self.defaults:
+            if name in stored:
+                self._values[name] = self._merge(name, stored[name])
+        self.dirty = False
+
+    def save(self, force=False):
+        """Write the options to the file if any has changed.
+
+        Returns whether the file was written."""
+        if not (self.dirty or force):
+            return False
+        directory = os.path.dirname(os.path.abspath(self.path))
+        descriptor, temporary_path = tempfile.mkstemp(
+            prefix='.options-', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(descriptor, 'wt') as options_file:
+                json.dump(self._values, options_file, indent=4,
+                          sort_keys=True)
+                options_file.flush()
+                os.fsync(options_file.fileno())
+            _replace(temporary_path, self.path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+        self.dirty = False
+        return True
+
+    def _merge(self, name, value, strict=False):
+        """Get the value an option would have if set to value.
+
+        Invalid values become the default, or raise ValueError if
+        strict is true."""
+        default = self.defaults[name]
+        if isinstance(default, dict) and isinstance(value, dict):
+            output = copy.deepcopy(default)
+            for key in default:
+                if key in value:
+                    if _valid(value[key], default[key]):
+                        output[key] = value[key]
+                    elif strict:
+                        raise ValueError("Invalid value for {} {}.".format(
+                            name, key))
+            return output
+        if _valid(value, default) and (name not in self.choices
+                                       or value in self.choices[name]):
+            return value
+        if strict:
+            raise ValueError("Invalid value for {}.".format(name))
+        logging.warning("Invalid value for option %s: %r", name, value)
+        return copy.deepcopy(default)
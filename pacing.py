@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+"""Frame pacing
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import collections
+import math
+import time
+
+# Use the most precise clock available
+clock = getattr(time, 'perf_counter', time.time)
+
+
+class FramePacer(object):
+    """Runs the simulation at a fixed rate and paces rendering.
+
+    Every frame, tick waits until the frame is due and returns how many
+    fixed simulation steps have to run to catch up with the clock.
+    alpha is how far the simulation is between its last two steps,
+    for interpolating what is drawn."""
+    DISPLAY_RATE = 60 # Used when max_fps is infinite
+    SLEEP_MARGIN = 0.002 # Sleep in small slices this close to a frame
+    def __init__(self, sim_rate=60, max_fps=30, max_steps=10,
+                 jitter_window=120, realtime=True):
+        """Initialize the instance.
+
+        At most max_steps simulation steps are run per frame, so a
+        slow frame makes the simulation slow down instead of
+        stalling.  If realtime is false, tick never waits and every
+        frame simulates exactly one frame's duration, so the game runs
+        as fast as it can be drawn (e.g. when exporting video)."""
+        self.sim_rate = sim_rate
+        self.realtime = realtime
+        self.max_fps = max_fps
+        self.max_steps = max_steps
+        self.frame_times = collections.deque(maxlen=jitter_window)
+        self.frame = 0
+        self._accumulator = 0
+        self._last_frame = None
+        self._next_frame = None
+
+    @property
+    def step(self):
+        """Get the duration of a simulation step in seconds."""
+        return 1 / self.sim_rate
+    @property
+    def max_fps(self):
+        """Get the maximum frame rate."""
+        return self._max_fps
+    @max_fps.setter
+    def max_fps(self, new_value):
+        """Set the maximum frame rate.  inf means the display rate."""
+        if not isinstance(new_value, (int, float)):
+            raise TypeError("Max FPS must be a number.")
+        if new_value <= 0:
+            raise ValueError("Max FPS must be positive.")
+        self._max_fps = new_value
+        self._next_frame = None
+    @property
+    def frame_duration(self):
+        """Get the minimum time between frames in seconds."""
+        if math.isinf(self.max_fps):
+            return 1 / self.DISPLAY_RATE
+        return 1 / self.max_fps
+    @property
+    def alpha(self):
+        """Get the fraction of a step that has not been simulated."""
+        return self._accumulator / self.step
+    @property
+    def fps(self):
+        """Get the average frame rate over the jitter window."""
+        if not self.frame_times:
+            return 0
+        return len(self.frame_times) / sum(self.frame_times)
+
+    def reset(self):
+        """Forget the time elapsed so far (e.g. after a pause)."""
+        self._accumulator = 0
+        self._last_frame = None
+        self._next_frame = None
+
+    def sleep_until(self, target):
+        """Sleep until the clock reaches target."""
+        remaining = target - clock()
+        if remaining > self.SLEEP_MARGIN:
+            time.sleep(remaining - self.SLEEP_MARGIN)
+        # Finish with short sleeps; time.sleep can overshoot a lot
+        while clock() < target:
+            time.sleep(self.SLEEP_MARGIN / 4)
+
+    def tick(self):
+        """Wait for the next frame.  Returns the steps to simulate."""
+        if not self.realtime:
+            return self._advance(self.frame_duration)
+        now = clock()
+        if self._last_frame is None:
+            self._last_frame = self._next_frame = now
+            return 0
+        if self._next_frame is None:
+            self._next_frame = self._last_frame + self.frame_duration
+        self.sleep_until(self._next_frame)
+        now = clock()
+        # Keep a steady cadence, but don't try to catch up
+        self._next_frame = max(self._next_frame + self.frame_duration,
+                               now)
+        frame_time = now - self._last_frame
+        self._last_frame = now
+        return self._advance(frame_time)
+
+    def _advance(self, frame_time):
+        """Count a frame.  Returns the steps to simulate."""
+        self.frame_times.append(frame_time)
+        self.frame += 1
+        self._accumulator += frame_time
+        steps = int(self._accumulator / self.step)
+        if steps > self.max_steps:
+            steps = self.max_steps
+            self._accumulator = 0
+        else:
+            self._accumulator -= steps * self.step
+        return steps
+
+    def jitter(self):
+        """Get frame time statistics over the jitter window.
+
+        Returns a dict with the mean, standard deviation, minimum and
+        maximum frame time in seconds."""
+        if not self.frame_times:
+            return {'mean': 0, 'stdev': 0, 'min': 0, 'max': 0}
+        mean = sum(self.frame_times) / len(self.frame_times)
+        variance = (sum((t - mean) ** 2 for t in self.frame_times)
+                    / len(self.frame_times))
+        return {
+            'mean': mean,
+            'stdev': variance ** 0.5,
+            'min': min(self.frame_times),
+            'max': max(self.frame_times),
+        }
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+
+"""Aircraft performance tables
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import array
+import math
+
+
+class Curve(object):
+    """A function sampled at evenly-spaced points.
+
+    Calling the curve interpolates linearly between the samples, and
+    extrapolates from the first or last two outside them."""
+    def __init__(self, function, start, stop, samples):
+        """Initialize the instance."""
+        self.start = start
+        self.stop = stop
+        self.step = (stop - start) / (samples - 1)
+        self._scale = 1 / self.step
+        self._last = samples - 2 # The last index that has a next one
+        self.values = array.array(
+            'd', [function(start + i*self.step) for i in range(samples)])
+
+    def __len__(self):
+        """Get the number of samples."""
+        return len(self.values)
+
+    def __call__(self, x):
+        """Get the curve's value at x."""
+        position = (x - self.start) * self._scale
+        index = int(position)
+        if index < 0:
+            index = 0
+        elif index > self._last:
+            index = self._last
+        low = self.values[index]
+        return low + (self.values[index + 1] - low) * (position - index)
+
+    def map(self, xs):
+        """Get the curve's values at every x in xs."""
+        values = self.values
+        start = self.start
+        scale = self._scale
+        last = self._last
+        output = []
+        for x in xs:
+            position = (x - start) * scale
+            index = int(position)
+            if index < 0:
+                index = 0
+            elif index > last:
+                index = last
+            low = values[index]
+            output.append(
+                low + (values[index + 1] - low) * (position - index))
+        return output
+
+
+class PerformanceTable(object):
+    """The precomputed flight model curves for one aircraft.
+
+    The curves are sampled so that every kink in them (stall speeds,
+    overspeed and the throttle limit) falls on a sample, so the only
+    error is the interpolation of the smooth parts."""
+    SPEED_SAMPLES_PER_UNIT = 2 # Samples per m/s
+    THROTTLE_SAMPLES = 801
+    ROLL_SAMPLES = 801
+    MAX_ROLL_LEVEL = 4
+    def __init__(self, max_speed=500, terminal_velocity=None,
+                 overspeed=0.75, max_safe_throttle=75):
+        """Initialize the instance.
+
+        terminal_velocity defaults to a fifth of max_speed.  Speeds
+        above overspeed * max_speed and throttles above
+        max_safe_throttle damage the aircraft."""
+        if terminal_velocity is None:
+            terminal_velocity = max_speed / 5
+        self.max_speed = max_speed
+        self.terminal_velocity = terminal_velocity
+        self.overspeed = overspeed
+        self.max_safe_throttle = max_safe_throttle
+        max_roll = self.MAX_ROLL_LEVEL
+        # Approximates the 5, 10, 20, 30 roll of Slight Fimulator 1.0
+        self.roll_degrees = Curve(
+            lambda r: (35/198) * r**3 + (470/99) * r,
+            -max_roll, max_roll, self.ROLL_SAMPLES)
+        self.roll = Curve(
+            lambda r: math.radians((35/198) * r**3 + (470/99) * r),
+            -max_roll, max_roll, self.ROLL_SAMPLES)
+        speed_samples = int(2*max_speed * self.SPEED_SAMPLES_PER_UNIT) + 1
+        self.max_vert_roll = Curve(
+            self._max_vert_roll, 0, 2*max_speed, speed_samples)
+        self.drag = Curve(lambda speed: speed**2 * 40 / max_speed**2,
+                          0, 2*max_speed, speed_samples)
+        self.gravity_gain = Curve(
+            lambda speed: ((max_speed / 10 - speed)
+                           / max_speed * terminal_velocity),
+            0, 2*max_speed, speed_samples)
+        self.overspeed_damage = Curve(
+            lambda speed: (max(speed - max_speed*overspeed, 0) ** 2
+                           / (max_speed**2*10)),
+            0, 2*max_speed, speed_samples)
+        self.thrust = Curve(lambda throttle: throttle**2 / 250,
+                            0, 100, self.THROTTLE_SAMPLES)
+        self.throttle_damage = Curve(
+            lambda throttle: (max(throttle - max_safe_throttle, 0) ** 2
+                              / 1000),
+            0, 100, self.THROTTLE_SAMPLES)
+        # Gravity's own drag is gravity**2 times this
+        self.gravity_drag = 10 / terminal_velocity**2
+        # For looking up every speed curve at once
+        self._speed_values = tuple(zip(
+            self.max_vert_roll.values, self.drag.values,
+            self.gravity_gain.values, self.overspeed_damage.values))
+        self._speed_scale = 1 / self.drag.step
+        self._speed_last = len(self.drag) - 2
+
+    def at_speed(self, speed):
+        """Get every speed curve's value at speed.
+
+        Returns (max_vert_roll, drag, gravity_gain, overspeed_damage),
+        with a single table lookup."""
+        position = speed * self._speed_scale
+        index = int(position)
+        if index < 0:
+            index = 0
+        elif index > self._speed_last:
+            index = self._speed_last
+        t = position - index
+        low = self._speed_values[index]
+        high = self._speed_values[index + 1]
+        return (low[0] + (high[0]-low[0]) * t,
+                low[1] + (high[1]-low[1]) * t,
+                low[2] + (high[2]-low[2]) * t,
+                low[3] + (high[3]-low[3]) * t)
+
+    def at_controls(self, roll_level, throttle):
+        """Get the curves that only depend on the controls.
+
+        Returns (roll, thrust, throttle_damage)."""
+        return (self.roll(roll_level), self.thrust(throttle),
+                self.throttle_damage(throttle))
+
+    def _max_vert_roll(self, speed):
+        """Get the highest vertical roll level before stalling."""
+        if speed <= (self.max_speed / 5):
+            return max((speed-(self.max_speed / 10))
+                       / (self.max_speed / 40), 0)
+        return self.MAX_ROLL_LEVEL
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+
+"""Batched flight model stepping
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Planes are stepped in batches that share an aircraft type and an
+integrator.  A batch's flight states are laid out as one state, and
+integrated with one integrator call; the performance table and
+integrator are looked up once per batch.  A mixed fleet is just
+several batches.  step_planes_validated does the same through the
+planes' setters; check_step_planes and benchmark compare the two.
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import math
+import time
+
+from integrators import INTEGRATORS
+
+
+def group_planes(planes):
+    """Split planes into batches with the same flight model.
+
+    Returns a list of lists of planes, one per (aircraft type,
+    integrator) pair, in the order the pairs first appear."""
+    batches = {}
+    order = []
+    for plane in planes:
+        key = (plane.aircraft_type, plane.integrator)
+        try:
+            batches[key].append(plane)
+        except KeyError:
+            batches[key] = [plane]
+            order.append(key)
+    return [batches[key] for key in order]
+
+
+def flight_derivatives(performance, controls, vertical_roll_levels,
+                       gravity_rate):
+    """Make the derivatives function of a batch of planes.
+
+    The batch's state has the values of Airplane.get_flight_state, one
+    after another, with a value per plane each: every x, then every z
+    and so on.  controls (performance.at_controls's output) and
+    vertical_roll_levels have one item per plane, and are held."""
+    count = len(controls)
+    at_speed = performance.at_speed
+    gravity_drag = performance.gravity_drag
+    sin = math.sin
+    cos = math.cos
+    radians = math.radians
+    def derivatives(state):
+        """Get the rates of change of the batch's state."""
+        dx = []
+        dz = []
+        daltitude = []
+        dhealth = []
+        dheading = []
+        dspeed = []
+        dgravity = []
+        for (heading, speed, gravity, (roll, thrust, throttle_damage),
+             vertical_roll_level) in zip(
+                 state[4*count:5*count], state[5*count:6*count],
+                 state[6*count:], controls, vertical_roll_levels):
+            max_vert_roll, drag, gravity_gain, overspeed_damage = \
+                at_speed(speed)
+            # stall
+            pitch = radians(min(vertical_roll_level, max_vert_roll) * 10)
+            hspeed = speed * cos(pitch)
+            gravity_change = gravity_rate * (
+                gravity_gain - gravity * gravity * gravity_drag)
+            if gravity <= 0 and gravity_change < 0:
+                gravity_change = 0 # Gravity can't push the plane up
+            dx.append(sin(heading) * hspeed)
+            dz.append(-cos(heading) * hspeed)
+            daltitude.append(speed * sin(pitch) - gravity)
+            dhealth.append(-(overspeed_damage + throttle_damage))
+            dheading.append(roll)
+            dspeed.append(thrust - drag)
+            dgravity.append(gravity_change)
+        return dx + dz + daltitude + dhealth + dheading + dspeed + dgravity
+    return derivatives
+
+
+def step_planes(planes, tick_duration):
+    """Update planes that share an aircraft type and integrator.
+
+    Use group_planes to get such batches.  The whole batch's flight
+    state is integrated at once (see flight_derivatives), with one
+    integrator call.  The adaptive integrator then picks its substeps
+    for the batch as a whole.  The planes' fields are written directly:
+    everything computed here is already a number in range, so the
+    property setters' checks are skipped."""
+    if not planes:
+        return
+    first = planes[0]
+    performance = first.aircraft_type.performance
+    integrate = INTEGRATORS[first.integrator]
+    at_controls = performance.at_controls
+    at_speed = performance.at_speed
+    count = len(planes)
+    full_turn = math.pi * 2
+    radians = math.radians
+    now = time.time()
+    controls = []
+    vertical_roll_levels = []
+    for plane in planes:
+        pos = plane._pos
+        plane._time = now
+        plane._prev_pos = [pos[0], pos[1]]
+        plane._prev_heading = plane._heading
+        plane_controls = at_controls(plane._roll_level, plane._throttle)
+        max_vert_roll, drag = at_speed(plane._speed)[:2]
+        # stall and pitch
+        if plane._vertical_roll_level > max_vert_roll:
+            plane._vertical_roll_level = max_vert_roll
+        plane._pitch = radians(plane._vertical_roll_level * 10)
+        # acceleration
+        plane._acceleration = plane_controls[1] - drag
+        controls.append(plane_controls)
+        vertical_roll_levels.append(plane._vertical_roll_level)
+
+    # move planes, change speed and heading and deal damage
+    state = integrate(
+        flight_derivatives(performance, controls, vertical_roll_levels,
+                           first.GRAVITY_RATE),
+        [plane._pos[0] for plane in planes]
+        + [plane._pos[1] for plane in planes]
+        + [plane._altitude for plane in planes]
+        + [plane._health for plane in planes]
+        + [plane._heading for plane in planes]
+        + [plane._speed for plane in planes]
+        + [plane._gravity for plane in planes],
+        tick_duration, first.FLIGHT_STATE_SPLIT * count)
+    for i, plane in enumerate(planes):
+        pos = plane._pos
+        pos[0] = state[i]
+        pos[1] = state[count + i]
+        altitude = state[2*count + i]
+        plane._health = state[3*count + i]
+        plane._speed = state[5*count + i]
+        gravity = state[6*count + i]
+        if gravity < 0 or altitude <= 0.1:
+            gravity = 0
+        if altitude < 0.1:
+            altitude = 0
+        plane._altitude = altitude
+        plane._gravity = gravity
+        plane._heading = state[4*count + i] % full_turn
+
+
+def step_planes_validated(planes, tick_duration):
+    """Do the same as step_planes, a plane at a time, through the
+    planes' public setters.
+
+    This is slower; it is only kept to check and time step_planes
+    against (see check_step_planes and benchmark)."""
+    now = time.time()
+    for plane in planes:
+        performance = plane.aircraft_type.performance
+        plane._time = now
+        plane._prev_pos = list(plane.pos)
+        plane._prev_heading = plane.heading
+        controls = performance.at_controls(plane.roll_level, plane.throttle)
+        max_vert_roll, drag = performance.at_speed(plane.speed)[:2]
+        if plane.vertical_roll_level > max_vert_roll:
+            plane.vertical_roll_level = max_vert_roll
+        plane.pitch_degrees = plane.vertical_roll_level * 10
+        plane.acceleration = controls[1] - drag
+        (plane.x, plane.z, plane.altitude, plane.health, plane.heading,
+         plane.speed, plane.gravity) = INTEGRATORS[plane.integrator](
+             lambda state: plane.derivatives(state, controls),
+             plane.get_flight_state(), tick_duration,
+             plane.FLIGHT_STATE_SPLIT)
+        if plane.gravity < 0 or plane.altitude <= 0.1:
+            plane.gravity = 0
+        if plane.altitude < 0.1:
+            plane.altitude = 0
+
+
+def _fleet(count, integrator):
+    """Make count planes in various states."""
+    from objects import Airplane
+    planes = []
+    for i in range(count):
+        plane = Airplane(0, 0, 10, 10, 8000, player_id=i)
+        plane.integrator = integrator
+        plane.speed = 50 + i % 300
+        plane.throttle = i % 101
+        plane.roll_level = (i % 9) - 4
+        plane.vertical_roll_level = ((i % 7) - 3) / 2
+        planes.append(plane)
+    return planes
+
+
+def _fly(step, planes, ticks, tick_duration):
+    """Step planes for ticks ticks.  Returns (CPU time, final states)."""
+    start = time.time()
+    for _ in range(ticks):
+        step(planes, tick_duration)
+    cpu_time = time.time() - start
+    return cpu_time, [plane.get_flight_state() + [
+        plane.pitch, plane.acceleration, plane.vertical_roll_level]
+                      for plane in planes]
+
+
+def _difference(states, other_states):
+    """Get the largest difference between two lists of states."""
+    return max(abs(a - b) for state, other in zip(states, other_states)
+               for a, b in zip(state, other))
+
+
+def check_step_planes(count=200, ticks=300, tick_duration=1/60):
+    """Check that step_planes gives the same states as
+    step_planes_validated after ticks ticks, with every integrator.
+
+    This is what lets step_planes skip the setters' checks.  Raises
+    AssertionError if not."""
+    for integrator in sorted(INTEGRATORS):
+        expected = _fly(step_planes_validated, _fleet(count, integrator),
+                        ticks, tick_duration)[1]
+        found = _fly(step_planes, _fleet(count, integrator), ticks,
+                     tick_duration)[1]
+        error = _difference(expected, found)
+        if error:
+            raise AssertionError(
+                "{}: step_planes is off by {:.3g}".format(
+                    integrator, error))
+    print("step_planes matches step_planes_validated")
+
+
+def benchmark(count=1000, ticks=300, tick_duration=1/60):
+    """Time step_planes against step_planes_validated, and against
+    stepping planes one at a time.
+
+    All of them fly the same fleet with each integrator; the
+    difference is from step_planes_validated's final states."""
+    def one_at_a_time(planes, tick_duration):
+        """Step each plane as its own batch."""
+        for plane in planes:
+            step_planes([plane], tick_duration)
+    check_step_planes()
+    print("%-14s %-10s %12s %12s" % (
+        "INTEGRATOR", "PATH", "US/TICK", "DIFFERENCE"))
+    for integrator in ('euler', 'semi-implicit', 'rk4', 'adaptive'):
+        expected = None
+        for name, step in (("validated", step_planes_validated),
+                           ("single", one_at_a_time),
+                           ("batched", step_planes)):
+            cpu_time, states = _fly(step, _fleet(count, integrator),
+                                    ticks, tick_duration)
+            if expected is None:
+                expected = states
+            print("%-14s %-10s %12.2f %12.3g" % (
+                integrator, name, cpu_time / (count*ticks) * 1e6,
+                _difference(expected, states)))
+
+if __name__ == '__main__':
+    benchmark()
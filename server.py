@@ -0,0 +1,470 @@
+#!/usr/bin/env python
+
+"""The multiplayer server and its client-side counterpart
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+The server owns one authoritative Airspace and updates it at a fixed
+rate.  Clients connect over TCP, send control inputs for their plane
+and receive the state of the airspace after every tick, encoded by
+statesync against the last state they acknowledged.  With an
+InterestManager, each client only gets nearby planes every tick.
+Control rates are clamped to MAX_CONTROL_RATES, and a client that
+sends any that aren't finite is disconnected.  Requires Python 3.
+
+Every message is a 4-byte big-endian length, then a 1-byte message
+type and the message body.
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import argparse
+import asyncio
+import logging
+import math
+import struct
+import time
+
+import aircraft
+from airspace import Airspace
+import inputs
+from interest import InterestManager
+from statesync import StateDecoder, StateEncoder
+from traffic import TrafficGenerator
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 7017
+DEFAULT_TICK_RATE = 20
+
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME_SIZE = 1 << 22
+
+# Message types
+MSG_JOIN = b'J' # client -> server, no body
+MSG_WELCOME = b'W' # server -> client, WELCOME_FORMAT
+MSG_CONTROL = b'C' # client -> server, CONTROL_FORMAT
+MSG_STATE = b'S' # server -> client, a statesync packet
+MSG_ACK = b'A' # client -> server, ACK_FORMAT
+
+# Plane ID and tick rate
+WELCOME_FORMAT = struct.Struct('<if')
+# Roll and pitch rates (levels per second), throttle rate (% per
+# second) and flags
+CONTROL_FORMAT = struct.Struct('<3fB')
+CONTROL_AUTOPILOT = 1
+# The fastest roll, pitch and throttle rates accepted: enough to move
+# each control across its whole range in a second
+MAX_CONTROL_RATES = (8, 8, 100)
+# The sequence of the last state received
+ACK_FORMAT = struct.Struct('<I')
+
+
+def parse_controls(body):
+    """Unpack a CONTROL_FORMAT body, clamping the rates.
+
+    Raises ValueError if a rate isn't a finite number."""
+    roll, pitch, throttle, flags = CONTROL_FORMAT.unpack(body)
+    rates = []
+    for rate, limit in zip((roll, pitch, throttle), MAX_CONTROL_RATES):
+        if not math.isfinite(rate):
+            raise ValueError("Control rates must be finite.")
+        rates.append(min(max(rate, -limit), limit))
+    return tuple(rates) + (flags,)
+
+
+def frame(msg_type, body=b''):
+    """Frame a message for sending."""
+    return FRAME_HEADER.pack(len(body) + 1) + msg_type + body
+
+
+async def read_frame(reader):
+    """Read one message.  Returns (msg_type, body)."""
+    size, = FRAME_HEADER.unpack(
+        await reader.readexactly(FRAME_HEADER.size))
+    if not 0 < size <= MAX_FRAME_SIZE:
+        raise ValueError("Invalid frame size {}.".format(size))
+    data = await reader.readexactly(size)
+    return data[:1], data[1:]
+
+
+class AirspaceServer(object):
+    """A server that owns an airspace and shares it with clients."""
+    # Writers with more unsent data than this are disconnected
+    MAX_WRITE_BUFFER = 1 << 20
+    def __init__(self, airspace=None, host=DEFAULT_HOST,
+                 port=DEFAULT_PORT, tick_rate=DEFAULT_TICK_RATE,
+                 interest=None, traffic=None):
+        """Initialize the instance.  Does not start the server.
+
+        interest is an optional interest.InterestManager, and traffic
+        an optional traffic.TrafficGenerator for airspace."""
+        if airspace is None:
+            airspace = Airspace()
+        self.airspace = airspace
+        if not self.airspace.objectives:
+            self.airspace.generate_objective()
+        self.host = host
+        self.port = port
+        self.tick_rate = tick_rate
+        self.tick = 0
+        self.clients = {} # plane ID -> StreamWriter
+        self.controls = {} # plane ID -> unpacked CONTROL_FORMAT
+        self.acks = {} # plane ID -> last acknowledged sequence
+        self.encoder = StateEncoder()
+        self.interest = interest
+        self.traffic = traffic
+        self._server = None
+
+    async def start(self):
+        """Start accepting clients."""
+        self._server = await asyncio.start_server(
+            self.handle_client, self.host, self.port)
+        if self.port == 0: # Use the port the OS picked
+            self.port = self._server.sockets[0].getsockname()[1]
+        logging.info("Serving on %s:%i", self.host, self.port)
+
+    async def serve_forever(self):
+        """Start the server and update the airspace until cancelled."""
+        if self._server is None:
+            await self.start()
+        loop = asyncio.get_event_loop()
+        period = 1 / self.tick_rate
+        next_tick = loop.time()
+        try:
+            while True:
+                self.update(period)
+                next_tick += period
+                delay = next_tick - loop.time()
+                if delay < -period: # Too far behind, don't catch up
+                    logging.warning("Server is running behind.")
+                    next_tick = loop.time()
+                    delay = 0
+                await asyncio.sleep(max(delay, 0))
+        finally:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def update(self, tick_duration):
+        """Apply controls, update the airspace and broadcast it."""
+        self.apply_controls(tick_duration)
+        self.airspace.update(tick_duration)
+        if self.traffic is not None:
+            self.traffic.update()
+        self.tick += 1
+        if self.clients:
+            self.encoder.capture(
+                self.tick, self.airspace.planes, self.airspace.objectives)
+            if self.interest is not None:
+                self.interest.update(self.airspace.planes)
+            self.broadcast()
+
+    def apply_controls(self, tick_duration):
+        """Apply the latest controls from every client."""
+        planes = []
+        vectors = []
+        for plane in self.airspace.planes:
+            if plane.id_ not in self.controls:
+                continue
+            roll, pitch, throttle, flags = self.controls[plane.id_]
+            planes.append(plane)
+            if flags & CONTROL_AUTOPILOT:
+                vectors.append(inputs.ControlVector(0, 0, 0, None, True))
+            else:
+                vectors.append(inputs.ControlVector(
+                    roll * tick_duration, pitch * tick_duration,
+                    throttle * tick_duration, None, False))
+        inputs.apply_controls(planes, vectors)
+
+    def broadcast(self):
+        """Send the latest state to every client.
+
+        Without interest management, packets are shared between
+        clients with the same baseline."""
+        messages = {}
+        snapshot = self.encoder.snapshots[self.tick]
+        for plane_id, writer in list(self.clients.items()):
+            if (writer.transport.get_write_buffer_size()
+                    > self.MAX_WRITE_BUFFER):
+                logging.warning("Dropping slow client %i", plane_id)
+                writer.close()
+                del self.clients[plane_id]
+                continue
+            if self.interest is not None:
+                writer.write(frame(MSG_STATE, self.interest.encode(
+                    plane_id, self.tick, snapshot)))
+                continue
+            baseline = self.acks.get(plane_id)
+            if baseline not in messages:
+                messages[baseline] = frame(
+                    MSG_STATE, self.encoder.encode(baseline))
+            writer.write(messages[baseline])
+
+    async def handle_client(self, reader, writer):
+        """Serve one client until it disconnects."""
+        plane = None
+        try:
+            msg_type, _ = await read_frame(reader)
+            if msg_type != MSG_JOIN:
+                raise ValueError("Expected a join message.")
+            plane = self.airspace.add_plane()
+            logging.info("Plane %i joined", plane.id_)
+            writer.write(frame(MSG_WELCOME, WELCOME_FORMAT.pack(
+                plane.id_, self.tick_rate)))
+            if self.interest is not None:
+                self.interest.subscribe(plane.id_, plane.id_)
+            self.clients[plane.id_] = writer
+            while True:
+                msg_type, body = await read_frame(reader)
+                if msg_type == MSG_CONTROL:
+                    self.controls[plane.id_] = parse_controls(body)
+                elif msg_type == MSG_ACK:
+                    self.acks[plane.id_], = ACK_FORMAT.unpack(body)
+                    if self.interest is not None:
+                        self.interest.ack(plane.id_, self.acks[plane.id_])
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass # Disconnected
+        except (ValueError, struct.error) as e:
+            logging.warning("Bad message from client: %s", e)
+        finally:
+            if plane is not None:
+                logging.info("Plane %i left", plane.id_)
+                self.clients.pop(plane.id_, None)
+                self.controls.pop(plane.id_, None)
+                self.acks.pop(plane.id_, None)
+                if self.interest is not None:
+                    self.interest.unsubscribe(plane.id_)
+                self.airspace.remove_plane(plane.id_)
+            writer.close()
+
+
+class RemoteAirspace(object):
+    """The client-side copy of a server's airspace.
+
+    Keeps the last few states of every plane and interpolates between
+    them, drawing slightly in the past to hide network latency."""
+    HISTORY = 3 # States kept per plane
+    def __init__(self, tick_rate=DEFAULT_TICK_RATE, delay_ticks=2):
+        """Initialize the instance."""
+        self.tick_rate = tick_rate
+        self.delay_ticks = delay_ticks
+        self.decoder = StateDecoder()
+        self.planes = {} # plane ID -> [(server time, state), ...]
+        self.objectives = {} # objective ID -> {field name: value}
+        self.tick = 0
+        self._clock_offset = None # server time - local time
+
+    def apply(self, packet, now=None):
+        """Apply a state packet.  Returns the sequence to acknowledge."""
+        if now is None:
+            now = time.time()
+        tick = self.decoder.decode(packet)
+        server_time = tick / self.tick_rate
+        # The smallest offset is the one least affected by latency
+        offset = server_time - now
+        if self._clock_offset is None or offset < self._clock_offset:
+            self._clock_offset = offset
+        planes = self.decoder.planes
+        for plane_id in list(self.planes):
+            if plane_id not in planes:
+                del self.planes[plane_id]
+        for plane_id, state in planes.items():
+            history = self.planes.setdefault(plane_id, [])
+            history.append((server_time, state))
+            del history[:-self.HISTORY]
+        self.objectives = self.decoder.objectives
+        self.tick = tick
+        return tick
+
+    def interpolate(self, now=None):
+        """Get every plane's state at the render time.
+
+        Returns {plane ID: (x, z, altitude, heading)}."""
+        if self._clock_offset is None:
+            return {}
+        if now is None:
+            now = time.time()
+        render_time = (now + self._clock_offset
+                       - self.delay_ticks / self.tick_rate)
+        output = {}
+        for plane_id, history in self.planes.items():
+            end_time, end = history[-1]
+            start_time, start = history[0]
+            for sample_time, state in history:
+                if sample_time <= render_time:
+                    start_time, start = sample_time, state
+                else:
+                    end_time, end = sample_time, state
+                    break
+            if end_time > start_time:
+                t = (render_time - start_time) / (end_time - start_time)
+                t = min(max(t, 0), 1)
+            else:
+                t = 1
+            # Turn the shortest way round
+            turn = ((end['heading'] - start['heading'] + math.pi)
+                    % (2*math.pi) - math.pi)
+            output[plane_id] = (
+                start['x'] + (end['x'] - start['x']) * t,
+                start['z'] + (end['z'] - start['z']) * t,
+                start['altitude']
+                + (end['altitude'] - start['altitude']) * t,
+                (start['heading'] + turn * t) % (2*math.pi))
+        return output
+
+
+class AirspaceClient(object):
+    """Connects to an AirspaceServer and flies one plane."""
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Initialize the instance.  Does not connect."""
+        self.host = host
+        self.port = port
+        self.plane_id = None
+        self.remote = None
+        self._reader = None
+        self._writer = None
+
+    async def connect(self):
+        """Connect and join.  Returns the plane's ID."""
+        self._reader, self._writer = await asyncio.open_connection(
+            self.host, self.port)
+        self._writer.write(frame(MSG_JOIN))
+        msg_type, body = await read_frame(self._reader)
+        if msg_type != MSG_WELCOME:
+            raise ValueError("Expected a welcome message.")
+        self.plane_id, tick_rate = WELCOME_FORMAT.unpack(body)
+        self.remote = RemoteAirspace(tick_rate)
+        return self.plane_id
+
+    def send_controls(self, roll=0, pitch=0, throttle=0,
+                      autopilot=False):
+        """Send control rates for the plane."""
+        self._writer.write(frame(MSG_CONTROL, CONTROL_FORMAT.pack(
+            roll, pitch, throttle,
+            CONTROL_AUTOPILOT if autopilot else 0)))
+
+    async def receive(self):
+        """Receive one message and apply it.  Returns its type."""
+        msg_type, body = await read_frame(self._reader)
+        if msg_type == MSG_STATE:
+            self._writer.write(frame(
+                MSG_ACK, ACK_FORMAT.pack(self.remote.apply(body))))
+        return msg_type
+
+    async def receive_forever(self):
+        """Receive messages until the server disconnects."""
+        try:
+            while True:
+                await self.receive()
+        except asyncio.IncompleteReadError:
+            pass
+
+    def close(self):
+        """Disconnect."""
+        if self._writer is not None:
+            self._writer.close()
+
+
+async def _check_bad_controls(ticks):
+    """Run check_bad_controls."""
+    server = AirspaceServer(port=0, tick_rate=100)
+    await server.start()
+    task = asyncio.ensure_future(server.serve_forever())
+    try:
+        good = AirspaceClient(port=server.port)
+        bad = AirspaceClient(port=server.port)
+        await good.connect()
+        await bad.connect()
+        good.send_controls(roll=1e30, throttle=-1e30) # Clamped
+        bad.send_controls(roll=float('nan'))
+        await asyncio.wait_for(bad.receive_forever(), 5) # Dropped
+        start = server.tick
+        for _ in range(ticks):
+            if await good.receive() != MSG_STATE:
+                raise AssertionError("Expected a state message.")
+        if task.done() or server.tick - start < ticks:
+            raise AssertionError("The server stopped ticking.")
+        if set(server.clients) != set([good.plane_id]):
+            raise AssertionError("The bad client wasn't dropped.")
+        if server.controls[good.plane_id][:3] != (8, 0, -100):
+            raise AssertionError("The control rates weren't clamped.")
+        good.close()
+        bad.close()
+    finally:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+def check_bad_controls(ticks=20):
+    """Check that a client sending NaN controls is dropped, and that
+    the server keeps ticking for the others.
+
+    Raises AssertionError if not."""
+    asyncio.run(_check_bad_controls(ticks))
+    print("Bad controls: client dropped, server still ticking")
+
+
+def main(argv=None):
+    """Run a server from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Run a Slight Fimulator airspace server.")
+    parser.add_argument('--host', default=DEFAULT_HOST,
+                        help='the address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help='the port to listen on')
+    parser.add_argument('--tick-rate', type=float,
+                        default=DEFAULT_TICK_RATE,
+                        help='airspace updates per second')
+    parser.add_argument('--interest-radius', type=float,
+                        help='only send nearby planes every tick')
+    parser.add_argument('--aircraft-file', default=aircraft.DEFAULT_PATH,
+                        help='the aircraft types to load')
+    parser.add_argument('--traffic', type=int, default=0, metavar='N',
+                        help='the number of AI planes to fly')
+    parser.add_argument(
+        '--log-level', default='INFO',
+        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+        help='the least important log item type to display')
+    parser.add_argument(
+        '--check', action='store_true',
+        help="check that bad controls can't stop the server, then exit")
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        datefmt="%H:%M:%S", level=getattr(logging, args.log_level),
+        format="%(asctime)s    %(levelname)s\t%(message)s")
+    if args.check:
+        check_bad_controls()
+        return
+    aircraft.load_aircraft_types(args.aircraft_file)
+    interest = None
+    if args.interest_radius:
+        interest = InterestManager(args.interest_radius)
+    airspace = Airspace()
+    traffic = TrafficGenerator(airspace, args.traffic,
+                               aircraft_types=list(aircraft.AIRCRAFT_TYPES))
+    server = AirspaceServer(airspace, args.host, args.port,
+                            args.tick_rate, interest, traffic)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
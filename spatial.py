@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+"""A spatial index for the objects in an airspace
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import math
+
+
+class SpatialHash(object):
+    """A uniform grid that buckets objects by their (x, z) position.
+
+    Queries only look at the cells they overlap, so their cost depends
+    on how crowded the area is, not on the total number of objects."""
+    def __init__(self, cell_size):
+        """Initialize the instance."""
+        self.cell_size = cell_size
+        self.cells = {} # (column, row) -> [(x, z, obj), ...]
+
+    def __len__(self):
+        """Get the number of objects in the index."""
+        return sum(len(cell) for cell in self.cells.values())
+
+    def cell(self, x, z):
+        """Get the (column, row) of the cell containing (x, z)."""
+        return (int(math.floor(x / self.cell_size)),
+                int(math.floor(z / self.cell_size)))
+
+    def clear(self):
+        """Remove everything from the index."""
+        self.cells = {}
+
+    def insert(self, obj, x, z):
+        """Add an object at (x, z)."""
+        key = self.cell(x, z)
+        try:
+            self.cells[key].append((x, z, obj))
+        except KeyError:
+            self.cells[key] = [(x, z, obj)]
+
+    def build(self, objects):
+        """Replace the index's contents with objects.
+
+        The objects need x and z attributes."""
+        self.cells = {}
+        for obj in objects:
+            self.insert(obj, obj.x, obj.z)
+
+    def query_rect(self, left, top, right, bottom):
+        """Get the objects inside a rectangle."""
+        output = []
+        first_column, first_row = self.cell(left, top)
+        last_column, last_row = self.cell(right, bottom)
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                for x, z, obj in self.cells.get((column, row), ()):
+                    if left <= x <= right and top <= z <= bottom:
+                        output.append(obj)
+        return output
+
+    def query_radius(self, x, z, radius):
+        """Get the objects within radius of (x, z)."""
+        output = []
+        radius_squared = radius ** 2
+        first_column, first_row = self.cell(x - radius, z - radius)
+        last_column, last_row = self.cell(x + radius, z + radius)
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                for obj_x, obj_z, obj in self.cells.get((column, row), ()):
+                    if (obj_x-x) ** 2 + (obj_z-z) ** 2 <= radius_squared:
+                        output.append(obj)
+        return output
@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+
+"""The binary state synchronisation codec
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Plane and objective state is quantized to small integers.  A packet
+holds every plane and objective that changed since a baseline snapshot
+the receiver has acknowledged, and for each of them only the fields
+that changed.  Without a baseline, everything is sent.
+
+Packet layout (little-endian):
+ - PACKET_HEADER: sequence, baseline sequence (NO_BASELINE if none)
+   and the number of changed planes, removed planes, changed
+   objectives and removed objectives
+ - the changed planes: ID, field mask, then the changed fields
+ - the removed plane IDs
+ - the changed objectives, as for planes
+ - the removed objective IDs
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import math
+import random
+import struct
+import time
+
+NO_BASELINE = 0xFFFFFFFF
+PACKET_HEADER = struct.Struct('<II4H')
+ENTITY_HEADER = struct.Struct('<IH')
+REMOVED_FORMAT = struct.Struct('<I')
+LIMITS = {
+    'B': (0, 0xFF),
+    'h': (-0x8000, 0x7FFF),
+    'H': (0, 0xFFFF),
+    'i': (-0x80000000, 0x7FFFFFFF),
+}
+# Fields: name, struct code, units per quantization step.
+# Field names are Airplane attributes, except autopilot.
+PLANE_FIELDS = (
+    ('x', 'i', 0.1),
+    ('z', 'i', 0.1),
+    ('altitude', 'H', 0.5),
+    ('heading', 'H', 2*math.pi / 0x10000),
+    ('pitch', 'h', 0.0001),
+    ('speed', 'H', 0.02), # Up to 1310 m/s: past every type's max
+    ('roll_level', 'h', 0.001),
+    ('throttle', 'B', 0.5),
+    ('health', 'h', 0.01),
+    ('points', 'H', 1),
+    ('autopilot', 'B', 1),
+    ('warnings', 'H', 1),
+)
+OBJECTIVE_FIELDS = (
+    ('x', 'i', 0.1),
+    ('z', 'i', 0.1),
+    ('altitude', 'H', 0.5),
+)
+WRAPPED_FIELDS = ('heading',) # Wrap around instead of clamping
+
+
+def _quantizer(fields):
+    """Make a function that quantizes an object's fields."""
+    plan = []
+    for name, code, step in fields:
+        low, high = LIMITS[code]
+        plan.append((name, 1 / step, low, high, name in WRAPPED_FIELDS))
+    def quantize(obj):
+        """Quantize an object's fields into a tuple of integers."""
+        output = []
+        for name, scale, low, high, wrap in plan:
+            if name == 'autopilot':
+                value = int(obj._autopilot_info['enabled'])
+            else:
+                value = int(round(getattr(obj, name) * scale))
+            if wrap:
+                value %= high + 1
+            elif value < low:
+                value = low
+            elif value > high:
+                value = high
+            output.append(value)
+        return tuple(output)
+    return quantize
+
+quantize_plane = _quantizer(PLANE_FIELDS)
+quantize_objective = _quantizer(OBJECTIVE_FIELDS)
+
+
+def dequantize(values, fields=PLANE_FIELDS):
+    """Turn a quantized tuple back into a {field name: value} dict."""
+    return dict((name, value * step) for (name, code, step), value
+                in zip(fields, values))
+
+
+def capture(planes, objectives):
+    """Quantize an airspace's state into a snapshot.
+
+    A snapshot is a tuple of two {ID: quantized tuple} dicts, one for
+    planes and one for objectives."""
+    return (dict((plane.id_, quantize_plane(plane)) for plane in planes),
+            dict((obj.id_, quantize_objective(obj))
+                 for obj in objectives))
+
+
+class _EntityCodec(object):
+    """Packs and unpacks the changed fields of one kind of entity."""
+    def __init__(self, fields):
+        """Initialize the instance."""
+        self.codes = [code for name, code, step in fields]
+        self.full_mask = (1 << len(fields)) - 1
+        self._structs = {} # field mask -> struct.Struct
+
+    def struct_for(self, mask):
+        """Get the struct for the fields in a mask."""
+        try:
+            return self._structs[mask]
+        except KeyError:
+            codes = [code for bit, code in enumerate(self.codes)
+                     if mask & (1 << bit)]
+            packer = self._structs[mask] = struct.Struct(
+                '<' + ''.join(codes))
+            return packer
+
+    def encode(self, current, baseline, output, only=None):
+        """Append changed entities to output.
+
+        If only is given, only those IDs are compared.
+        Returns the number of entities appended."""
+        count = 0
+        if only is None:
+            items = current.items()
+        else:
+            items = [(i, current[i]) for i in only if i in current]
+        for entity_id, values in items:
+            old = baseline.get(entity_id)
+            if old is None:
+                mask = self.full_mask
+                changed = values
+            elif old == values:
+                continue
+            else:
+                mask = 0
+                changed = []
+                for bit, (value, old_value) in enumerate(zip(values, old)):
+                    if value != old_value:
+                        mask |= 1 << bit
+                        changed.append(value)
+            output.append(ENTITY_HEADER.pack(entity_id, mask))
+            output.append(self.struct_for(mask).pack(*changed))
+            count += 1
+        return count
+
+    def decode(self, packet, offset, count, baseline, output):
+        """Read count entities into output.  Returns the new offset."""
+        for _ in range(count):
+            entity_id, mask = ENTITY_HEADER.unpack_from(packet, offset)
+            offset += ENTITY_HEADER.size
+            packer = self.struct_for(mask)
+            changed = packer.unpack_from(packet, offset)
+            offset += packer.size
+            if mask == self.full_mask:
+                output[entity_id] = changed
+                continue
+            values = list(baseline.get(entity_id, (0,) * len(self.codes)))
+            changed = iter(changed)
+            for bit in range(len(values)):
+                if mask & (1 << bit):
+                    values[bit] = next(changed)
+            output[entity_id] = tuple(values)
+        return offset
+
+_plane_codec = _EntityCodec(PLANE_FIELDS)
+_objective_codec = _EntityCodec(OBJECTIVE_FIELDS)
+_EMPTY_SNAPSHOT = ({}, {})
+
+
+def encode_delta(sequence, snapshot, baseline_sequence=NO_BASELINE,
+                 baseline=_EMPTY_SNAPSHOT, only=None):
+    """Encode the difference between two snapshots as a packet.
+
+    If only is given, it is the set of plane IDs that may have changed
+    since the baseline."""
+    planes, objectives = snapshot
+    old_planes, old_objectives = baseline
+    body = []
+    plane_count = _plane_codec.encode(planes, old_planes, body, only)
+    removed_planes = [i for i in old_planes if i not in planes]
+    body.extend(REMOVED_FORMAT.pack(i) for i in removed_planes)
+    obj_count = _objective_codec.encode(objectives, old_objectives, body)
+    removed_objectives = [i for i in old_objectives if i not in objectives]
+    body.extend(REMOVED_FORMAT.pack(i) for i in removed_objectives)
+    return PACKET_HEADER.pack(
+        sequence, baseline_sequence, plane_count, len(removed_planes),
+        obj_count, len(removed_objectives)) + b''.join(body)
+
+
+def decode_delta(packet, baseline=_EMPTY_SNAPSHOT):
+    """Decode a packet on top of its baseline snapshot.
+
+    Returns (sequence, snapshot, changed plane IDs)."""
+    (sequence, baseline_sequence, plane_count, removed_plane_count,
+     obj_count, removed_obj_count) = PACKET_HEADER.unpack_from(packet)
+    if baseline_sequence == NO_BASELINE:
+        baseline = _EMPTY_SNAPSHOT
+    changed = {}
+    offset = _plane_codec.decode(
+        packet, PACKET_HEADER.size, plane_count, baseline[0], changed)
+    planes = dict(baseline[0])
+    planes.update(changed)
+    for _ in range(removed_plane_count):
+        planes.pop(REMOVED_FORMAT.unpack_from(packet, offset)[0], None)
+        offset += REMOVED_FORMAT.size
+    objectives = dict(baseline[1])
+    offset = _objective_codec.decode(
+        packet, offset, obj_count, baseline[1], objectives)
+    for _ in range(removed_obj_count):
+        objectives.pop(REMOVED_FORMAT.unpack_from(packet, offset)[0], None)
+        offset += REMOVED_FORMAT.size
+    return sequence, (planes, objectives), set(changed)
+
+
+class StateEncoder(object):
+    """Encodes snapshots as deltas against acknowledged snapshots.
+
+    The snapshot history is shared by every receiver, and each packet
+    is only encoded once per baseline, so receivers that acknowledged
+    the same snapshot cost nothing extra."""
+    def __init__(self, history=64):
+        """Initialize the instance."""
+        self.history = history
+        self.sequence = None
+        self.snapshots = {} # sequence -> snapshot
+        self._packets = {} # baseline sequence -> packet
+
+    def capture(self, sequence, planes, objectives):
+        """Capture the current state as snapshot number sequence."""
+        self.sequence = sequence
+        self.snapshots[sequence] = capture(planes, objectives)
+        # Sequences can skip, so drop everything too old, not just one
+        for old in [s for s in self.snapshots
+                    if s <= sequence - self.history]:
+            del self.snapshots[old]
+        self._packets = {}
+
+    def encode(self, baseline_sequence=None):
+        """Encode the latest snapshot against an acknowledged one.
+
+        If the baseline is None or too old, the whole state is sent."""
+        if baseline_sequence not in self.snapshots:
+            baseline_sequence = NO_BASELINE
+        try:
+            return self._packets[baseline_sequence]
+        except KeyError:
+            packet = self._packets[baseline_sequence] = encode_delta(
+                self.sequence, self.snapshots[self.sequence],
+                baseline_sequence,
+                self.snapshots.get(baseline_sequence, _EMPTY_SNAPSHOT))
+            return packet
+
+
+class StateDecoder(object):
+    """Decodes packets and keeps the snapshots they could refer to."""
+    def __init__(self, history=64):
+        """Initialize the instance."""
+        self.history = history
+        self.sequence = None
+        self.snapshots = {} # sequence -> snapshot
+        self.changed = set() # plane IDs changed by the last packet
+
+    def decode(self, packet):
+        """Decode a packet.  Returns the sequence to acknowledge."""
+        baseline_sequence = PACKET_HEADER.unpack_from(packet)[1]
+        if (baseline_sequence != NO_BASELINE
+                and baseline_sequence not in self.snapshots):
+            raise ValueError(
+                "Unknown baseline {}.".format(baseline_sequence))
+        sequence, snapshot, self.changed = decode_delta(
+            packet, self.snapshots.get(baseline_sequence, _EMPTY_SNAPSHOT))
+        self.sequence = sequence
+        self.snapshots[sequence] = snapshot
+        # Only snapshots newer than the baseline can be used again
+        if baseline_sequence == NO_BASELINE:
+            baseline_sequence = sequence
+        for old in [s for s in self.snapshots if s < baseline_sequence
+                    or s <= sequence - self.history]:
+            del self.snapshots[old]
+        return sequence
+
+    @property
+    def planes(self):
+        """Get {plane ID: {field name: value}} for the latest state."""
+        if self.sequence is None:
+            return {}
+        return dict((i, dequantize(values)) for i, values
+                    in self.snapshots[self.sequence][0].items())
+
+    @property
+    def objectives(self):
+        """Get {objective ID: {field name: value}}."""
+        if self.sequence is None:
+            return {}
+        return dict((i, dequantize(values, OBJECTIVE_FIELDS)) for i, values
+                    in self.snapshots[self.sequence][1].items())
+
+
+def check_codec(path=None):
+    """Check that a plane of every aircraft type in path (aircraft.txt
+    by default) keeps its max speed through the codec.
+
+    Raises AssertionError if not."""
+    import aircraft
+    from objects import Airplane
+    aircraft.load_aircraft_types(path or aircraft.DEFAULT_PATH)
+    step = dict((name, step) for name, code, step in PLANE_FIELDS)
+    for name, aircraft_type in sorted(aircraft.AIRCRAFT_TYPES.items()):
+        plane = Airplane(0, 0, 10, 10, 8000, aircraft_type=aircraft_type)
+        plane.speed = aircraft_type.max_speed
+        encoder = StateEncoder()
+        decoder = StateDecoder()
+        encoder.capture(0, [plane], [])
+        decoder.decode(encoder.encode())
+        speed = decoder.planes[plane.id_]['speed']
+        if abs(speed - plane.speed) > step['speed'] / 2:
+            raise AssertionError("{}: speed {} decoded as {}".format(
+                name, plane.speed, speed))
+    print("Every aircraft type's max speed survives the codec")
+
+
+def benchmark(plane_count=500, ticks=200, tick_duration=1/20):
+    """Measure the codec on an airspace full of manoeuvring planes."""
+    from airspace import Airspace
+    check_codec()
+    airspace = Airspace()
+    for _ in range(plane_count):
+        plane = airspace.add_plane()
+        plane.x = random.uniform(0, airspace.width)
+        plane.z = random.uniform(0, airspace.height)
+        plane.altitude = random.uniform(1000, 10000)
+        plane.speed = random.uniform(100, 300)
+        plane.throttle = random.choice((0, 50, 50, 50, 75))
+        plane.heading = random.uniform(0, 2*math.pi)
+    airspace.generate_objective()
+    encoder = StateEncoder()
+    decoder = StateDecoder()
+    encoder.capture(0, airspace.planes, airspace.objectives)
+    full_size = len(encoder.encode())
+    acked = decoder.decode(encoder.encode())
+    total_size = 0
+    encode_time = 0
+    for tick in range(1, ticks + 1):
+        for plane in airspace.planes:
+            if random.random() < 0.1: # Some pilots touch the controls
+                plane.roll_level += random.uniform(-1, 1)
+        airspace.update(tick_duration)
+        start = time.time()
+        encoder.capture(tick, airspace.planes, airspace.objectives)
+        packet = encoder.encode(acked)
+        encode_time += time.time() - start
+        total_size += len(packet)
+        acked = decoder.decode(packet)
+    print("Planes: %i, ticks: %i" % (plane_count, ticks))
+    print("Full state: %.1f bytes per plane"
+          % (full_size / plane_count))
+    print("Delta: %.1f bytes per plane per tick"
+          % (total_size / ticks / plane_count))
+    print("Encode: %.0f planes per second"
+          % (plane_count * ticks / encode_time))
+
+if __name__ == '__main__':
+    benchmark()
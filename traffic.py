@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+"""AI traffic
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+AI planes are flown by their autopilots; the traffic generator only
+changes the autopilots' targets.  Each AI plane has a behaviour:
+ -> chase: flies to the closest objective.  AI planes can't capture
+    objectives, so it circles the objective until a player takes it.
+ -> holding: circles a fix at a constant altitude
+ -> route: flies between random waypoints
+AI planes that crash, leave the airspace or otherwise exit are
+replaced with new ones.
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import math
+import random
+
+import aircraft
+
+BEHAVIOURS = ('chase', 'holding', 'route')
+
+
+class TrafficGenerator(object):
+    """Spawns and flies AI planes in an airspace."""
+    CRUISE_SPEED = 0.4 # Fraction of the aircraft type's max speed
+    HOLDING_RADIUS = 5000 # m
+    ARRIVAL_DISTANCE = 2000 # How close waypoints have to be reached
+    MARGIN = 0.1 # Fraction of the airspace kept clear when spawning
+    def __init__(self, airspace, count=0, behaviours=BEHAVIOURS,
+                 aircraft_types=(aircraft.DEFAULT_TYPE,), seed=None):
+        """Initialize the instance and spawn count planes.
+
+        New planes get a random behaviour from behaviours and a random
+        aircraft type from aircraft_types."""
+        self.airspace = airspace
+        self.behaviours = tuple(behaviours)
+        self.aircraft_types = tuple(aircraft_types)
+        self.random = random.Random(seed)
+        self.pilots = {} # plane ID -> the plane and its behaviour
+        self.respawns = 0
+        self.spawn(count)
+
+    def __len__(self):
+        """Get the number of AI planes."""
+        return len(self.pilots)
+
+    def random_point(self):
+        """Get a random (x, z, altitude) inside the airspace."""
+        margin_x = self.airspace.width * self.MARGIN
+        margin_z = self.airspace.height * self.MARGIN
+        return (
+            self.random.uniform(self.airspace.left + margin_x,
+                                self.airspace.right - margin_x),
+            self.random.uniform(self.airspace.top + margin_z,
+                                self.airspace.bottom - margin_z),
+            self.random.uniform(self.airspace.MIN_OBJ_ALT,
+                                self.airspace.MAX_ALTITUDE * 0.75))
+
+    def spawn(self, count=1, behaviour=None):
+        """Add count AI planes.  Returns them.
+
+        If behaviour is None, each gets a random one."""
+        output = []
+        for _ in range(count):
+            x, z, altitude = self.random_point()
+            plane = self.airspace.add_plane(
+                aircraft_type=self.random.choice(self.aircraft_types),
+                scores=False)
+            # Airspace.add_plane puts planes in the middle
+            plane.x, plane.z, plane.altitude = x, z, altitude
+            plane.heading = self.random.uniform(0, math.pi*2)
+            speed = plane.aircraft_type.max_speed * self.CRUISE_SPEED
+            plane.speed = speed
+            plane.throttle = 50
+            pilot = {
+                'plane': plane,
+                'behaviour': (behaviour
+                              or self.random.choice(self.behaviours)),
+                'fix': (x, z),
+                'waypoint': None,
+            }
+            plane.enable_autopilot(altitude=altitude,
+                                   heading=plane.heading, speed=speed)
+            self.pilots[plane.id_] = pilot
+            output.append(plane)
+        return output
+
+    def despawn(self, plane):
+        """Remove an AI plane from the airspace."""
+        del self.pilots[plane.id_]
+        self.airspace.remove_plane(plane.id_)
+
+    def clear(self):
+        """Remove every AI plane."""
+        for pilot in list(self.pilots.values()):
+            self.despawn(pilot['plane'])
+
+    def update(self):
+        """Replace exited AI planes and steer the others.
+
+        Call once per tick, after the airspace's update."""
+        get_exit_code = self.airspace.get_exit_code
+        objectives = list(self.airspace.objectives)
+        full_turn = math.pi * 2
+        atan2 = math.atan2
+        for pilot in list(self.pilots.values()):
+            plane = pilot['plane']
+            if get_exit_code(plane):
+                self.despawn(plane)
+                self.spawn(1, pilot['behaviour'])
+                self.respawns += 1
+                continue
+            targets = plane._autopilot_info['targets']
+            x, z = plane._pos
+            if pilot['behaviour'] == 'chase':
+                if targets['objective'] is None and objectives:
+                    closest = min(objectives, key=lambda obj: (
+                        (obj.x-x) ** 2 + (obj.z-z) ** 2))
+                    targets['objective'] = closest.id_
+                    targets['altitude'] = closest.altitude
+                    targets['heading'] = atan2(
+                        closest.x - x, z - closest.z) % full_turn
+            elif pilot['behaviour'] == 'holding':
+                fix_x, fix_z = pilot['fix']
+                distance = math.hypot(fix_x - x, fix_z - z)
+                # Fly across the bearing to the fix, turning towards it
+                # when outside the circle and away when inside.
+                offset = max(min(
+                    (distance-self.HOLDING_RADIUS) / self.HOLDING_RADIUS,
+                    1), -1) * math.pi/2
+                targets['heading'] = (atan2(fix_x - x, z - fix_z)
+                                      + math.pi/2 - offset) % full_turn
+            else: # route
+                waypoint = pilot['waypoint']
+                if (waypoint is None
+                        or math.hypot(waypoint[0] - x, waypoint[1] - z)
+                        < self.ARRIVAL_DISTANCE):
+                    waypoint = pilot['waypoint'] = self.random_point()
+                    targets['altitude'] = waypoint[2]
+                targets['heading'] = atan2(
+                    waypoint[0] - x, z - waypoint[1]) % full_turn
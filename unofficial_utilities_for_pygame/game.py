@@ -40,8 +40,8 @@ class Game(object):
         """Loads the game's resources. Compatible with zips.
 
         Images, Sounds, Colors and Fonts use Pygame Objects.
-        Music uses filepaths/file objects (both compatible with
-        pygame.mixer.music.load)
+        Music uses filepaths (names in the archive for zips); use
+        open_music to get something pygame.mixer.music.load accepts
         
         Directory Layout:
         
@@ -87,11 +87,10 @@ class Game(object):
                             filename.lower() [7:].split('.') [0]
                     self.sounds[sound_name] = sound
                 elif filename.startswith('Music/'):
-                    music_data = self.resources.read(filename)
-                    music_bytes_io = io.BytesIO(music_data)
+                    # Opened by open_music, when it is played
                     music_name = \
                             filename.lower() [6:].split('.') [0]
-                    self.music_files[music_name] = music_bytes_io
+                    self.music_files[music_name] = filename
                 elif filename in ['colors.txt', 'colours.txt']:
                     colors_file = self.resources.open(filename)
                     for line in colors_file.readlines():
@@ -172,6 +171,16 @@ class Game(object):
             self.fonts['large'] = pygame.font.Font(None, self.size[1]/10)
                     
 
+    def open_music(self, music_name):
+        """Gets a music file for pygame.mixer.music.load.
+
+        Music in a zip archive is only opened here, and pygame streams
+        it from the archive instead of reading it into memory."""
+        music_file = self.music_files[music_name]
+        if self.resources_path.endswith('.zip'):
+            return self.resources.open(music_file)
+        return music_file
+
     def startup(self):
         """A \"hook\" function to use for variable creation.
 
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+
+"""Video export
+
+Slight Fimulator - Flight simulator in Python
+Copyright (C) 2017, 2018 Hao Tian and Adrien Hopkins
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Frame writers take the frames the client draws and save them in a
+background thread, so encoding doesn't hold up the game.  Each frame
+is copied as raw RGB bytes when it is written; if the thread falls
+behind, write waits for it instead of using more memory.
+ -> ImageSequenceWriter saves numbered images.  TGA is the default:
+    it is lossless and saves several times faster than PNG.
+ -> FFmpegWriter pipes the frames to ffmpeg to make a video
+Both can save only every nth frame, for thumbnails or smaller videos.
+"""
+
+# Installs Python 3 division and print behaviour
+from __future__ import division, print_function
+
+import os
+import subprocess
+import threading
+
+import pygame
+
+try:
+    import queue
+except ImportError: # Python 2
+    import Queue as queue
+
+try:
+    from shutil import which
+except ImportError: # Python 2
+    from distutils.spawn import find_executable as which
+
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.webm', '.avi', '.mov')
+IMAGE_FORMATS = ('tga', 'png', 'bmp', 'jpg') # What pygame can save
+
+
+class FrameWriter(object):
+    """Saves frames in a background thread.
+
+    This writer only counts the frames; subclasses override save."""
+    QUEUE_SIZE = 8 # Frames waiting to be saved before write waits
+    def __init__(self, size, every=1):
+        """Initialize the instance and start the thread.
+
+        size is the frames' (width, height).  Only every nth frame is
+        saved."""
+        if every < 1:
+            raise ValueError("every must be at least 1.")
+        self.size = tuple(int(value) for value in size)
+        self.every = every
+        self.frames = 0 # Frames written
+        self.error = None
+        self._queue = queue.Queue(self.QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write(self, surface):
+        """Queue a surface's contents to be saved."""
+        if self.error is not None:
+            raise self.error
+        if surface.get_size() != self.size:
+            raise ValueError("Frames must be {}x{}.".format(*self.size))
+        if self.wants(self.frames):
+            self._queue.put((self.frames,
+                             pygame.image.tostring(surface, 'RGB')))
+        self.frames += 1
+
+    def wants(self, frame):
+        """Return whether frame number frame is saved."""
+        return frame % self.every == 0
+
+    def close(self):
+        """Save the frames still queued and stop the thread."""
+        self._queue.put(None)
+        self._thread.join()
+        self.finish()
+        if self.error is not None:
+            raise self.error
+
+    def save(self, frame, data):
+        """Save a frame's RGB bytes.  Runs in the thread.
+
+        Does nothing here, so frames are dropped."""
+        pass
+
+    def finish(self):
+        """Finish saving, once the thread has stopped."""
+        pass
+
+    def _run(self):
+        """Save frames until None is queued."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self.error is None:
+                try:
+                    self.save(*item)
+                except Exception as e: # Reported by write and close
+                    self.error = e
+
+
+class ImageSequenceWriter(FrameWriter):
+    """Saves frames as numbered images in a folder."""
+    PATTERN = 'frame-{:06d}.{}'
+    def __init__(self, directory, size, every=1, image_format='tga'):
+        """Initialize the instance.
+
+        A large every makes thumbnails.  image_format is one of
+        IMAGE_FORMATS."""
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError("Unknown image format {}.".format(
+                image_format))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.image_format = image_format
+        super(ImageSequenceWriter, self).__init__(size, every)
+
+    def save(self, frame, data):
+        """Save a frame as an image."""
+        image = pygame.image.fromstring(data, self.size, 'RGB')
+        pygame.image.save(image, os.path.join(
+            self.directory, self.PATTERN.format(frame, self.image_format)))
+
+
+class FFmpegWriter(FrameWriter):
+    """Pipes frames to ffmpeg to encode a video."""
+    def __init__(self, path, size, fps, every=1, executable=None):
+        """Initialize the instance and start ffmpeg.
+
+        fps is the game's frame rate; with every, the video plays at
+        fps / every, so it keeps the game's speed.  executable is
+        ffmpeg's path; by default it is looked for on the PATH."""
+        if every < 1:
+            raise ValueError("every must be at least 1.")
+        executable = executable or which('ffmpeg')
+        if executable is None:
+            raise ValueError("ffmpeg wasn't found.")
+        self.path = path
+        width, height = size
+        self.process = subprocess.Popen(
+            [executable, '-y', '-loglevel', 'error',
+             '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+             '-s', '{}x{}'.format(int(width), int(height)),
+             '-r', str(fps / every), '-i', '-',
+             # Most players need even sizes for yuv420p
+             '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+             '-pix_fmt', 'yuv420p', path],
+            stdin=subprocess.PIPE)
+        super(FFmpegWriter, self).__init__(size, every)
+
+    def save(self, frame, data):
+        """Send a frame to ffmpeg."""
+        self.process.stdin.write(data)
+
+    def finish(self):
+        """Let ffmpeg finish the video."""
+        try:
+            self.process.stdin.close()
+        except (IOError, OSError): # ffmpeg has exited; see its code
+            pass
+        if self.process.wait(): # Explains any broken pipe
+            self.error = IOError("ffmpeg exited with code {}.".format(
+                self.process.returncode))
+
+
+def open_writer(path, size, fps=30, every=1, image_format='tga'):
+    """Open a writer for path.
+
+    Paths ending with a video extension are encoded with ffmpeg;
+    anything else is a folder for an image sequence."""
+    if os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS:
+        return FFmpegWriter(path, size, fps, every)
+    return ImageSequenceWriter(path, size, every, image_format)